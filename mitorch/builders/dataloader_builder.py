@@ -1,18 +1,33 @@
 import functools
 import logging
+import os
 import torch
+from mitorch.builders.dataloader_tuner import DataLoaderTuner, get_num_available_cpus, measure_training_throughput
 from mitorch.datasets import ImageDataset, TransformFactory
+from mitorch.datasets.decoders import create_decoder
+from mitorch.datasets.detection_targets import pad_detection_targets
+from mitorch.datasets.multilabel_targets import collate_multilabel_targets
+from mitorch.datasets.profiler import PipelineProfiler
+from mitorch.datasets.sampler import BlockShuffleSampler, get_storage_order
+from mitorch.datasets.transform_cache import CachedTransformDataset, TransformCache
 
-NUM_WORKERS = 4
+NUM_WORKERS = 4  # Used if num_workers is not given and auto_tune is disabled.
+PREFETCH_FACTOR = 2
 
 
-def _default_collate(task_type, batch):
+def _default_collate(task_type, batch, profiler=None, num_classes=None, sparse_multilabel=False):
+    if profiler:
+        with profiler.profile('collate'):
+            return _default_collate(task_type, batch, num_classes=num_classes, sparse_multilabel=sparse_multilabel)
+
     image, target = zip(*batch)
     image = torch.stack(image, 0)
     if task_type == 'multiclass_classification':
         target = torch.tensor(target)
     elif task_type == 'multilabel_classification':
-        raise NotImplementedError  # TODO: Support multilabel datasets
+        target = collate_multilabel_targets(target, num_classes, sparse_multilabel)
+    elif task_type == 'object_detection':
+        target = pad_detection_targets(target)
     return image, target
 
 
@@ -22,27 +37,105 @@ class DataLoaderBuilder:
         self.task_type = config.task_type
         self.input_size = config.model.input_size
         self.batch_size = config.batch_size
+        self.dataloader_config = config.dataloader
+        self.num_workers = NUM_WORKERS if self.dataloader_config.num_workers is None else self.dataloader_config.num_workers
+        self.prefetch_factor = PREFETCH_FACTOR if self.dataloader_config.prefetch_factor is None else self.dataloader_config.prefetch_factor
 
     def build(self, train_dataset_filepath, val_dataset_filepath):
         logging.info(f"Building a data_loader. train: {train_dataset_filepath}, val: {val_dataset_filepath}, augmentation: {self.augmentation_config}, "
                      f"task: {self.task_type}, input_size: {self.input_size}, batch_size: {self.batch_size}")
 
         is_object_detection = self.task_type == 'object_detection'
-        collate_fn = functools.partial(_default_collate, self.task_type)
-
-        train_augmentation = self.build_augmentation(self.augmentation_config.train, self.input_size, is_object_detection)
-        train_dataset = ImageDataset.from_file(train_dataset_filepath, train_augmentation)
-        train_dataloader = torch.utils.data.DataLoader(train_dataset, self.batch_size, shuffle=True, num_workers=NUM_WORKERS, pin_memory=True, collate_fn=collate_fn)
+        train_dataset = self.build_dataset(train_dataset_filepath, self.augmentation_config.train, is_object_detection)
+        train_dataloader = self.build_dataloader(train_dataset, shuffle=True, profile=self.dataloader_config.profile)
 
         if val_dataset_filepath:
-            val_augmentation = self.build_augmentation(self.augmentation_config.val, self.input_size, is_object_detection)
-            val_dataset = ImageDataset.from_file(val_dataset_filepath, val_augmentation)
-            val_dataloader = torch.utils.data.DataLoader(val_dataset, self.batch_size, shuffle=False, num_workers=NUM_WORKERS, pin_memory=True, collate_fn=collate_fn)
+            if self.dataloader_config.val_cache:
+                val_dataset = self.build_cached_dataset(val_dataset_filepath, self.augmentation_config.val, is_object_detection)
+            else:
+                val_dataset = self.build_dataset(val_dataset_filepath, self.augmentation_config.val, is_object_detection)
+            val_dataloader = self.build_dataloader(val_dataset, shuffle=False)
         else:
             val_dataloader = None
 
         return train_dataloader, val_dataloader
 
+    def build_dataloader(self, dataset, shuffle, profile=False, indices=None):
+        """If profile is True, a PipelineProfiler is attached to the dataset and the collate function. It is available as dataset.profiler.
+
+        If indices is given, only those images are loaded in the given order. It's used to resume an interrupted inference without shuffle.
+        """
+        dataset.profiler = PipelineProfiler(self.num_workers) if profile else None
+        collate_fn = self._get_collate_fn(dataset)
+        # torch 1.9 raises ValueError if these are given without workers.
+        worker_kwargs = {'persistent_workers': self.dataloader_config.persistent_workers, 'prefetch_factor': self.prefetch_factor} if self.num_workers > 0 else {}
+        sampler = None
+        if indices is not None:
+            assert not shuffle
+            sampler = indices
+        if shuffle:
+            # The order is determined by the epoch so that an interrupted epoch can be resumed from a checkpoint.
+            if self.dataloader_config.block_shuffle:
+                sampler = BlockShuffleSampler(get_storage_order(dataset), self.dataloader_config.shuffle_block_size, self.dataloader_config.shuffle_window_size)
+            else:
+                sampler = BlockShuffleSampler(range(len(dataset)), block_size=1, window_size=1)
+            shuffle = False
+        return torch.utils.data.DataLoader(dataset, self.batch_size, shuffle=shuffle, sampler=sampler, num_workers=self.num_workers, pin_memory=True,
+                                           collate_fn=collate_fn, **worker_kwargs)
+
+    def _get_collate_fn(self, dataset):
+        return functools.partial(_default_collate, self.task_type, profiler=dataset.profiler, num_classes=len(dataset.labels),
+                                 sparse_multilabel=self.dataloader_config.sparse_multilabel)
+
+    def tune(self, train_dataloader, val_dataloader, model, loggers, num_local_processes=1, use_amp=False):
+        """Select num_workers and prefetch_factor so that the train dataloader keeps up with the training steps. Returns the rebuilt dataloaders.
+
+        The values given in DataLoaderConfig are not changed. The CPUs on the node are shared by the local training processes.
+        """
+        device = torch.device('cuda', int(os.environ.get('LOCAL_RANK', 0))) if torch.cuda.is_available() else torch.device('cpu')
+        dataset = train_dataloader.dataset
+        dataset.profiler = None  # The profiler is rebuilt for the selected num_workers.
+        collate_fn = self._get_collate_fn(dataset)
+        images, _ = collate_fn([dataset[i % len(dataset)] for i in range(self.batch_size)])
+        target_images_per_second = measure_training_throughput(model, images, device, use_amp)
+
+        max_workers = max(1, get_num_available_cpus() // max(1, num_local_processes) - 1)  # Leave one CPU for the training process.
+        tuner = DataLoaderTuner(dataset, self.batch_size, collate_fn, max_workers)
+        self.num_workers, self.prefetch_factor, loader_images_per_second = tuner.tune(target_images_per_second, self.dataloader_config.num_workers,
+                                                                                      self.dataloader_config.prefetch_factor)
+
+        logging.info(f"Selected num_workers={self.num_workers}, prefetch_factor={self.prefetch_factor}. Loader: {loader_images_per_second:.1f} images/sec, "
+                     f"training step: {target_images_per_second:.1f} images/sec")
+        metrics = {'epoch': 0, 'dataloader_num_workers': self.num_workers, 'dataloader_prefetch_factor': self.prefetch_factor,
+                   'dataloader_images_per_second': loader_images_per_second, 'train_step_images_per_second': target_images_per_second}
+        for logger in loggers:
+            logger.log_metrics(metrics, step=0)
+
+        train_dataloader = self.build_dataloader(dataset, shuffle=True, profile=self.dataloader_config.profile)
+        val_dataloader = val_dataloader and self.build_dataloader(val_dataloader.dataset, shuffle=False)
+        return train_dataloader, val_dataloader
+
+    def build_dataset(self, dataset_filepath, augmentation, is_object_detection):
+        transform = self.build_augmentation(augmentation, self.input_size, is_object_detection, self.dataloader_config.uint8_transport)
+        dataset = ImageDataset.from_file(dataset_filepath, transform)
+        dataset.decoder = create_decoder(self.dataloader_config.decoder)
+        if self.dataloader_config.size_aware_decoding:
+            dataset.min_image_size = TransformFactory(is_object_detection, self.input_size).get_min_image_size(augmentation)
+            logging.info(f"Size-aware decoding is enabled. Minimum image size for {augmentation}: {dataset.min_image_size}")
+        return dataset
+
+    def build_cached_dataset(self, dataset_filepath, augmentation, is_object_detection):
+        """Build a dataset whose transformed images are cached on the local disk. Falls back to build_dataset() if the transform is not deterministic."""
+        if is_object_detection or not TransformFactory(is_object_detection, self.input_size).is_deterministic(augmentation):
+            logging.info(f"The transformed images cannot be cached. The augmentation {augmentation} is not deterministic or the task is object detection.")
+            return self.build_dataset(dataset_filepath, augmentation, is_object_detection)
+
+        transform = self.build_augmentation(augmentation, self.input_size, is_object_detection, uint8_output=True)
+        dataset = ImageDataset.from_file(dataset_filepath, transform)
+        dataset.decoder = create_decoder(self.dataloader_config.decoder)
+        cache = TransformCache.create(dataset, augmentation, self.input_size)
+        return CachedTransformDataset(dataset, cache, self.dataloader_config.uint8_transport)
+
     @staticmethod
-    def build_augmentation(augmentation, input_size, is_object_detection):
-        return TransformFactory(is_object_detection, input_size).create(augmentation)
+    def build_augmentation(augmentation, input_size, is_object_detection, uint8_output=False):
+        return TransformFactory(is_object_detection, input_size, uint8_output).create(augmentation)
@@ -0,0 +1,115 @@
+"""Select the number of DataLoader workers and the prefetch depth by comparing the loader throughput with the training step time."""
+import contextlib
+import copy
+import itertools
+import logging
+import os
+import time
+import torch
+
+logger = logging.getLogger(__name__)
+
+THROUGHPUT_HEADROOM = 1.2  # The loader must be this much faster than the training steps so that the jitter doesn't stall the steps.
+MIN_IMPROVEMENT = 1.05  # Stop adding workers if the throughput improves less than this ratio.
+PREFETCH_FACTOR_CANDIDATES = [2, 4, 8]
+
+
+def get_num_available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _flatten(outputs):
+    if torch.is_tensor(outputs):
+        return [outputs]
+    if isinstance(outputs, (list, tuple)):
+        return [t for o in outputs for t in _flatten(o)]
+    return []
+
+
+def measure_training_throughput(model, images, device, use_amp=False, num_steps=5):
+    """Returns images/sec of forward and backward passes with the given batch. The model parameters and buffers are restored afterwards."""
+    state_dict = copy.deepcopy(model.state_dict())
+    original_device = next(model.parameters()).device
+    model.to(device)
+    model.train()
+    images = images.to(device)
+
+    for i in range(num_steps + 1):
+        if i == 1:  # The first step is a warmup.
+            if device.type == 'cuda':
+                torch.cuda.synchronize(device)
+            start = time.perf_counter()
+        # torch.autocast is not available in torch 1.9. AMP is used only on GPU.
+        with torch.cuda.amp.autocast() if use_amp else contextlib.nullcontext():
+            loss = sum(o.float().sum() for o in _flatten(model(images)))
+        loss.backward()
+        model.zero_grad(set_to_none=True)
+
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    elapsed = time.perf_counter() - start
+
+    model.to(original_device)
+    model.load_state_dict(state_dict)
+    return num_steps * len(images) / elapsed
+
+
+class DataLoaderTuner:
+    def __init__(self, dataset, batch_size, collate_fn, max_workers, num_batches=20):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.collate_fn = collate_fn
+        self.max_workers = max(1, max_workers)
+        self.num_batches = num_batches
+
+    def measure_loader_throughput(self, num_workers, prefetch_factor):
+        """Returns images/sec of the DataLoader. The first batch of each worker is excluded since it includes the worker startup."""
+        worker_kwargs = {'prefetch_factor': prefetch_factor} if num_workers > 0 else {}
+        dataloader = torch.utils.data.DataLoader(self.dataset, self.batch_size, shuffle=True, num_workers=num_workers, collate_fn=self.collate_fn,
+                                                 drop_last=True, **worker_kwargs)
+        iterator = iter(dataloader)
+        num_images = 0
+        for _ in itertools.islice(iterator, max(1, num_workers)):
+            pass
+        start = time.perf_counter()
+        for image, _ in itertools.islice(iterator, self.num_batches):
+            num_images += len(image)
+        elapsed = time.perf_counter() - start
+        del iterator  # Shutdown the workers.
+        return num_images / elapsed if num_images else 0
+
+    def tune(self, target_images_per_second, num_workers=None, prefetch_factor=None):
+        """Returns (num_workers, prefetch_factor, images_per_second). The given num_workers and prefetch_factor are used as they are."""
+        target = target_images_per_second * THROUGHPUT_HEADROOM
+        worker_candidates = [num_workers] if num_workers is not None else self._get_worker_candidates()
+
+        results = {}
+        for n in worker_candidates:
+            results[n] = self.measure_loader_throughput(n, prefetch_factor or 2)
+            logger.debug(f"num_workers={n}: {results[n]:.1f} images/sec")
+            if results[n] >= target or (len(results) > 1 and results[n] < max(list(results.values())[:-1]) * MIN_IMPROVEMENT):
+                break
+
+        satisfied = [n for n, t in results.items() if t >= target]
+        best_num_workers = min(satisfied) if satisfied else max(results, key=results.get)
+        best_throughput = results[best_num_workers]
+
+        if prefetch_factor is None:
+            prefetch_factor = 2
+            if best_num_workers > 0 and best_throughput < target:
+                prefetch_results = {2: best_throughput}
+                for p in PREFETCH_FACTOR_CANDIDATES[1:]:
+                    prefetch_results[p] = self.measure_loader_throughput(best_num_workers, p)
+                # Deeper prefetch costs memory. Use the smallest one that is close to the best.
+                max_throughput = max(prefetch_results.values())
+                prefetch_factor = min(p for p, t in prefetch_results.items() if t * MIN_IMPROVEMENT >= max_throughput)
+                best_throughput = prefetch_results[prefetch_factor]
+
+        return best_num_workers, prefetch_factor, best_throughput
+
+    def _get_worker_candidates(self):
+        candidates = [2 ** i for i in range(self.max_workers.bit_length()) if 2 ** i < self.max_workers]
+        return candidates + [self.max_workers]
@@ -1,13 +1,17 @@
-from mitorch.evaluators import MulticlassClassificationEvaluator, MultilabelClassificationEvaluator, ObjectDetectionEvaluator
+from mitorch.evaluators import AsyncEvaluator, MulticlassClassificationEvaluator, MultilabelClassificationEvaluator, ObjectDetectionEvaluator
 
 
 class EvaluatorBuilder:
     def __init__(self, config):
         self._task_type = config.task_type
+        self._config = config.evaluation
 
     def build(self):
         mappings = {'multiclass_classification': MulticlassClassificationEvaluator,
                     'multilabel_classification': MultilabelClassificationEvaluator,
                     'object_detection': ObjectDetectionEvaluator}
         assert self._task_type in mappings
-        return mappings[self._task_type]()
+        evaluator = mappings[self._task_type]()
+        if self._config.asynchronous:
+            evaluator = AsyncEvaluator(evaluator, self._config.max_queue_size, self._config.max_queued_mb * 1024 * 1024)
+        return evaluator
@@ -37,6 +37,17 @@ class WarmupLR(torch.optim.lr_scheduler.LambdaLR):
         self.true_lrs = [group['lr'] for group in self.lr_scheduler.optimizer.param_groups]
         super().step()
 
+    def state_dict(self):
+        # The wrapped scheduler has a reference to the optimizer. Save its state instead of the object.
+        state_dict = super().state_dict()
+        state_dict['lr_scheduler'] = self.lr_scheduler.state_dict()
+        return state_dict
+
+    def load_state_dict(self, state_dict):
+        state_dict = dict(state_dict)
+        self.lr_scheduler.load_state_dict(state_dict.pop('lr_scheduler'))
+        super().load_state_dict(state_dict)
+
 
 class LinearWarmupLR(WarmupLR):
     def get_lr(self):
@@ -1,10 +1,43 @@
 import hashlib
 import logging
 import pickle
+import zipfile
 import torch
 from mitorch.models import ModelFactory
 
 
+class TraceableModel(torch.nn.Module):
+    """Wraps a model so that it can be traced. torch.jit.trace doesn't accept a list of tuples, which the detection models return."""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        output = self.model(x)
+        return tuple(tuple(o) for o in output) if isinstance(output, list) else output
+
+
+class ExportedModel:
+    """A TorchScript model saved by miexport. The outputs are converted into the results by the predictor of the original model architecture."""
+    def __init__(self, module, predictor):
+        self.module = module
+        self.predictor = predictor
+
+    def __call__(self, x):
+        return self.module(x)
+
+    def eval(self):
+        return self
+
+
+def is_torchscript_file(filepath):
+    """TorchScript archives have code/ directory. Weights saved by torch.save() don't."""
+    if not zipfile.is_zipfile(filepath):
+        return False
+    with zipfile.ZipFile(filepath) as f:
+        return any('/code/' in name for name in f.namelist())
+
+
 class ModelBuilder:
     def __init__(self, config):
         self.config = config.model
@@ -26,6 +59,17 @@ class ModelBuilder:
         self._dump_model_hash(model)
         return model
 
+    def build_for_inference(self, num_classes, model_filepath=None):
+        """Build a model in eval mode. model_filepath can be weights saved by mitrain, or a TorchScript model exported by miexport."""
+        if model_filepath and is_torchscript_file(model_filepath):
+            logging.info(f"Loading a TorchScript model from {model_filepath}")
+            module = torch.jit.load(str(model_filepath), map_location='cpu')
+            return ExportedModel(module, self.build(num_classes).predictor)
+
+        model = self.build(num_classes, model_filepath)
+        model.eval()
+        return model
+
     def _load_weights(self, model, weights_filepath):
         def _get_depth(param_names):
             max_depth = 0
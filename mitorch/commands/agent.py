@@ -3,22 +3,75 @@ import argparse
 import dataclasses
 import json
 import logging
+import math
 import pathlib
 import subprocess
 import tempfile
+import threading
 import time
 import torch
 from mitorch.common import Environment, JobRepository, ModelRepository
+from mitorch.common.checkpoint import CHECKPOINT_FILENAME
 from mitorch.commands.common import init_logging
+from mitorch.commands.preprocess import preprocess
 
 logger = logging.getLogger(__name__)
 
 
+class CheckpointUploader:
+    """Uploads the checkpoint file in a background thread whenever mitrain replaces it. The file is always complete since it's replaced atomically."""
+    def __init__(self, model_repository, job_id, filepath, interval=60):
+        self.model_repository = model_repository
+        self.job_id = job_id
+        self.filepath = filepath
+        self.interval = interval
+        self._uploaded_mtime = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._uploaded_mtime = self._get_mtime()  # A downloaded checkpoint is not uploaded again.
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread after uploading the last checkpoint."""
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._upload()
+        self._upload()
+
+    def _upload(self):
+        mtime = self._get_mtime()
+        if mtime is None or mtime == self._uploaded_mtime:
+            return
+        try:
+            self.model_repository.upload_file(self.job_id, self.filepath)
+            self._uploaded_mtime = mtime
+            logger.info(f"Uploaded a checkpoint {self.filepath}")
+        except Exception:
+            logger.exception("Failed to upload a checkpoint.")
+
+    def _get_mtime(self):
+        try:
+            return self.filepath.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
 def process_one_job(job, db_url, model_repository, data_dir):
     # Get the next training config.
     train_dataset_filepath = data_dir / job.config.dataset.train
     val_dataset_filepath = data_dir / job.config.dataset.val
 
+    if job.config.dataloader.preprocess_scale:
+        # The downscaled copies are kept in the local cache directory and reused by the later jobs.
+        short_side = math.ceil(job.config.model.input_size * job.config.dataloader.preprocess_scale)
+        train_dataset_filepath = preprocess(train_dataset_filepath, short_side)
+        val_dataset_filepath = preprocess(val_dataset_filepath, short_side)
+
     with tempfile.TemporaryDirectory() as temp_dir:
         temp_dir = pathlib.Path(temp_dir)
         config_filepath = temp_dir / 'config.json'
@@ -35,19 +88,34 @@ def process_one_job(job, db_url, model_repository, data_dir):
 
         log_filepath = temp_dir / 'training.log'
         tb_log_dir = temp_dir / 'tensorboard/'
+        profiler_trace_dir = temp_dir / 'profiler/'
+
+        # If the job was interrupted, its last checkpoint was uploaded. mitrain resumes from it.
+        checkpoint_dir = temp_dir / 'checkpoints'
+        checkpoint_dir.mkdir()
+        checkpoint_filepath = checkpoint_dir / CHECKPOINT_FILENAME
+        if model_repository.download_file(job.job_id, CHECKPOINT_FILENAME, checkpoint_filepath):
+            logger.info("Downloaded the checkpoint of the previous run. The training will be resumed.")
 
         command = ['mitrain', str(config_filepath), str(train_dataset_filepath), str(val_dataset_filepath),
                    '--output_filepath', str(output_filepath),
                    '--job_id', str(job.job_id),
                    '--db_url', db_url,
                    '--tensorboard_log', str(tb_log_dir),
-                   '--log_file', str(log_filepath)]
+                   '--log_file', str(log_filepath),
+                   '--checkpoint_dir', str(checkpoint_dir),
+                   '--profiler_trace_dir', str(profiler_trace_dir)]
 
         if pretrained_weights_filepath:
             command.extend(['--weights_filepath', str(pretrained_weights_filepath)])
 
         logger.info(f"Starting the training. command: {command}")
-        proc = subprocess.run(command)
+        checkpoint_uploader = CheckpointUploader(model_repository, job.job_id, checkpoint_filepath)
+        checkpoint_uploader.start()
+        try:
+            proc = subprocess.run(command)
+        finally:
+            checkpoint_uploader.stop()
         if proc.returncode != 0:
             logger.warning(f"Training return code is {proc.returncode}")
 
@@ -67,8 +135,20 @@ def process_one_job(job, db_url, model_repository, data_dir):
         except Exception:
             logger.exception("Failed to upload a tensorboard log.")
 
+        if profiler_trace_dir.exists():
+            try:
+                model_repository.upload_dir(job.job_id, profiler_trace_dir)
+            except Exception:
+                logger.exception("Failed to upload a profiler trace.")
+
         model_repository.upload_weights(job.job_id, output_filepath)
 
+        # The job has succeeded. The checkpoint is not needed to resume it any more.
+        try:
+            model_repository.delete_file(job.job_id, CHECKPOINT_FILENAME)
+        except Exception:
+            logger.exception("Failed to delete the checkpoint.")
+
 
 def run_agent(db_url, storage_url, data_dir, num_runs):
     logger.info("Starting an agent.")
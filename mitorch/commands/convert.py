@@ -0,0 +1,37 @@
+"""Convert a simpledataset manifest into a packed shard file."""
+import argparse
+import logging
+import pathlib
+from mitorch.commands.common import init_logging
+from mitorch.datasets import ImageDataset
+from mitorch.datasets.shard import ShardWriter
+
+logger = logging.getLogger(__name__)
+
+
+def convert(dataset_filepath, output_filepath):
+    dataset = ImageDataset.from_file(dataset_filepath, None)
+    logger.info(f"Loaded {len(dataset)} images ({dataset.task_type}) from {dataset_filepath}.")
+
+    with ShardWriter(output_filepath, dataset.task_type, dataset.labels) as writer:
+        for i in range(len(dataset)):
+            writer.add(dataset.read_image(i), dataset.image_paths[i], dataset.targets[i])
+            if (i + 1) % 10000 == 0:
+                logger.info(f"Processed {i + 1} images.")
+
+    logger.info(f"Saved {len(dataset)} images to {output_filepath}.")
+
+
+def main():
+    init_logging()
+    parser = argparse.ArgumentParser(description="Convert a dataset into a packed shard file.")
+    parser.add_argument('dataset_filepath', type=pathlib.Path)
+    parser.add_argument('output_filepath', type=pathlib.Path)
+
+    args = parser.parse_args()
+
+    convert(args.dataset_filepath, args.output_filepath)
+
+
+if __name__ == '__main__':
+    main()
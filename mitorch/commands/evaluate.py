@@ -0,0 +1,90 @@
+"""Evaluate a trained model on a dataset.
+
+The raw predictions are cached on the local disk. Later runs with the same config, weights and dataset only re-compute the metrics, e.g. with other
+IoU thresholds or a score threshold. An interrupted inference is resumed from the last complete batch.
+"""
+import argparse
+import json
+import logging
+import pathlib
+import time
+import jsons
+import torch
+from mitorch.builders import DataLoaderBuilder, EvaluatorBuilder, ModelBuilder
+from mitorch.commands.common import init_logging
+from mitorch.common import MiModel, TrainingConfig
+from mitorch.datasets import ImageDataset
+from mitorch.datasets.local_cache import get_cache_dir, get_cache_key, get_file_stats
+from mitorch.evaluators import ObjectDetectionEvaluator
+from mitorch.evaluators.prediction_cache import PredictionCache
+
+logger = logging.getLogger(__name__)
+
+
+def get_prediction_cache_key(config, weights_filepath, dataset_filepath):
+    filepaths = [p.resolve() for p in (weights_filepath, dataset_filepath)]
+    return get_cache_key(PredictionCache.VERSION, repr(config), [str(p) for p in filepaths], get_file_stats(filepaths))
+
+
+def run_inference(config, weights_filepath, dataset_filepath, cache, device):
+    """Predict the images that are not in the cache yet."""
+    dataloader_builder = DataLoaderBuilder(config)
+    dataset = dataloader_builder.build_dataset(dataset_filepath, config.augmentation.val, config.task_type == 'object_detection')
+    dataloader = dataloader_builder.build_dataloader(dataset, shuffle=False, indices=range(cache.num_completed, len(dataset)))
+    model = ModelBuilder(config).build(len(dataset.labels), weights_filepath).to(device)
+    model.eval()
+
+    logger.info(f"Predicting {len(dataset) - cache.num_completed} images in {dataset_filepath}")
+    start = time.time()
+    with torch.inference_mode():
+        for i, (images, targets) in enumerate(dataloader):
+            images = images.to(device, non_blocking=True)
+            if images.dtype == torch.uint8:
+                images = MiModel.normalize(images)
+            cache.append(model.predictor(model(images)), targets)
+            if (i + 1) % 100 == 0:
+                logger.info(f"Predicted {cache.num_completed} / {cache.num_images} images. {(time.time() - start) / (i + 1):.3f}s per batch.")
+
+
+def evaluate(config, weights_filepath, dataset_filepath, cache_dir=None, iou_values=None, coco=False, score_threshold=None, batch_size=256):
+    dataset = ImageDataset.from_file(dataset_filepath, None)
+    cache_key = get_prediction_cache_key(config, weights_filepath, dataset_filepath)
+    cache_dir = cache_dir or get_cache_dir('predictions') / cache_key
+    cache = PredictionCache(cache_dir, config.task_type, len(dataset), len(dataset.labels), cache_key)
+
+    if not cache.is_complete:
+        device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+        run_inference(config, weights_filepath, dataset_filepath, cache, device)
+    else:
+        logger.info(f"Using the cached predictions in {cache_dir}")
+
+    if config.task_type == 'object_detection':
+        evaluator = ObjectDetectionEvaluator(iou_values, coco) if iou_values else ObjectDetectionEvaluator(coco=coco)
+    else:
+        evaluator = EvaluatorBuilder(config).build()
+
+    for predictions, targets in cache.iterate_batches(batch_size, score_threshold):
+        evaluator.add_predictions(predictions, targets)
+    return evaluator.get_report()
+
+
+def main():
+    init_logging()
+    parser = argparse.ArgumentParser(description="Evaluate a trained model on a dataset. The predictions are cached for later runs.")
+    parser.add_argument('config_filepath', type=pathlib.Path)
+    parser.add_argument('weights_filepath', type=pathlib.Path)
+    parser.add_argument('dataset_filepath', type=pathlib.Path)
+    parser.add_argument('--cache_dir', type=pathlib.Path, help="Directory for the predictions. If not specified, a directory under the local cache directory is used.")
+    parser.add_argument('--iou', type=float, nargs='+', help="IoU thresholds for object detection.")
+    parser.add_argument('--coco', action='store_true', help="Report mAP@[.5:.95] for object detection.")
+    parser.add_argument('--score_threshold', type=float, help="Ignore the detected boxes with lower probabilities.")
+
+    args = parser.parse_args()
+
+    config = jsons.loads(args.config_filepath.read_text(), TrainingConfig)
+    report = evaluate(config, args.weights_filepath, args.dataset_filepath, args.cache_dir, args.iou, args.coco, args.score_threshold)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Export a trained model for CPU inference.
+
+model.pt is a frozen TorchScript model. With --quantize, model_int8.pt is also written. "dynamic" quantizes the weights of the linear layers and
+quantizes their activations on the fly. "static" quantizes the whole graph with the activation ranges calibrated on the images in the dataset.
+Both files can be given to mipredict and miserve in place of the weights file.
+
+The accuracy and the latency of the exported models are compared with the original model on the dataset, and saved to report.json.
+"""
+import argparse
+import copy
+import json
+import logging
+import pathlib
+import time
+import jsons
+import numpy as np
+import torch
+from mitorch.builders import DataLoaderBuilder, EvaluatorBuilder, ModelBuilder
+from mitorch.builders.model_builder import TraceableModel
+from mitorch.commands.common import init_logging
+from mitorch.common import MiModel, TrainingConfig
+
+try:
+    from torch.ao import quantization
+    from torch.ao.quantization import quantize_fx
+except ImportError:  # torch < 1.10
+    from torch import quantization
+    from torch.quantization import quantize_fx
+
+logger = logging.getLogger(__name__)
+
+
+def _get_batches(dataloader, max_images):
+    """Yields normalized batches until max_images images are yielded. The last batch is not truncated."""
+    num_images = 0
+    for images, targets in dataloader:
+        if num_images >= max_images:
+            return
+        yield MiModel.normalize(images) if images.dtype == torch.uint8 else images, targets
+        num_images += len(images)
+
+
+def _trace(model, example_images):
+    with torch.no_grad():
+        traced = torch.jit.trace(TraceableModel(model).eval(), example_images)
+    return torch.jit.freeze(traced)
+
+
+def quantize_dynamic(model, example_images):
+    quantized = quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return _trace(quantized, example_images)
+
+
+def quantize_static(model, example_images, calibration_batches):
+    engine = torch.backends.quantized.engine
+    model = TraceableModel(copy.deepcopy(model)).eval()
+    if hasattr(quantization, 'get_default_qconfig_mapping'):  # torch >= 1.13 requires example inputs.
+        prepared = quantize_fx.prepare_fx(model, quantization.get_default_qconfig_mapping(engine), (example_images,))
+    else:
+        prepared = quantize_fx.prepare_fx(model, {'': quantization.get_default_qconfig(engine)})
+    num_images = 0
+    with torch.inference_mode():
+        for images, _ in calibration_batches:
+            prepared(images)
+            num_images += len(images)
+    logger.info(f"Calibrated the activation ranges on {num_images} images.")
+    quantized = quantize_fx.convert_fx(prepared)
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(quantized, example_images))
+
+
+def measure_latency(model, images, num_iterations=20):
+    """Returns the p50 and p90 latency in milliseconds of a forward pass on the batch."""
+    latencies = []
+    with torch.inference_mode():
+        for i in range(num_iterations + 2):  # The first iterations are warmup.
+            start = time.perf_counter()
+            model(images)
+            if i >= 2:
+                latencies.append(time.perf_counter() - start)
+    return {'p50': float(np.percentile(latencies, 50)) * 1000, 'p90': float(np.percentile(latencies, 90)) * 1000}
+
+
+def export(config, weights_filepath, dataset_filepath, output_dir, quantize=None, num_calibration_images=256, max_eval_images=1000, num_threads=None):
+    """Returns the report of the accuracy and the latency of each model."""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    dataloader_builder = DataLoaderBuilder(config)
+    dataset = dataloader_builder.build_dataset(dataset_filepath, config.augmentation.val, config.task_type == 'object_detection')
+    dataloader = dataloader_builder.build_dataloader(dataset, shuffle=False)
+    num_classes = len(dataset.labels)
+    model = ModelBuilder(config).build_for_inference(num_classes, weights_filepath)
+    example_images, _ = next(_get_batches(dataloader, config.batch_size))
+
+    models = {'original': model, 'torchscript': _trace(model, example_images)}
+    torch.jit.save(models['torchscript'], str(output_dir / 'model.pt'))
+
+    if quantize == 'dynamic':
+        models['int8'] = quantize_dynamic(model, example_images)
+    elif quantize == 'static':
+        models['int8'] = quantize_static(model, example_images, _get_batches(dataloader, num_calibration_images))
+    if 'int8' in models:
+        torch.jit.save(models['int8'], str(output_dir / 'model_int8.pt'))
+
+    evaluators = {name: EvaluatorBuilder(config).build() for name in models}
+    with torch.inference_mode():
+        for images, targets in _get_batches(dataloader, max_eval_images):
+            for name, m in models.items():
+                evaluators[name].add_predictions(model.predictor(m(images)), targets)
+
+    report = {}
+    for name, m in models.items():
+        report[name] = {**evaluators[name].get_report(), 'latency_ms': measure_latency(m, example_images)}
+    for name in models:
+        report[name]['delta'] = {key: report[name][key] - report['original'][key] for key in evaluators[name].get_report()}
+        report[name]['delta']['latency_ms'] = report[name]['latency_ms']['p50'] - report['original']['latency_ms']['p50']
+
+    (output_dir / 'report.json').write_text(json.dumps(report, indent=4))
+    for name, values in report.items():
+        metrics = ', '.join(f"{key}: {values[key]:.4f} ({values['delta'][key]:+.4f})" for key in evaluators[name].get_report())
+        logger.info(f"{name:>12}: {metrics}, latency: {values['latency_ms']['p50']:.1f} ms/batch ({values['delta']['latency_ms']:+.1f})")
+    return report
+
+
+def main():
+    init_logging()
+    parser = argparse.ArgumentParser(description="Export a frozen TorchScript model and an optional int8 model for CPU inference.")
+    parser.add_argument('config_filepath', type=pathlib.Path)
+    parser.add_argument('weights_filepath', type=pathlib.Path)
+    parser.add_argument('dataset_filepath', type=pathlib.Path, help="Validation dataset for the calibration and the accuracy comparison.")
+    parser.add_argument('output_dir', type=pathlib.Path)
+    parser.add_argument('--quantize', choices=['dynamic', 'static'])
+    parser.add_argument('--num_calibration_images', type=int, default=256)
+    parser.add_argument('--max_eval_images', type=int, default=1000)
+    parser.add_argument('--num_threads', type=int, help="Number of intra-op threads of torch for the latency measurement.")
+
+    args = parser.parse_args()
+
+    config = jsons.loads(args.config_filepath.read_text(), TrainingConfig)
+    export(config, args.weights_filepath, args.dataset_filepath, args.output_dir, args.quantize, args.num_calibration_images, args.max_eval_images, args.num_threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Extract the outputs of an intermediate module of a model for all images in a dataset.
+
+The features are written to a preallocated memory-mapped array features.npy in the output directory. Row i is the feature of the i-th image in
+the dataset, and images.txt lists the image path of each row. Outputs with spatial dimensions are global-average-pooled.
+
+done.npy marks the rows that are written, so an interrupted run skips them when it's restarted. Multiple processes can write to the same output
+directory if they are given disjoint index ranges with --start and --end.
+"""
+import argparse
+import logging
+import os
+import pathlib
+import time
+import jsons
+import numpy as np
+import torch
+from mitorch.builders import DataLoaderBuilder, ModelBuilder
+from mitorch.commands.common import init_logging
+from mitorch.common import MiModel, TrainingConfig
+from mitorch.datasets.local_cache import open_shared_memmap
+
+logger = logging.getLogger(__name__)
+
+
+class _FeatureCaptured(Exception):
+    """Raised from the forward hook to skip the layers after the module."""
+
+
+class FeatureExtractor:
+    def __init__(self, model, module_name):
+        modules = dict(model.named_modules())
+        if module_name not in modules:
+            raise ValueError(f"Module {module_name} is not found. Candidates: {[name for name in modules if name]}")
+        self.model = model
+        self.module = modules[module_name]
+
+    def __call__(self, images):
+        """Returns (N, D) features."""
+        features = None
+
+        def hook(module, inputs, output):
+            nonlocal features
+            features = output
+            raise _FeatureCaptured
+
+        handle = self.module.register_forward_hook(hook)
+        try:
+            self.model(images)
+        except _FeatureCaptured:
+            pass
+        finally:
+            handle.remove()
+
+        if features is None:
+            raise RuntimeError("The module was not called in the forward pass.")
+        if features.dim() > 2:
+            features = features.flatten(2).mean(2)
+        return features
+
+
+def extract_features(config, weights_filepath, dataset_filepath, output_dir, module_name, dtype=np.float16, start=0, end=None):
+    """Write the features of the images [start, end) in the dataset. Returns the number of images processed in this run."""
+    dataloader_builder = DataLoaderBuilder(config)
+    dataset = dataloader_builder.build_dataset(dataset_filepath, config.augmentation.val, config.task_type == 'object_detection')
+    end = len(dataset) if end is None else min(end, len(dataset))
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    done = open_shared_memmap(output_dir / 'done.npy', np.uint8, (len(dataset),))
+    images_filepath = output_dir / 'images.txt'
+    if not images_filepath.exists():
+        temp_filepath = output_dir / f'images.txt.{os.getpid()}.tmp'
+        temp_filepath.write_text(''.join(p + '\n' for p in dataset.image_paths))
+        os.replace(temp_filepath, images_filepath)
+
+    indices = np.flatnonzero(done[start:end] == 0) + start
+    logger.info(f"Extracting features of {len(indices)} images. {end - start - len(indices)} images in [{start}, {end}) were already processed.")
+    if not len(indices):
+        return 0
+
+    device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+    model = ModelBuilder(config).build(len(dataset.labels), weights_filepath).to(device)
+    model.eval()
+    extractor = FeatureExtractor(model, module_name)
+    dataloader = dataloader_builder.build_dataloader(dataset, shuffle=False, indices=indices.tolist())
+
+    features = None
+    num_processed = 0
+    start_time = time.time()
+    with torch.inference_mode():
+        for i, (images, _) in enumerate(dataloader):
+            images = images.to(device, non_blocking=True)
+            batch_features = extractor(MiModel.normalize(images) if images.dtype == torch.uint8 else images).float().cpu().numpy()
+            if features is None:
+                features = open_shared_memmap(output_dir / 'features.npy', dtype, (len(dataset), batch_features.shape[1]))
+
+            rows = indices[num_processed:num_processed + len(batch_features)]
+            features[rows] = batch_features
+            features.flush()
+            done[rows] = 1
+            done.flush()
+            num_processed += len(rows)
+            if (i + 1) % 100 == 0:
+                logger.info(f"Processed {num_processed} / {len(indices)} images. {num_processed / (time.time() - start_time):.1f} images/sec.")
+
+    logger.info(f"Saved the features of {num_processed} images to {output_dir / 'features.npy'}")
+    return num_processed
+
+
+def main():
+    init_logging()
+    parser = argparse.ArgumentParser(description="Extract features of the images in a dataset from an intermediate module of a model.")
+    parser.add_argument('config_filepath', type=pathlib.Path)
+    parser.add_argument('weights_filepath', type=pathlib.Path)
+    parser.add_argument('dataset_filepath', type=pathlib.Path)
+    parser.add_argument('output_dir', type=pathlib.Path)
+    parser.add_argument('--module', default='base_model', help="Name of the module in model.named_modules(). The default is the penultimate features.")
+    parser.add_argument('--dtype', choices=['float16', 'float32'], default='float16')
+    parser.add_argument('--start', type=int, default=0, help="The first image index processed by this process.")
+    parser.add_argument('--end', type=int, help="The image index after the last one processed by this process.")
+
+    args = parser.parse_args()
+
+    config = jsons.loads(args.config_filepath.read_text(), TrainingConfig)
+    extract_features(config, args.weights_filepath, args.dataset_filepath, args.output_dir, args.module, np.dtype(args.dtype), args.start, args.end)
+
+
+if __name__ == '__main__':
+    main()
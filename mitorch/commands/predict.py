@@ -1,12 +1,24 @@
+"""Predict images with a trained model.
+
+With --output_dir, the results are drawn on each image. Otherwise the images are predicted in batches. The DataLoader workers decode and transform
+the next batches while the model runs, and the results are written to a JSON Lines file or a numpy file.
+"""
 import argparse
+import json
+import logging
 import pathlib
 import time
 import jsons
+import numpy as np
 import PIL.Image
 import torch
 from mitorch.builders import ModelBuilder
-from mitorch.common import TrainingConfig
+from mitorch.commands.common import init_logging
+from mitorch.common import MiModel, TrainingConfig
 from mitorch.datasets import TransformFactory
+from mitorch.datasets.decoders import create_decoder
+
+logger = logging.getLogger(__name__)
 
 COLOR_CODES = ["black", "brown", "red", "orange", "yellow", "green", "blue", "violet", "grey", "white"]
 
@@ -35,8 +47,7 @@ def predict(config_filepath, weights_filepath, num_classes, image_filepaths, out
     config = jsons.loads(config_filepath.read_text(), TrainingConfig)
 
     transform = TransformFactory(config.task_type == 'object_detection', config.model.input_size).create(config.augmentation.val)
-    model = ModelBuilder(config).build(num_classes, weights_filepath)
-    model.eval()
+    model = ModelBuilder(config).build_for_inference(num_classes, weights_filepath)
 
     label_names = [str(i) for i in range(num_classes)]
 
@@ -60,7 +71,106 @@ def predict(config_filepath, weights_filepath, num_classes, image_filepaths, out
                 print(f"{filepath}: {output} ({processing_time:.3f}s).")
 
 
+class ImageFileDataset(torch.utils.data.Dataset):
+    def __init__(self, image_filepaths, transform, decoder):
+        self.image_filepaths = image_filepaths
+        self.transform = transform
+        self.decoder = decoder
+
+    def __len__(self):
+        return len(self.image_filepaths)
+
+    def __getitem__(self, index):
+        image, _ = self.decoder.decode(self.image_filepaths[index].read_bytes())
+        transformed, _ = self.transform(image, [])
+        return transformed
+
+
+class PredictionWriter:
+    """Writes the results to a JSON Lines file, or a numpy file of shape (num_images, num_classes) for classification."""
+    def __init__(self, output_filepath, num_images, num_classes):
+        self.output_filepath = output_filepath
+        self._is_numpy = output_filepath.suffix == '.npy'
+        if self._is_numpy:
+            self._array = np.lib.format.open_memmap(output_filepath, mode='w+', dtype=np.float32, shape=(num_images, num_classes))
+            self._num_written = 0
+        else:
+            self._file = open(output_filepath, 'w')
+
+    def write(self, image_filepaths, predictions):
+        if self._is_numpy:
+            self._array[self._num_written:self._num_written + len(predictions)] = predictions.float().cpu().numpy()
+            self._num_written += len(predictions)
+        else:
+            predictions = predictions.tolist() if torch.is_tensor(predictions) else predictions
+            self._file.write(''.join(json.dumps({'image': str(f), 'predictions': p}) + '\n' for f, p in zip(image_filepaths, predictions)))
+
+    def close(self):
+        if self._is_numpy:
+            self._array.flush()
+            del self._array
+        else:
+            self._file.close()
+
+
+def _get_percentiles(values):
+    return {p: float(np.percentile(values, p)) * 1000 if values else 0.0 for p in (50, 90, 99)}
+
+
+def predict_batch(config, weights_filepath, num_classes, image_filepaths, output_filepath, batch_size=32, num_workers=4, num_threads=None, num_warmup_iterations=2):
+    """Returns the throughput statistics. The first batch is predicted num_warmup_iterations more times before the measurement starts."""
+    if output_filepath and output_filepath.suffix == '.npy' and config.task_type == 'object_detection':
+        raise ValueError("Object detection results can be written only to a JSON Lines file.")
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    transform = TransformFactory(config.task_type == 'object_detection', config.model.input_size, uint8_output=True).create(config.augmentation.val)
+    dataset = ImageFileDataset(image_filepaths, transform, create_decoder(config.dataloader.decoder))
+    worker_kwargs = {'prefetch_factor': 4} if num_workers > 0 else {}  # torch 1.9 raises ValueError if it's given without workers.
+    dataloader = torch.utils.data.DataLoader(dataset, batch_size, num_workers=num_workers, **worker_kwargs)
+    model = ModelBuilder(config).build_for_inference(num_classes, weights_filepath)
+
+    writer = output_filepath and PredictionWriter(output_filepath, len(dataset), num_classes)
+    batch_latencies = []
+    data_wait_times = []
+    num_predicted = 0
+    with torch.inference_mode():
+        start = None
+        batch_start = time.perf_counter()
+        for images in dataloader:
+            images = MiModel.normalize(images)
+            if start is None:
+                for _ in range(num_warmup_iterations):
+                    model.predictor(model(images))
+                start = batch_start = time.perf_counter()
+
+            forward_start = time.perf_counter()
+            predictions = model.predictor(model(images))
+            batch_latencies.append(time.perf_counter() - forward_start)
+            data_wait_times.append(forward_start - batch_start)
+
+            if writer:
+                writer.write(image_filepaths[num_predicted:num_predicted + len(images)], predictions)
+            else:
+                for filepath, prediction in zip(image_filepaths[num_predicted:num_predicted + len(images)], predictions):
+                    print(f"{filepath}: {prediction.tolist() if torch.is_tensor(prediction) else prediction}")
+            num_predicted += len(images)
+            batch_start = time.perf_counter()
+        total_time = time.perf_counter() - start if start else 0.0
+
+    if writer:
+        writer.close()
+
+    stats = {'num_images': num_predicted, 'images_per_second': num_predicted / total_time if total_time else 0.0,
+             'batch_latency_ms': _get_percentiles(batch_latencies), 'data_wait_ms': _get_percentiles(data_wait_times)}
+    logger.info(f"Predicted {num_predicted} images in {total_time:.2f}s ({stats['images_per_second']:.1f} images/sec). batch_size: {batch_size}, threads: {torch.get_num_threads()}")
+    logger.info("Batch latency (ms): " + ', '.join(f"p{p}: {v:.1f}" for p, v in stats['batch_latency_ms'].items()))
+    logger.info("Waiting for data (ms): " + ', '.join(f"p{p}: {v:.1f}" for p, v in stats['data_wait_ms'].items()))
+    return stats
+
+
 def main():
+    init_logging()
     parser = argparse.ArgumentParser()
     parser.add_argument('config_filepath', type=pathlib.Path)
     parser.add_argument('weights_filepath', type=pathlib.Path)
@@ -68,10 +178,18 @@ def main():
     parser.add_argument('image_filepath', nargs='*', type=pathlib.Path)
     parser.add_argument('--output_threshold', default=0.5, type=float)
     parser.add_argument('--output_dir', '-o', type=pathlib.Path, help="Draw prediction results on the images and save in this directory.")
+    parser.add_argument('--output_filepath', type=pathlib.Path, help="Write the results to a JSON Lines file (.jsonl) or a numpy file (.npy, classification only).")
+    parser.add_argument('--batch_size', '-b', type=int, default=32)
+    parser.add_argument('--num_workers', type=int, default=4, help="Number of DataLoader workers decoding the images.")
+    parser.add_argument('--num_threads', type=int, help="Number of intra-op threads of torch.")
 
     args = parser.parse_args()
 
-    predict(args.config_filepath, args.weights_filepath, args.num_classes, args.image_filepath, args.output_threshold, args.output_dir)
+    if args.output_dir:
+        predict(args.config_filepath, args.weights_filepath, args.num_classes, args.image_filepath, args.output_threshold, args.output_dir)
+    else:
+        config = jsons.loads(args.config_filepath.read_text(), TrainingConfig)
+        predict_batch(config, args.weights_filepath, args.num_classes, args.image_filepath, args.output_filepath, args.batch_size, args.num_workers, args.num_threads)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,149 @@
+"""Materialize a downscaled copy of a dataset.
+
+The images are re-encoded as JPEG so that their shorter side is at most short_side, and the object detection annotations are scaled together.
+The output images are named after the source image paths, so re-running the command only processes the images that are not written yet.
+"""
+import argparse
+import concurrent.futures
+import logging
+import os
+import pathlib
+import shutil
+import numpy as np
+import PIL.Image
+from mitorch.commands.common import init_logging
+from mitorch.datasets import ImageDataset
+from mitorch.datasets.local_cache import get_cache_dir, get_cache_key, get_file_stats
+from mitorch.datasets.shard import MemoryViewFile
+
+logger = logging.getLogger(__name__)
+
+PREPROCESS_VERSION = 1
+CHUNK_SIZE = 256
+_dataset = None  # The dataset in each worker process.
+
+
+def get_preprocessed_dir(dataset, short_side, quality):
+    """The default output directory. It is keyed by the dataset file, the zip files it refers to and the parameters so that the jobs on the same
+    machine share it. If the dataset is updated in place, a new directory is used since the existing outputs are not processed again.
+    """
+    filepaths = [dataset.filepath] + [dataset.base_dir / z for z in dataset.reader.zipfile_cache]
+    key = get_cache_key(PREPROCESS_VERSION, str(dataset.filepath.resolve()), get_file_stats(filepaths), short_side, quality)
+    return get_cache_dir('preprocessed') / key
+
+
+def _get_output_relpath(image_path):
+    """'images.zip@dir/0.png' => 'images/images.zip/dir/0.png.jpg'"""
+    relpath = image_path.replace('@', '/')
+    return 'images/' + (relpath if relpath.lower().endswith(('.jpg', '.jpeg')) else relpath + '.jpg')
+
+
+def _check_output_relpaths(image_paths, image_relpaths):
+    """Raise ValueError if different images are mapped to the same output, e.g. 'a.png' and 'a.png.jpg', or 'a.zip@b.jpg' and 'a.zip/b.jpg'."""
+    sources = {}
+    for image_path, relpath in zip(image_paths, image_relpaths):
+        source = sources.setdefault(relpath, image_path)
+        if source != image_path:
+            raise ValueError(f"{source} and {image_path} are written to the same output {relpath}. Rename one of them.")
+
+
+def _init_worker(dataset):
+    global _dataset
+    _dataset = dataset
+
+
+def _resize_image(data, short_side, output_filepath, quality):
+    """Returns (original_size, new_size)."""
+    with PIL.Image.open(MemoryViewFile(memoryview(data))) as image:
+        original_size = image.size
+        scale = min(1, short_side / min(image.size))
+        new_size = (round(image.width * scale), round(image.height * scale))
+        image.draft('RGB', new_size)  # Reduced DCT decoding for JPEG images. The result is still larger than new_size.
+        image = image.convert('RGB')
+        if image.size != new_size:
+            image = image.resize(new_size, PIL.Image.BICUBIC)
+
+    output_filepath.parent.mkdir(parents=True, exist_ok=True)
+    temp_filepath = output_filepath.with_name(f'{output_filepath.name}.{os.getpid()}.tmp')
+    image.save(temp_filepath, format='JPEG', quality=quality)
+    os.replace(temp_filepath, output_filepath)
+    return original_size, new_size
+
+
+def _write_annotation(target, scale_x, scale_y, output_filepath):
+    boxes = np.round(target * np.array([1, scale_x, scale_y, scale_x, scale_y])).astype(np.int64)
+    output_filepath.parent.mkdir(parents=True, exist_ok=True)
+    temp_filepath = output_filepath.with_name(f'{output_filepath.name}.{os.getpid()}.tmp')
+    temp_filepath.write_text(''.join(' '.join(str(v) for v in box) + '\n' for box in boxes))
+    os.replace(temp_filepath, output_filepath)
+
+
+def _process_chunk(tasks, short_side, quality, overwrite):
+    """Process (index, output_image_filepath, output_annotation_filepath) tasks in a worker. Returns the number of processed images."""
+    num_processed = 0
+    for index, image_filepath, annotation_filepath in tasks:
+        if not overwrite and image_filepath.exists() and (not annotation_filepath or annotation_filepath.exists()):
+            continue
+        original_size, new_size = _resize_image(_dataset.read_image(index), short_side, image_filepath, quality)
+        if annotation_filepath:
+            _write_annotation(_dataset.targets[index], new_size[0] / original_size[0], new_size[1] / original_size[1], annotation_filepath)
+        num_processed += 1
+    return num_processed
+
+
+def preprocess(dataset_filepath, short_side, output_dir=None, num_processes=None, quality=90, overwrite=False):
+    """Returns the filepath of the new dataset file."""
+    dataset = ImageDataset.from_file(dataset_filepath, None)
+    is_object_detection = dataset.task_type == 'object_detection'
+    output_dir = pathlib.Path(output_dir) if output_dir else get_preprocessed_dir(dataset, short_side, quality)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Preprocessing {len(dataset)} images in {dataset_filepath} to {output_dir}. short_side: {short_side}")
+
+    image_relpaths = [_get_output_relpath(p) for p in dataset.image_paths]
+    _check_output_relpaths(dataset.image_paths, image_relpaths)
+    annotation_relpaths = ['annotations/' + p[len('images/'):] + '.txt' for p in image_relpaths] if is_object_detection else [None] * len(dataset)
+    tasks = [(i, output_dir / image_relpaths[i], annotation_relpaths[i] and output_dir / annotation_relpaths[i]) for i in range(len(dataset))]
+
+    num_processed = 0
+    with concurrent.futures.ProcessPoolExecutor(num_processes, initializer=_init_worker, initargs=(dataset,)) as executor:
+        futures = [executor.submit(_process_chunk, tasks[i:i + CHUNK_SIZE], short_side, quality, overwrite) for i in range(0, len(tasks), CHUNK_SIZE)]
+        for i, future in enumerate(concurrent.futures.as_completed(futures)):
+            num_processed += future.result()
+            if (i + 1) % 100 == 0:
+                logger.info(f"Processed {min((i + 1) * CHUNK_SIZE, len(tasks))} / {len(tasks)} images.")
+
+    if is_object_detection:
+        targets = annotation_relpaths
+    else:
+        targets = [','.join(str(t) for t in np.atleast_1d(target)) for target in dataset.targets]
+
+    labels_filepath = dataset.base_dir / 'labels.txt'
+    if labels_filepath.exists():
+        shutil.copyfile(labels_filepath, output_dir / 'labels.txt')
+
+    output_filepath = output_dir / 'images.txt'
+    temp_filepath = output_dir / f'images.txt.{os.getpid()}.tmp'
+    temp_filepath.write_text(''.join(f'{p} {t}\n' for p, t in zip(image_relpaths, targets)))
+    os.replace(temp_filepath, output_filepath)
+    logger.info(f"Processed {num_processed} images. {len(dataset) - num_processed} images were already processed. Saved {output_filepath}.")
+    return output_filepath
+
+
+def main():
+    init_logging()
+    parser = argparse.ArgumentParser(description="Write downscaled copies of the images in a dataset.")
+    parser.add_argument('dataset_filepath', type=pathlib.Path)
+    parser.add_argument('short_side', type=int, help="Images are downscaled so that the shorter side is this size. Smaller images are not upscaled.")
+    parser.add_argument('--output_dir', '-o', type=pathlib.Path, help="If not specified, a directory under the local cache directory is used.")
+    parser.add_argument('--num_processes', '-p', type=int)
+    parser.add_argument('--quality', type=int, default=90, help="JPEG quality")
+    parser.add_argument('--overwrite', action='store_true', help="Process all images even if they were processed before.")
+
+    args = parser.parse_args()
+
+    output_filepath = preprocess(args.dataset_filepath, args.short_side, args.output_dir, args.num_processes, args.quality, args.overwrite)
+    print(output_filepath)
+
+
+if __name__ == '__main__':
+    main()
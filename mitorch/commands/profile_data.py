@@ -0,0 +1,55 @@
+"""Profile the data pipeline of a training config without building a model."""
+import argparse
+import logging
+import pathlib
+import time
+import jsons
+from mitorch.builders import DataLoaderBuilder
+from mitorch.commands.common import init_logging
+from mitorch.common import TrainingConfig
+
+logger = logging.getLogger(__name__)
+
+
+def profile_data(config, dataset_filepath, num_batches, use_val_augmentation=False):
+    """Iterate the DataLoader and returns (images/sec, PipelineProfiler)."""
+    builder = DataLoaderBuilder(config)
+    augmentation = config.augmentation.val if use_val_augmentation else config.augmentation.train
+    dataset = builder.build_dataset(dataset_filepath, augmentation, config.task_type == 'object_detection')
+    dataloader = builder.build_dataloader(dataset, shuffle=not use_val_augmentation, profile=True)
+    logger.info(f"Profiling {dataset_filepath} ({len(dataset)} images). augmentation: {augmentation}, num_workers: {builder.num_workers}, "
+                f"prefetch_factor: {builder.prefetch_factor}, batch_size: {builder.batch_size}")
+
+    num_images = 0
+    iterator = iter(dataloader)
+    next(iterator)  # Exclude the worker startup from the throughput. The stage latencies are recorded per sample, so they are kept.
+    start = time.perf_counter()
+    for i, (image, _) in enumerate(iterator):
+        num_images += len(image)
+        if i + 1 >= num_batches:
+            break
+    elapsed = time.perf_counter() - start
+    return num_images / elapsed if elapsed else 0, dataset.profiler
+
+
+def main():
+    init_logging()
+    parser = argparse.ArgumentParser(description="Measure the latency of each data pipeline stage: read, decode, augment and collate.")
+    parser.add_argument('config_filepath', type=pathlib.Path)
+    parser.add_argument('dataset_filepath', type=pathlib.Path)
+    parser.add_argument('--num_batches', '-n', type=int, default=100)
+    parser.add_argument('--val', action='store_true', help="Use the val augmentation instead of the train augmentation.")
+
+    args = parser.parse_args()
+
+    config = jsons.loads(args.config_filepath.read_text(), TrainingConfig)
+    images_per_second, profiler = profile_data(config, args.dataset_filepath, args.num_batches, args.val)
+
+    print(f"{'stage':>10} {'count':>8} {'mean_ms':>10} {'p50_ms':>10} {'p90_ms':>10} {'p99_ms':>10} {'total_s':>10}")
+    for stage, stats in profiler.get_stats().items():
+        print(f"{stage:>10} {stats['count']:>8} {stats['mean_ms']:>10.3f} {stats['p50_ms']:>10.3f} {stats['p90_ms']:>10.3f} {stats['p99_ms']:>10.3f} {stats['total_seconds']:>10.2f}")
+    print(f"Throughput: {images_per_second:.1f} images/sec")
+
+
+if __name__ == '__main__':
+    main()
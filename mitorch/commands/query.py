@@ -63,6 +63,7 @@ def main():
     parser.add_argument('--storage_url', default=env.storage_url)
     parser.add_argument('--short', action='store_true')
     parser.add_argument('--download', '-d', action='store_true')
+    parser.add_argument('--revive', action='store_true', help="Queue a failed or interrupted job again. It is resumed from the last checkpoint.")
 
     args = parser.parse_args()
     if not args.db_url:
@@ -77,8 +78,16 @@ def main():
         if not args.storage_url:
             parser.error("You must specify storage_url to download.")
 
+    if args.revive and not args.job_id:
+        parser.error("You must specify job_id to revive.")
+
     if args.job_id:
-        if args.download:
+        if args.revive:
+            if job_repository.revive_failed_job(args.job_id):
+                print(f"Queued {args.job_id} again.")
+            else:
+                print("The job is not found or is not failed/running.")
+        elif args.download:
             model_repository = ModelRepository(args.storage_url)
             output_dir = pathlib.Path(str(args.job_id))
             download_job_files(job_repository, model_repository, args.job_id, output_dir)
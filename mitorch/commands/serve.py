@@ -0,0 +1,278 @@
+"""HTTP inference server.
+
+The model is loaded once. Concurrent requests are coalesced into batches of at most max_batch_size images. A batch is run when it's full or when
+the oldest request has waited max_delay_ms. Images are decoded and transformed in a process pool so that the forward pass is never blocked.
+
+POST /predict with an encoded image as the body returns {"predictions": ...}. It responds with 400 if the image cannot be decoded or transformed,
+and with 500 if the prediction fails. GET /metrics returns the latency, batch size and queue depth statistics.
+"""
+import argparse
+import collections
+import concurrent.futures
+import http.server
+import json
+import logging
+import multiprocessing
+import pathlib
+import queue
+import threading
+import time
+import jsons
+import numpy as np
+import torch
+from mitorch.builders import ModelBuilder
+from mitorch.commands.common import init_logging
+from mitorch.common import MiModel, TrainingConfig
+from mitorch.datasets import TransformFactory
+from mitorch.datasets.decoders import create_decoder
+
+logger = logging.getLogger(__name__)
+
+_transform = None  # The transform and the decoder in each preprocessing worker.
+_decoder = None
+
+
+class InvalidRequestError(ValueError):
+    """The request body cannot be decoded or preprocessed. Reported to the client as 400."""
+
+
+def _init_worker(is_object_detection, input_size, augmentation, decoder_name):
+    global _transform, _decoder
+    torch.set_num_threads(1)
+    _transform = TransformFactory(is_object_detection, input_size, uint8_output=True).create(augmentation)
+    _decoder = create_decoder(decoder_name)
+
+
+def _preprocess(data):
+    image, _ = _decoder.decode(data)
+    transformed, _ = _transform(image, [])
+    return transformed.numpy()
+
+
+class ServerMetrics:
+    """Thread-safe statistics of the recent requests and batches."""
+    def __init__(self, max_samples=10000):
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=max_samples)
+        self._queue_times = collections.deque(maxlen=max_samples)
+        self._batch_sizes = collections.deque(maxlen=max_samples)
+        self._forward_times = collections.deque(maxlen=max_samples)
+        self.num_requests = 0
+        self.num_errors = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    def record_request(self, latency, succeeded=True):
+        with self._lock:
+            self.num_requests += 1
+            self.num_errors += 0 if succeeded else 1
+            self._latencies.append(latency)
+
+    def record_batch(self, batch_size, queue_times, forward_time):
+        with self._lock:
+            self._batch_sizes.append(batch_size)
+            self._queue_times.extend(queue_times)
+            self._forward_times.append(forward_time)
+
+    def set_queue_depth(self, depth):
+        with self._lock:
+            self.queue_depth = depth
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def get(self):
+        with self._lock:
+            return {'num_requests': self.num_requests, 'num_errors': self.num_errors, 'queue_depth': self.queue_depth, 'max_queue_depth': self.max_queue_depth,
+                    'latency_ms': self._get_percentiles(self._latencies, 1000), 'queue_time_ms': self._get_percentiles(self._queue_times, 1000),
+                    'forward_time_ms': self._get_percentiles(self._forward_times, 1000), 'batch_size': self._get_percentiles(self._batch_sizes),
+                    'mean_batch_size': float(np.mean(self._batch_sizes)) if self._batch_sizes else 0.0}
+
+    @staticmethod
+    def _get_percentiles(values, scale=1):
+        return {f'p{p}': float(np.percentile(values, p)) * scale if values else 0.0 for p in (50, 90, 99)}
+
+
+class DynamicBatcher:
+    """Runs predict_fn on batches of the submitted inputs in a background thread."""
+    def __init__(self, predict_fn, max_batch_size, max_delay, metrics):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, value):
+        """Returns a Future of the prediction."""
+        future = concurrent.futures.Future()
+        self._queue.put((value, future, time.perf_counter()))
+        self.metrics.set_queue_depth(self._queue.qsize())
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _get_batch(self):
+        """Wait for the first item, then collect more items until the batch is full or the first item has waited max_delay."""
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = item[2] + self.max_delay
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get(timeout=max(0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Stop after this batch.
+                break
+            batch.append(item)
+        self.metrics.set_queue_depth(self._queue.qsize())
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._get_batch()
+            if batch is None:
+                return
+            values, futures, submit_times = zip(*batch)
+            start = time.perf_counter()
+            try:
+                outputs = self.predict_fn(values)
+            except Exception as e:
+                logger.exception("Prediction failed.")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self.metrics.record_batch(len(batch), [start - t for t in submit_times], time.perf_counter() - start)
+            for future, output in zip(futures, outputs):
+                future.set_result(output)
+
+
+class InferenceServer:
+    def __init__(self, config, weights_filepath, num_classes, max_batch_size=32, max_delay_ms=10, num_workers=4):
+        self.model = ModelBuilder(config).build_for_inference(num_classes, weights_filepath)
+        self.metrics = ServerMetrics()
+        # Workers are spawned since forking a process that has run torch ops can deadlock in the OpenMP runtime.
+        self.executor = concurrent.futures.ProcessPoolExecutor(num_workers, multiprocessing.get_context('spawn'), initializer=_init_worker,
+                                                               initargs=(config.task_type == 'object_detection', config.model.input_size,
+                                                                         config.augmentation.val, config.dataloader.decoder))
+        self.batcher = DynamicBatcher(self._predict, max_batch_size, max_delay_ms / 1000, self.metrics)
+        self._http_server = None
+
+    def predict(self, data):
+        """Predict an encoded image. Called by the HTTP handler threads.
+
+        Raises InvalidRequestError if the image cannot be preprocessed. Other exceptions, e.g. a forward failure or a broken process pool, are
+        server errors.
+        """
+        future = self.executor.submit(_preprocess, data)
+        try:
+            image = future.result()
+        except concurrent.futures.BrokenExecutor:
+            raise
+        except Exception as e:
+            raise InvalidRequestError(f"Failed to preprocess the image: {e}") from e
+        return self.batcher.submit(image).result()
+
+    def _predict(self, images):
+        with torch.inference_mode():
+            images = MiModel.normalize(torch.from_numpy(np.stack(images)))
+            predictions = self.model.predictor(self.model(images))
+        return predictions.tolist() if torch.is_tensor(predictions) else predictions
+
+    def start(self, host='localhost', port=8000):
+        """Start serving in a background thread. Returns the bound port."""
+        self._http_server = http.server.ThreadingHTTPServer((host, port), _RequestHandler)
+        self._http_server.daemon_threads = True
+        self._http_server.inference_server = self
+        threading.Thread(target=self._http_server.serve_forever, daemon=True).start()
+        logger.info(f"Serving on {host}:{self._http_server.server_port}")
+        return self._http_server.server_port
+
+    def shutdown(self):
+        if self._http_server:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+        self.batcher.close()
+        self.executor.shutdown()
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send_json(200, self.server.inference_server.metrics.get())
+        elif self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send_json(404, {'error': 'Not found'})
+            return
+
+        start = time.perf_counter()
+        server = self.server.inference_server
+        try:
+            try:
+                content_length = int(self.headers.get('Content-Length', 0))
+            except ValueError as e:
+                raise InvalidRequestError(f"Invalid Content-Length: {e}") from e
+            predictions = server.predict(self.rfile.read(content_length))
+        except InvalidRequestError as e:
+            server.metrics.record_request(time.perf_counter() - start, succeeded=False)
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            logger.exception("Failed to handle a request.")
+            server.metrics.record_request(time.perf_counter() - start, succeeded=False)
+            self._send_json(500, {'error': str(e)})
+            return
+        server.metrics.record_request(time.perf_counter() - start)
+        self._send_json(200, {'predictions': predictions})
+
+    def _send_json(self, status, value):
+        body = json.dumps(value).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def main():
+    init_logging()
+    parser = argparse.ArgumentParser(description="Serve a trained model over HTTP.")
+    parser.add_argument('config_filepath', type=pathlib.Path)
+    parser.add_argument('weights_filepath', type=pathlib.Path)
+    parser.add_argument('num_classes', type=int)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max_batch_size', type=int, default=32)
+    parser.add_argument('--max_delay_ms', type=float, default=10, help="The maximum time a request waits for other requests to fill a batch.")
+    parser.add_argument('--num_workers', type=int, default=4, help="Number of processes decoding and transforming the images.")
+    parser.add_argument('--num_threads', type=int, help="Number of intra-op threads of torch.")
+
+    args = parser.parse_args()
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+
+    config = jsons.loads(args.config_filepath.read_text(), TrainingConfig)
+    server = InferenceServer(config, args.weights_filepath, args.num_classes, args.max_batch_size, args.max_delay_ms, args.num_workers)
+    server.start(args.host, args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
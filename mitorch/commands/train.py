@@ -10,11 +10,19 @@ import torch
 from mitorch.builders import DataLoaderBuilder
 from mitorch.common import MiModel, TrainingConfig, StandardLogger, MongoDBLogger
 from mitorch.commands.common import init_logging
+from mitorch.common.checkpoint import CheckpointCallback
+from mitorch.common.data_profiler import DataPipelineProfilerCallback
+from mitorch.common.step_profiler import TorchProfilerCallback
 
 _logger = logging.getLogger(__name__)
 
 
-def train(config, train_dataset_filepath, val_dataset_filepath, weights_filepath, output_filepath, job_id, db_url, tensorboard_log_dir, fast_dev_run=False):
+def train(config, train_dataset_filepath, val_dataset_filepath, weights_filepath, output_filepath, job_id, db_url, tensorboard_log_dir, fast_dev_run=False,
+          checkpoint_dir=None, profiler_trace_dir=None):
+    """If checkpoint_dir is given, the training state is saved there periodically. If it already has a checkpoint, the training is resumed from it.
+
+    If profiler_trace_dir is given and config.profiler.trace_start_step is set, a torch.profiler trace of the training steps is written there.
+    """
     try:
         _logger.info(f"Training started. mitorch version is {importlib.metadata.version('mitorch')}. model version is {importlib.metadata.version('mitorch-models')}")
     except Exception:
@@ -45,14 +53,28 @@ def train(config, train_dataset_filepath, val_dataset_filepath, weights_filepath
     if config.use_swa:
         callbacks.append(pl.callbacks.StochasticWeightAveraging(swa_epoch_start=config.swa_epoch_start))
 
-    train_dataloader, val_dataloader = DataLoaderBuilder(config).build(train_dataset_filepath, val_dataset_filepath)
+    dataloader_builder = DataLoaderBuilder(config)
+    train_dataloader, val_dataloader = dataloader_builder.build(train_dataset_filepath, val_dataset_filepath)
     num_classes = len(train_dataloader.dataset.labels) if train_dataloader else len(val_dataloader.dataset.labels)
 
+    model = MiModel(config, num_classes, weights_filepath)
+    if config.dataloader.auto_tune and train_dataloader and not fast_dev_run:
+        num_local_processes = (torch.cuda.device_count() if gpus == -1 else gpus) if gpus else 1
+        train_dataloader, val_dataloader = dataloader_builder.tune(train_dataloader, val_dataloader, model, logger, num_local_processes, precision == 16)
+
+    if train_dataloader and train_dataloader.dataset.profiler:
+        callbacks.append(DataPipelineProfilerCallback(train_dataloader.dataset.profiler))
+
+    if checkpoint_dir and not fast_dev_run:
+        callbacks.append(CheckpointCallback(checkpoint_dir, config.checkpoint.every_n_epochs, config.checkpoint.every_n_minutes))
+
+    if profiler_trace_dir and config.profiler.trace_start_step is not None:
+        callbacks.append(TorchProfilerCallback(profiler_trace_dir, config.profiler.trace_start_step, config.profiler.trace_num_steps))
+
     trainer = pl.Trainer(max_epochs=config.max_epochs, fast_dev_run=fast_dev_run, gpus=gpus, distributed_backend='ddp', terminate_on_nan=True,
                          logger=logger, progress_bar_refresh_rate=0, check_val_every_n_epoch=10, num_sanity_val_steps=0, deterministic=False,
                          accumulate_grad_batches=config.accumulate_grad_batches, checkpoint_callback=False, precision=precision, callbacks=callbacks, sync_batchnorm=True)
 
-    model = MiModel(config, num_classes, weights_filepath)
     trainer.fit(model, train_dataloader, val_dataloader)
     _logger.info("Training completed.")
 
@@ -76,6 +98,8 @@ def main():
     parser.add_argument('--db_url')
     parser.add_argument('--tensorboard_log', type=pathlib.Path)
     parser.add_argument('--log_file', type=pathlib.Path)
+    parser.add_argument('--checkpoint_dir', type=pathlib.Path, help="Save the training state periodically. If it has a checkpoint, the training is resumed.")
+    parser.add_argument('--profiler_trace_dir', type=pathlib.Path, help="Directory for the torch.profiler trace. See profiler.trace_start_step in the config.")
 
     args = parser.parse_args()
     init_logging(args.log_file)
@@ -84,7 +108,8 @@ def main():
 
     try:
         train(config, args.train_dataset_filepath, args.val_dataset_filepath, args.weights_filepath,
-              args.output_filepath, args.job_id, args.db_url, args.tensorboard_log, args.fast_dev_run)
+              args.output_filepath, args.job_id, args.db_url, args.tensorboard_log, args.fast_dev_run, args.checkpoint_dir,
+              args.profiler_trace_dir)
     except Exception:
         _logger.exception("Training failed.")
         raise
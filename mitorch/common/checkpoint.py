@@ -0,0 +1,131 @@
+"""Lightning callback that saves the full training state periodically and resumes an interrupted training."""
+import concurrent.futures
+import logging
+import os
+import time
+import pytorch_lightning as pl
+from pytorch_lightning.utilities.apply_func import apply_to_collection
+import torch
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILENAME = 'last.ckpt'
+
+
+class CheckpointCallback(pl.Callback):
+    """Saves the model, the optimizer, LR scheduler and AMP GradScaler states, and the position in the training to checkpoint_dir/last.ckpt.
+
+    A checkpoint is saved at the end of every every_n_epochs epochs, and in the middle of an epoch if every_n_minutes minutes have passed since
+    the last one. The states are copied to the CPU memory in the training loop, then serialized and written in a background thread. The file is
+    replaced atomically, so it is always a complete checkpoint. If the previous checkpoint is still being written, the new one is skipped.
+
+    If the file already exists, the training is resumed from it. A mid-epoch checkpoint is resumed from the next batch if the train sampler
+    supports start_index (see BlockShuffleSampler). Otherwise the interrupted epoch is started over.
+    """
+    def __init__(self, checkpoint_dir, every_n_epochs=1, every_n_minutes=None):
+        self.checkpoint_dir = checkpoint_dir
+        self.every_n_epochs = every_n_epochs
+        self.every_n_minutes = every_n_minutes
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._future = None
+        self._last_save_time = time.time()
+        self._start_batch_index = 0  # Number of batches in the current epoch that were trained before the resume.
+
+        filepath = checkpoint_dir / CHECKPOINT_FILENAME
+        self._resume_state = torch.load(filepath, map_location='cpu') if filepath.exists() else None
+        if self._resume_state:
+            logger.info(f"Resuming from {filepath}. epoch: {self._resume_state['epoch']}, batch: {self._resume_state['batch_index']}, "
+                        f"global_step: {self._resume_state['global_step']}")
+
+    def on_train_start(self, trainer, pl_module):
+        self._last_save_time = time.time()
+        if not self._resume_state:
+            return
+
+        state = self._resume_state
+        pl_module.load_state_dict(state['state_dict'])
+        for optimizer, optimizer_state in zip(trainer.optimizers, state['optimizer_states']):
+            optimizer.load_state_dict(optimizer_state)
+        for scheduler, scheduler_state in zip(trainer.lr_schedulers, state['lr_schedulers']):
+            scheduler['scheduler'].load_state_dict(scheduler_state)
+        scaler = self._get_scaler(trainer)
+        if scaler and state.get('scaler'):
+            scaler.load_state_dict(state['scaler'])
+        trainer.fit_loop.current_epoch = state['epoch']
+        trainer.fit_loop.global_step = state['global_step']
+
+    def on_train_epoch_start(self, trainer, pl_module):
+        self._start_batch_index = 0
+        if not self._resume_state:
+            return
+
+        batch_index = self._resume_state['batch_index']
+        self._resume_state = None
+        if batch_index:
+            sampler = trainer.train_dataloader.sampler
+            if hasattr(sampler, 'start_index'):
+                sampler.start_index = batch_index * trainer.train_dataloader.loaders.batch_size
+                self._start_batch_index = batch_index
+            else:
+                logger.warning(f"The train sampler {type(sampler).__name__} cannot skip the trained batches. The epoch is started over.")
+
+    def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx, dataloader_idx):
+        batch_index = self._start_batch_index + batch_idx + 1
+        is_epoch_end = batch_index >= trainer.num_training_batches
+        if not is_epoch_end and batch_index % trainer.accumulate_grad_batches:
+            return  # The optimizer step is not completed.
+
+        is_epoch_due = is_epoch_end and self.every_n_epochs and (trainer.current_epoch + 1) % self.every_n_epochs == 0
+        is_time_up = self.every_n_minutes is not None and time.time() - self._last_save_time >= self.every_n_minutes * 60
+        if not (is_epoch_due or is_time_up):
+            return
+
+        if is_epoch_end:
+            self.save(trainer, pl_module, trainer.current_epoch + 1, 0)
+        else:
+            self.save(trainer, pl_module, trainer.current_epoch, batch_index)
+
+    def on_train_end(self, trainer, pl_module):
+        self.wait()
+
+    def save(self, trainer, pl_module, epoch, batch_index):
+        """Save the state before the batch_index-th batch of the epoch. Called after the optimizer step, before the global_step is incremented."""
+        self._last_save_time = time.time()
+        if not trainer.is_global_zero:
+            return
+        if self._future and not self._future.done():
+            logger.warning("The previous checkpoint is still being written. Skipped a checkpoint.")
+            return
+
+        state = {'epoch': epoch,
+                 'batch_index': batch_index,
+                 'global_step': trainer.global_step + 1,
+                 'state_dict': pl_module.state_dict(),
+                 'optimizer_states': [optimizer.state_dict() for optimizer in trainer.optimizers],
+                 'lr_schedulers': [scheduler['scheduler'].state_dict() for scheduler in trainer.lr_schedulers]}
+        scaler = self._get_scaler(trainer)
+        if scaler:
+            state['scaler'] = scaler.state_dict()  # The loss scale of the native AMP. Otherwise it's reset to the initial scale.
+        state = apply_to_collection(state, torch.Tensor, lambda t: t.detach().to('cpu', copy=True))
+        self._future = self._executor.submit(self._write, state)
+
+    def wait(self):
+        """Wait until the pending checkpoint is written."""
+        if self._future:
+            self._future.result()
+
+    @staticmethod
+    def _get_scaler(trainer):
+        """GradScaler of the native mixed precision training. None if it's not used."""
+        return getattr(trainer.accelerator.precision_plugin, 'scaler', None)
+
+    def _write(self, state):
+        try:
+            self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+            filepath = self.checkpoint_dir / CHECKPOINT_FILENAME
+            temp_filepath = self.checkpoint_dir / f'{CHECKPOINT_FILENAME}.{os.getpid()}.tmp'
+            torch.save(state, temp_filepath)
+            os.replace(temp_filepath, filepath)
+            logger.info(f"Saved a checkpoint to {filepath}. epoch: {state['epoch']}, batch: {state['batch_index']}, global_step: {state['global_step']}")
+        except Exception:
+            logger.exception("Failed to save a checkpoint.")
@@ -0,0 +1,32 @@
+"""Lightning callback that reports the data pipeline profile every epoch."""
+import time
+import pytorch_lightning as pl
+
+
+class DataPipelineProfilerCallback(pl.Callback):
+    """Measures the time waiting for the next batch and the time of each training step in the main process.
+
+    The stage histograms recorded by the DataLoader workers are aggregated into the same PipelineProfiler and sent to the trainer loggers.
+    """
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self._last_batch_end = None
+        self._batch_start = None
+
+    def on_train_epoch_start(self, trainer, pl_module):
+        self.profiler.reset()
+        self._last_batch_end = time.perf_counter()
+
+    def on_train_batch_start(self, trainer, pl_module, batch, batch_idx, dataloader_idx):
+        self._batch_start = time.perf_counter()
+        self.profiler.record('data_wait', self._batch_start - self._last_batch_end)
+
+    def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx, dataloader_idx):
+        self._last_batch_end = time.perf_counter()
+        self.profiler.record('step', self._last_batch_end - self._batch_start)
+
+    def on_train_epoch_end(self, trainer, pl_module, unused=None):
+        metrics = self.profiler.get_metrics()
+        metrics['epoch'] = trainer.current_epoch
+        if trainer.logger:
+            trainer.logger.log_metrics(metrics, step=trainer.global_step)
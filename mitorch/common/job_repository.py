@@ -52,6 +52,14 @@ class JobRepository:
         if result.modified_count == 0:
             raise RuntimeError(f"Job not found: {job_id}")
 
+    @tenacity.retry(retry=tenacity.retry_if_exception_type(pymongo.errors.PyMongoError), stop=tenacity.stop_after_attempt(2), reraise=True)
+    def revive_failed_job(self, job_id: uuid.UUID):
+        """Queue a failed job again. A job that is left running by a dead agent can be also revived. The next agent resumes it from the last checkpoint."""
+        assert isinstance(job_id, uuid.UUID)
+        result = self._job_collection.update_one({'_id': job_id, 'status': {'$in': ['failed', 'running']}},
+                                                 {'$set': {'status': 'queued', 'updated_at': datetime.datetime.utcnow()}})
+        return result.modified_count == 1
+
     @tenacity.retry(retry=tenacity.retry_if_exception_type(pymongo.errors.PyMongoError), stop=tenacity.stop_after_attempt(2), reraise=True)
     def update_job_priority(self, job_id: uuid.UUID, new_priority):
         assert isinstance(job_id, uuid.UUID)
@@ -1,9 +1,16 @@
 """Lightning Module class for all trainings in mitorch."""
+import contextlib
 import logging
+import time
+import warnings
 from pytorch_lightning import LightningModule
 from pytorch_lightning.utilities import rank_zero_only
 import torch
 from mitorch.builders import EvaluatorBuilder, LrSchedulerBuilder, ModelBuilder, OptimizerBuilder
+from mitorch.common.step_profiler import StepProfiler
+from mitorch.datasets.detection_targets import is_padded_detection_targets, unpad_detection_targets
+from mitorch.datasets.multilabel_targets import to_dense_multilabel_targets
+from mitorch.datasets.transforms import INPUT_MEAN
 
 
 class MiModel(LightningModule):
@@ -13,6 +20,7 @@ class MiModel(LightningModule):
         self.model = ModelBuilder(config).build(num_classes, weights_filepath)
         # TODO: Leverage torchmetrics
         self.evaluator = EvaluatorBuilder(config).build()
+        self.step_profiler = StepProfiler() if config.profiler.step_breakdown else None
 
     def configure_optimizers(self):
         # lr_scheduler.step() is called after every training steps.
@@ -23,42 +31,116 @@ class MiModel(LightningModule):
 
     def training_step(self, batch, batch_index):
         image, target = batch
-        output = self.forward(image)
-        loss = self.model.loss(output, target)
-        self.log('train_loss', loss, on_epoch=True)
+        with self._profile('forward'):
+            output = self.forward(image)
+        with self._profile('loss'):
+            loss = self._compute_loss(output, target)
+        with self._profile('logging'):
+            self.log('train_loss', loss, on_epoch=True)
         return loss
 
+    def backward(self, loss, optimizer, optimizer_idx, *args, **kwargs):
+        with self._profile('backward'):
+            super().backward(loss, optimizer, optimizer_idx, *args, **kwargs)
+
+    def optimizer_step(self, epoch=None, batch_idx=None, optimizer=None, optimizer_idx=None, optimizer_closure=None, on_tpu=None,
+                       using_native_amp=None, using_lbfgs=None):
+        if not self.step_profiler:
+            return super().optimizer_step(epoch, batch_idx, optimizer, optimizer_idx, optimizer_closure, on_tpu, using_native_amp, using_lbfgs)
+
+        # The closure runs training_step and backward inside optimizer.step(). Its time is excluded from the optimizer stage.
+        closure_seconds = 0
+
+        def closure():
+            nonlocal closure_seconds
+            start = time.perf_counter()
+            try:
+                return optimizer_closure()
+            finally:
+                closure_seconds += time.perf_counter() - start
+
+        self.step_profiler.synchronize_device()
+        start = time.perf_counter()
+        super().optimizer_step(epoch, batch_idx, optimizer, optimizer_idx, closure, on_tpu, using_native_amp, using_lbfgs)
+        self.step_profiler.synchronize_device()
+        self.step_profiler.record('optimizer', time.perf_counter() - start - closure_seconds)
+
+    def on_train_start(self):
+        if self.step_profiler:
+            self.step_profiler.synchronize = self.device.type == 'cuda'
+
+    def on_train_epoch_start(self):
+        if self.step_profiler:
+            self.step_profiler.start_epoch()
+
+    def on_train_batch_start(self, batch, batch_idx, dataloader_idx):
+        if self.step_profiler:
+            self.step_profiler.start_step()
+
+    def on_train_batch_end(self, outputs, batch, batch_idx, dataloader_idx):
+        if self.step_profiler:
+            self.step_profiler.end_step()
+
+    def on_train_epoch_end(self, unused=None):
+        if self.step_profiler and self.logger:
+            metrics = self.step_profiler.get_metrics()
+            metrics['epoch'] = self.current_epoch
+            self.logger.log_metrics(metrics, step=self.global_step)
+
     def validation_step(self, batch, batch_index):
         image, target = batch
         output = self.forward(image)
-        loss = self.model.loss(output, target)
+        loss = self._compute_loss(output, target)
         predictions = self.model.predictor(output)
         self.evaluator.add_predictions(predictions, target)
         self.log('val_loss', loss, sync_dist=True)
 
     def validation_epoch_end(self, outputs):
+        # The evaluator states are merged instead of averaging the per-process reports, which is wrong for AP. Every process gets the same report.
+        self.evaluator.synchronize()
         results = self.evaluator.get_report()
         self.evaluator.reset()
         results = {'val_' + key: torch.tensor(value).to(self.device) for key, value in results.items()}
-        self.log_dict(results, sync_dist=True)
+        self.log_dict(results)
 
     def test_step(self, batch, batch_index):
         image, target = batch
         output = self.forward(image)
-        loss = self.model.loss(output, target)
+        loss = self._compute_loss(output, target)
         predictions = self.model.predictor(output)
         self.evaluator.add_predictions(predictions, target)
         self.log('test_loss', loss, sync_dist=True)
 
     def test_epoch_end(self, outputs):
+        self.evaluator.synchronize()
         results = self.evaluator.get_report()
         self.evaluator.reset()
         results = {'test_' + key: torch.tensor(value).to(self.device) for key, value in results.items()}
-        self.log_dict(results, sync_dist=True)
+        self.log_dict(results)
+
+    def _compute_loss(self, output, target):
+        if is_padded_detection_targets(target):
+            # The detection losses take a list of per-image targets and copy each of them with torch.tensor(), which warns for tensor inputs.
+            with warnings.catch_warnings():
+                warnings.filterwarnings('ignore', message='To copy construct from a tensor')
+                return self.model.loss(output, unpad_detection_targets(target))
+        if self.hparams['config'].task_type == 'multilabel_classification':
+            return self.model.loss(output, to_dense_multilabel_targets(target).to(output.dtype))
+        return self.model.loss(output, target)
+
+    def _profile(self, stage):
+        return self.step_profiler.profile(stage) if self.step_profiler else contextlib.nullcontext()
 
     def forward(self, x):
+        if x.dtype == torch.uint8:
+            x = self.normalize(x)
         return self.model(x)
 
+    @staticmethod
+    def normalize(image):
+        """Convert a uint8 batch from the DataLoader into the same input as the float transforms, i.e. image / 255 - 0.5."""
+        return image.float().mul_(1 / 255).sub_(INPUT_MEAN[0])
+
     @rank_zero_only
     def save(self, filepath):
         logging.info(f"Saving a model to {filepath}")
@@ -33,6 +33,17 @@ class ModelRepository:
             self._get_blob(url, output_filepath)
         return len(blob_names)
 
+    def download_file(self, job_id, name, filepath):
+        """Returns False if the job doesn't have the file."""
+        blob_name = f'{job_id}/{name}'
+        if blob_name not in self._list_blob(blob_name):
+            return False
+        self._get_blob(self._get_file_url(job_id, name), filepath)
+        return True
+
+    def delete_file(self, job_id, name):
+        self._delete_blob(self._get_file_url(job_id, name))
+
     def upload_file(self, job_id, filepath):
         url = self._get_file_url(job_id, filepath.name)
         self._put_blob(url, filepath.read_bytes())
@@ -62,6 +73,10 @@ class ModelRepository:
             with open(output_filepath, 'wb') as f:
                 shutil.copyfileobj(r.raw, f, length=4 * 1024 * 1024)
 
+    @tenacity.retry(retry=tenacity.retry_if_exception_type(IOError), stop=tenacity.stop_after_attempt(2), reraise=True)
+    def _delete_blob(self, url):
+        return requests.delete(url)
+
     def _list_blob(self, prefix):
         url = self._base_url + '&restype=container&comp=list'
         if prefix:
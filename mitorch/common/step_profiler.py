@@ -0,0 +1,118 @@
+"""Breakdown of the training step time, and a Lightning callback that captures a torch.profiler trace."""
+import contextlib
+import logging
+import time
+import numpy as np
+import pytorch_lightning as pl
+import torch
+
+logger = logging.getLogger(__name__)
+
+STAGES = ['data_wait', 'forward', 'loss', 'backward', 'optimizer', 'logging', 'other', 'total']
+PERCENTILES = [50, 90, 99]
+
+
+class StepProfiler:
+    """Records the wall time of each stage of every training step. Used by MiModel.
+
+    data_wait is the time between the end of the previous step and the start of this step. It includes the transfer of the batch to the device
+    and the loggers' writes that the trainer does between the steps. logging is the time of self.log() in the step. total is the time from the
+    end of the previous step to the end of this step, and other is the part of it that is not in any stage, e.g. zero_grad and the LR scheduler
+    step.
+
+    If synchronize is True, CUDA is synchronized at each stage boundary so that the asynchronous kernels are attributed to the right stage.
+    It slows down the training a little.
+    """
+    def __init__(self, synchronize=False):
+        self.synchronize = synchronize
+        self._seconds = {stage: [] for stage in STAGES}
+        self._current = {}
+        self._last_step_end = None
+        self._step_start = None
+
+    @contextlib.contextmanager
+    def profile(self, stage):
+        self.synchronize_device()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.synchronize_device()
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, seconds):
+        self._current[stage] = self._current.get(stage, 0.0) + seconds
+
+    def start_epoch(self):
+        self.reset()
+        self._last_step_end = time.perf_counter()
+
+    def start_step(self):
+        self._step_start = time.perf_counter()
+        self._current['data_wait'] = self._step_start - self._last_step_end
+
+    def end_step(self):
+        self.synchronize_device()
+        now = time.perf_counter()
+        total = now - self._last_step_end
+        self._current['other'] = total - sum(self._current.values())
+        self._current['total'] = total
+        for stage in STAGES:
+            self._seconds[stage].append(self._current.get(stage, 0.0))
+        self._current = {}
+        self._last_step_end = now
+
+    def reset(self):
+        self._seconds = {stage: [] for stage in STAGES}
+        self._current = {}
+
+    def get_metrics(self, prefix='step_'):
+        """Flat dict of the percentiles in milliseconds and the fraction of the total time of each stage."""
+        if not self._seconds['total']:
+            return {}
+        total_seconds = sum(self._seconds['total'])
+        metrics = {}
+        for stage in STAGES:
+            seconds = np.array(self._seconds[stage])
+            metrics.update({f'{prefix}{stage}_p{p}_ms': float(v) * 1000 for p, v in zip(PERCENTILES, np.percentile(seconds, PERCENTILES))})
+            if stage != 'total':
+                metrics[f'{prefix}{stage}_fraction'] = float(seconds.sum() / total_seconds) if total_seconds else 0.0
+        metrics[f'{prefix}count'] = len(self._seconds['total'])
+        return metrics
+
+    def synchronize_device(self):
+        """Wait for the CUDA kernels if synchronize is True."""
+        if self.synchronize:
+            torch.cuda.synchronize()
+
+
+class TorchProfilerCallback(pl.Callback):
+    """Captures a torch.profiler trace of the training steps [start_step, start_step + num_steps) of this process and writes it to trace_dir.
+
+    The trace can be opened with the TensorBoard profiler plugin, or with chrome://tracing and Perfetto.
+    """
+    def __init__(self, trace_dir, start_step, num_steps=5):
+        self.trace_dir = trace_dir
+        self.start_step = start_step
+        self.num_steps = num_steps
+        self._profiler = None
+
+    def on_train_start(self, trainer, pl_module):
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        num_warmup_steps = min(1, self.start_step)
+        schedule = torch.profiler.schedule(wait=self.start_step - num_warmup_steps, warmup=num_warmup_steps, active=self.num_steps, repeat=1)
+        self._profiler = torch.profiler.profile(activities=activities, schedule=schedule, record_shapes=True,
+                                                on_trace_ready=torch.profiler.tensorboard_trace_handler(str(self.trace_dir)))
+        self._profiler.start()
+        logger.info(f"Tracing the training steps [{self.start_step}, {self.start_step + self.num_steps}) to {self.trace_dir}")
+
+    def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx, dataloader_idx):
+        if self._profiler:
+            self._profiler.step()
+
+    def on_train_end(self, trainer, pl_module):
+        if self._profiler:
+            self._profiler.stop()
+            self._profiler = None
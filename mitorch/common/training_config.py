@@ -33,6 +33,44 @@ class OptimizerConfig:
     weight_decay: float = 1e-5
 
 
+@dataclasses.dataclass(frozen=True)
+class DataLoaderConfig:
+    size_aware_decoding: bool = False  # Decode JPEG images at a reduced resolution that is still large enough for the augmentations.
+    decoder: str = 'pil'  # pil, opencv, turbojpeg or auto. If auto, the fastest decoder on the host is selected.
+    uint8_transport: bool = False  # Workers send uint8 images and MiModel normalizes each batch on the training device.
+    num_workers: Optional[int] = None  # If None, it's selected by auto_tune, or the default value is used.
+    prefetch_factor: Optional[int] = None  # Same as num_workers.
+    persistent_workers: bool = True
+    auto_tune: bool = False  # Measure the loader throughput and the training step time before training, and select num_workers and prefetch_factor.
+    block_shuffle: bool = False  # Shuffle the train dataset in blocks of images stored next to each other in zip or shard files.
+    shuffle_block_size: int = 64
+    shuffle_window_size: int = 1024  # The images are shuffled within each window after the blocks are shuffled.
+    sparse_multilabel: bool = False  # Collate multilabel targets into sparse tensors. For label spaces with tens of thousands of classes.
+    val_cache: bool = False  # Cache the transformed validation images on the local disk if the val augmentation is deterministic.
+    preprocess_scale: Optional[float] = None  # If set, miagent trains on downscaled copies of the datasets whose shorter side is input_size * preprocess_scale.
+    profile: bool = False  # Record the latency of each data pipeline stage and the time waiting for data. The results are sent to the loggers every epoch.
+
+
+@dataclasses.dataclass(frozen=True)
+class EvaluationConfig:
+    asynchronous: bool = False  # Evaluate the validation predictions in a background thread. The validation loop only waits for it at the end of the epoch.
+    max_queue_size: int = 16  # The maximum number of batches waiting for the background evaluation.
+    max_queued_mb: int = 512  # The maximum size of the tensors waiting for the background evaluation.
+
+
+@dataclasses.dataclass(frozen=True)
+class CheckpointConfig:
+    every_n_epochs: Optional[int] = 1  # Save the full training state at the end of every n epochs. Used only if mitrain is given a checkpoint directory.
+    every_n_minutes: Optional[float] = 30  # Also save it in the middle of an epoch if this many minutes have passed since the last checkpoint.
+
+
+@dataclasses.dataclass(frozen=True)
+class ProfilerConfig:
+    step_breakdown: bool = False  # Record the time of each stage of the training steps. The percentiles are sent to the loggers every epoch.
+    trace_start_step: Optional[int] = None  # If set, capture a torch.profiler trace of the training steps from this step. Needs a trace directory.
+    trace_num_steps: int = 5
+
+
 @dataclasses.dataclass(frozen=True)
 class DatasetConfig:
     """Used by mitorch-agent to prepare a training environment."""
@@ -53,5 +91,9 @@ class TrainingConfig:
     lr_scheduler: LrSchedulerConfig = None
     optimizer: OptimizerConfig = None
     dataset: Optional[DatasetConfig] = None
+    dataloader: DataLoaderConfig = dataclasses.field(default_factory=DataLoaderConfig)
+    evaluation: EvaluationConfig = dataclasses.field(default_factory=EvaluationConfig)
+    checkpoint: CheckpointConfig = dataclasses.field(default_factory=CheckpointConfig)
+    profiler: ProfilerConfig = dataclasses.field(default_factory=ProfilerConfig)
     num_processes: int = -1
     accumulate_grad_batches: int = 1
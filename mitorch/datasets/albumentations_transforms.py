@@ -2,25 +2,36 @@ import albumentations
 import albumentations.pytorch
 import cv2
 import numpy as np
+import PIL.Image
+
+
+def _get_output_components(uint8_output):
+    """If uint8_output is True, the images are not normalized here. MiModel normalizes the uint8 CHW batch on the training device."""
+    to_tensor = albumentations.pytorch.ToTensorV2()
+    if uint8_output:
+        return [to_tensor]
+    return [albumentations.Normalize(mean=[0.5, 0.5, 0.5], std=[1, 1, 1]), to_tensor]
 
 
 class AlbumentationsTransform:
-    def __init__(self, components, is_object_detection):
+    def __init__(self, components, is_object_detection, uint8_output=False):
         bbox_params = albumentations.BboxParams(format='albumentations', label_fields=['category_id'], min_area=16, min_visibility=0.1) if is_object_detection else None
-        normalize = albumentations.Normalize(mean=[0.5, 0.5, 0.5], std=[1, 1, 1])
-        to_tensor = albumentations.pytorch.ToTensorV2()
-        self._transforms = albumentations.Compose(components + [normalize, to_tensor], bbox_params=bbox_params)
+        self._transforms = albumentations.Compose(components + _get_output_components(uint8_output), bbox_params=bbox_params)
         self._is_object_detection = is_object_detection
 
     def __call__(self, image, target):
-        w, h = image.width, image.height
-        image = np.array(image)
+        """image is a PIL image or an RGB uint8 numpy array of shape (H, W, 3)."""
+        if isinstance(image, PIL.Image.Image):
+            image = np.array(image)
+        h, w = image.shape[:2]
 
         if self._is_object_detection:
-            bboxes = [[t[1] / w, t[2] / h, t[3] / w, t[4] / h] for t in target]
-            category_id = [t[0] for t in target]
-            augmented = self._transforms(image=image, bboxes=bboxes, category_id=category_id)
-            target = [[label, *bbox] for label, bbox in zip(augmented['category_id'], augmented['bboxes'])]
+            # target is an array of [label, x0, y0, x1, y1] in pixels. The output boxes are normalized by the image size.
+            target = np.asarray(target, dtype=np.float32).reshape(-1, 5)
+            bboxes = target[:, 1:] / np.array([w, h, w, h], dtype=np.float32)
+            augmented = self._transforms(image=image, bboxes=bboxes, category_id=target[:, 0])
+            category_id = np.asarray(augmented['category_id'], dtype=np.float32).reshape(-1, 1)
+            target = np.concatenate([category_id, np.asarray(augmented['bboxes'], dtype=np.float32).reshape(-1, 4)], axis=1)
         else:
             augmented = self._transforms(image=image)
 
@@ -28,13 +39,8 @@ class AlbumentationsTransform:
 
 
 class AlbumentationsTransform2(AlbumentationsTransform):
-    def __init__(self, input_size, is_object_detection):
-        components = self.get_transforms(input_size)
-        bbox_params = albumentations.BboxParams(format='albumentations', label_fields=['category_id'], min_area=16, min_visibility=0.1) if is_object_detection else None
-        normalize = albumentations.Normalize(mean=[0.5, 0.5, 0.5], std=[1, 1, 1])
-        to_tensor = albumentations.pytorch.ToTensorV2()
-        self._transforms = albumentations.Compose(components + [normalize, to_tensor], bbox_params=bbox_params)
-        self._is_object_detection = is_object_detection
+    def __init__(self, input_size, is_object_detection, uint8_output=False):
+        super().__init__(self.get_transforms(input_size), is_object_detection, uint8_output)
 
 
 class SurveillanceCameraTransform(AlbumentationsTransform2):
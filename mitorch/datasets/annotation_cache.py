@@ -0,0 +1,108 @@
+"""Persistent cache of parsed object detection annotations.
+
+Parsed boxes are saved as flat numpy arrays in a single file under the local cache directory. The cache is keyed by the dataset filepath and
+is invalidated when the dataset file, the annotation files or the zip files containing the annotations are modified.
+
+Stat-ing every loose annotation file takes a few seconds for a large dataset. If the environment variable MITORCH_TRUST_ANNOTATION_DIRS is set
+to 1, only the directories of the loose files are checked instead. A directory's mtime changes when a file is added, removed or replaced in it,
+but not when a file is edited in place.
+"""
+import concurrent.futures
+import functools
+import logging
+import os
+import numpy as np
+from mitorch.datasets.local_cache import get_cache_dir, get_cache_key, get_file_stats
+from mitorch.datasets.packed_arrays import RaggedArray
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 2
+CHUNK_SIZE = 1000
+
+
+def parse_annotation(data):
+    """Parse an annotation file. Each line is "label x_min y_min x_max y_max". The coordinates are not normalized.
+
+    Returns: int32 array of shape (num_boxes, 5).
+    """
+    lines = [line for line in data.splitlines() if line.strip()]
+    tokens = data.split()
+    if len(tokens) != len(lines) * 5:
+        tokens = [t for line in lines for t in line.split()[:5]]
+    values = np.array(tokens).astype(np.float64).astype(np.int32).reshape(-1, 5)  # Truncated toward zero like int(float(x)).
+    return values[(values[:, 1] < values[:, 3]) & (values[:, 2] < values[:, 4])]  # Remove invalid bounding boxes.
+
+
+def load_annotations(reader, dataset_filepath, annotation_paths):
+    """Load the annotations from the cache if it is valid. Otherwise parse the annotation files in parallel and update the cache.
+
+    Returns: RaggedArray of int32 (num_boxes, 5) arrays.
+    """
+    cache_filepath = get_cache_dir('annotations') / (get_cache_key(str(dataset_filepath.resolve())) + '.npz')
+    fingerprint = _get_fingerprint(reader.base_dir, dataset_filepath, annotation_paths)
+
+    if cache_filepath.exists():
+        try:
+            with np.load(cache_filepath) as data:
+                if str(data['fingerprint']) == fingerprint:
+                    logger.info(f"Loaded annotations from the cache {cache_filepath}.")
+                    return RaggedArray(data['values'], data['offsets'])
+            logger.info(f"The annotation cache {cache_filepath} is stale.")
+        except Exception:
+            logger.exception(f"Failed to load the annotation cache {cache_filepath}.")
+
+    annotations = _parse_annotations(reader, annotation_paths)
+
+    temp_filepath = cache_filepath.with_name(f'{cache_filepath.stem}.{os.getpid()}.tmp.npz')
+    try:
+        np.savez(temp_filepath, values=annotations.values, offsets=annotations.offsets, fingerprint=np.array(fingerprint))
+        os.replace(temp_filepath, cache_filepath)
+        logger.info(f"Saved the annotation cache to {cache_filepath}.")
+    except OSError:
+        logger.exception("Failed to save the annotation cache.")
+    return annotations
+
+
+def _get_fingerprint(base_dir, dataset_filepath, annotation_paths):
+    zip_filepaths = set()
+    filepaths = []
+    for path in annotation_paths:
+        if '@' in path:
+            zip_filepaths.add(path.split('@')[0])
+        else:
+            filepaths.append(base_dir / path)
+
+    trust_dirs = os.getenv('MITORCH_TRUST_ANNOTATION_DIRS') == '1'
+    if trust_dirs:
+        filepaths = sorted({filepath.parent for filepath in filepaths})
+
+    filepaths = [dataset_filepath] + [base_dir / p for p in sorted(zip_filepaths)] + filepaths
+    chunks = [filepaths[i:i + CHUNK_SIZE] for i in range(0, len(filepaths), CHUNK_SIZE)]
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        stats = [s for chunk_stats in executor.map(get_file_stats, chunks) for s in chunk_stats]
+    return get_cache_key(CACHE_VERSION, trust_dirs, np.array(stats, dtype=np.int64).tobytes())
+
+
+def _parse_annotation_files(reader, annotation_paths):
+    annotations = []
+    for path in annotation_paths:
+        with reader.open(path, 'rb') as f:
+            annotations.append(parse_annotation(f.read()))
+    return np.concatenate(annotations) if annotations else np.zeros((0, 5), dtype=np.int32), np.array([len(a) for a in annotations], dtype=np.uint64)
+
+
+def _parse_annotations(reader, annotation_paths):
+    logger.info(f"Parsing {len(annotation_paths)} annotation files.")
+    chunks = [[annotation_paths[j] for j in range(i, min(i + CHUNK_SIZE, len(annotation_paths)))] for i in range(0, len(annotation_paths), CHUNK_SIZE)]
+    if len(chunks) > 1:
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            results = list(executor.map(functools.partial(_parse_annotation_files, reader), chunks))
+    else:
+        results = [_parse_annotation_files(reader, c) for c in chunks]
+
+    offsets = np.zeros(len(annotation_paths) + 1, dtype=np.uint64)
+    if results:
+        np.cumsum(np.concatenate([counts for _, counts in results]), out=offsets[1:])
+    values = np.concatenate([values for values, _ in results]) if results else np.zeros((0, 5), dtype=np.int32)
+    return RaggedArray(values, offsets)
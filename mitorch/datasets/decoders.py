@@ -0,0 +1,165 @@
+"""Image decoders.
+
+All decoders return an RGB uint8 numpy array of shape (H, W, 3), which albumentations consumes without another copy. If min_image_size is given,
+JPEG images are downscaled in DCT domain by the decoder as long as the shorter side stays larger than min_image_size. If a decoder cannot handle
+the image format, it falls back to PIL.
+"""
+import io
+import logging
+import math
+import time
+import cv2
+import numpy as np
+import PIL.Image
+from mitorch.datasets.shard import MemoryViewFile
+
+try:
+    import turbojpeg
+except ImportError:
+    turbojpeg = None
+
+logger = logging.getLogger(__name__)
+
+JPEG_MAGIC = b'\xff\xd8\xff'
+
+
+def _get_reduction_factor(size, min_image_size, max_factor=8):
+    """Returns the largest power-of-two reduction factor that keeps the shorter side of the image larger than min_image_size."""
+    factor = 1
+    while factor < max_factor and math.ceil(min(size) / (factor * 2)) >= min_image_size:
+        factor *= 2
+    return factor
+
+
+def _open_pil_image(data):
+    return PIL.Image.open(MemoryViewFile(data) if isinstance(data, memoryview) else io.BytesIO(data))
+
+
+class PILDecoder:
+    name = 'pil'
+
+    @staticmethod
+    def is_available():
+        return True
+
+    def decode(self, data, min_image_size=None):
+        """Returns the decoded image and the (width, height) of the image at the full resolution."""
+        with _open_pil_image(data) as image:
+            original_size = image.size
+            if min_image_size:
+                scale = min_image_size / min(image.size)
+                if scale < 1:
+                    image.draft('RGB', (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+            image = image.convert('RGB')  # Some image might have 1-channel. Also this method makes sure that the image is loaded.
+            return np.array(image), original_size
+
+
+class OpenCVDecoder:
+    name = 'opencv'
+
+    def __init__(self):
+        self._fallback = PILDecoder()
+
+    @staticmethod
+    def is_available():
+        return True
+
+    def decode(self, data, min_image_size=None):
+        flags = cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION  # PIL doesn't apply the EXIF orientation either.
+        original_size = None
+        if min_image_size and bytes(data[:3]) == JPEG_MAGIC:
+            with _open_pil_image(data) as image:  # Only parses the header.
+                original_size = image.size
+            factor = _get_reduction_factor(original_size, min_image_size)
+            flags |= {1: 0, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[factor]
+
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+        if image is None:
+            return self._fallback.decode(data, min_image_size)
+
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+        return image, original_size or (image.shape[1], image.shape[0])
+
+
+class TurboJPEGDecoder:
+    """Decoder using PyTurboJPEG. It is used only if the package and libjpeg-turbo are installed."""
+    name = 'turbojpeg'
+
+    def __init__(self):
+        self._decoder = None  # The ctypes handle cannot be pickled. It is created in each process.
+        self._fallback = PILDecoder()
+
+    @staticmethod
+    def is_available():
+        try:
+            turbojpeg.TurboJPEG()  # Fails if libjpeg-turbo is not installed.
+            return True
+        except Exception:
+            return False
+
+    def decode(self, data, min_image_size=None):
+        if bytes(data[:3]) != JPEG_MAGIC:
+            return self._fallback.decode(data, min_image_size)
+
+        if not self._decoder:
+            self._decoder = turbojpeg.TurboJPEG()
+
+        data = bytes(data)
+        try:
+            width, height, _, _ = self._decoder.decode_header(data)
+            factor = _get_reduction_factor((width, height), min_image_size) if min_image_size else 1
+            image = self._decoder.decode(data, pixel_format=turbojpeg.TJPF_RGB, scaling_factor=(1, factor))
+        except (OSError, ValueError):
+            return self._fallback.decode(data, min_image_size)
+        return image, (width, height)
+
+    def __getstate__(self):
+        return {'_decoder': None, '_fallback': self._fallback}
+
+
+DECODERS = {d.name: d for d in [PILDecoder, OpenCVDecoder, TurboJPEGDecoder]}
+_fastest_decoder_name = None
+
+
+def _create_benchmark_image(width=1280, height=960):
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    gradient = np.stack([x + y * 0, y + x * 0, (x + y) / 2], axis=2)
+    noise = np.random.default_rng(0).normal(0, 16, size=gradient.shape)
+    with io.BytesIO() as f:
+        PIL.Image.fromarray(np.clip(gradient + noise, 0, 255).astype(np.uint8)).save(f, format='JPEG', quality=90)
+        return f.getvalue()
+
+
+def select_fastest_decoder(num_iterations=10):
+    """Decode a synthetic JPEG image with all available decoders and returns the name of the fastest one. The result is cached."""
+    global _fastest_decoder_name
+    if _fastest_decoder_name:
+        return _fastest_decoder_name
+
+    data = _create_benchmark_image()
+    results = {}
+    for name, decoder_class in DECODERS.items():
+        if not decoder_class.is_available():
+            continue
+        decoder = decoder_class()
+        decoder.decode(data)  # Warmup
+        start = time.perf_counter()
+        for _ in range(num_iterations):
+            decoder.decode(data)
+        results[name] = (time.perf_counter() - start) / num_iterations
+
+    _fastest_decoder_name = min(results, key=results.get)
+    logger.info(f"Decoding time per image: {', '.join(f'{k}: {v * 1000:.2f}ms' for k, v in results.items())}. Selected {_fastest_decoder_name}.")
+    return _fastest_decoder_name
+
+
+def create_decoder(name):
+    """Create a decoder by the name. If the name is 'auto', the fastest decoder on this host is used."""
+    if name == 'auto':
+        name = select_fastest_decoder()
+    if name not in DECODERS:
+        raise NotImplementedError(f"Non supported decoder: {name}")
+    if not DECODERS[name].is_available():
+        raise RuntimeError(f"Decoder {name} is not available on this host.")
+    return DECODERS[name]()
@@ -0,0 +1,29 @@
+"""Batched object detection targets.
+
+A batch of targets is a tuple (padded, counts). padded is a float32 tensor of shape (N, max_boxes, 5) whose rows are [label, x0, y0, x1, y1],
+and counts is an int64 tensor of shape (N,) with the number of valid boxes in each image.
+"""
+import numpy as np
+import torch
+
+
+def pad_detection_targets(targets):
+    """Pad a list of (num_boxes, 5) arrays into (padded, counts) tensors."""
+    targets = [np.asarray(t, dtype=np.float32).reshape(-1, 5) for t in targets]
+    counts = np.array([len(t) for t in targets], dtype=np.int64)
+    padded = np.zeros((len(targets), counts.max(initial=0), 5), dtype=np.float32)
+    if counts.sum():
+        image_indices = np.repeat(np.arange(len(targets)), counts)
+        box_indices = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        padded[image_indices, box_indices] = np.concatenate(targets)
+    return torch.from_numpy(padded), torch.from_numpy(counts)
+
+
+def is_padded_detection_targets(targets):
+    return isinstance(targets, (tuple, list)) and len(targets) == 2 and torch.is_tensor(targets[0]) and targets[0].dim() == 3
+
+
+def unpad_detection_targets(targets):
+    """Returns a list of (num_boxes, 5) views of the padded tensor."""
+    padded, counts = targets
+    return [t[:c] for t, c in zip(padded, counts.tolist())]
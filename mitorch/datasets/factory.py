@@ -1,3 +1,4 @@
+import math
 import albumentations
 import cv2
 from mitorch.datasets.albumentations_transforms import SurveillanceCameraTransform, AlbumentationsTransform
@@ -16,6 +17,27 @@ COMPONENT_BUILDERS = {
     'to_gray': lambda input_size: albumentations.ToGray(p=0.1),
 }
 
+
+def _random_resized_crop_min_image_size(input_size):
+    # RandomResizedCrop can crop 8% of the image area with 3/4 aspect ratio.
+    return math.ceil(input_size / math.sqrt(0.08 * 3 / 4))
+
+
+# The minimum length of the shorter image side that doesn't lose any detail in the output of a component. Images can be decoded at a reduced
+# resolution as long as it's larger than this size. The components in SCALE_INVARIANT_COMPONENTS don't change the requirement.
+MIN_IMAGE_SIZE_BUILDERS = {
+    'random_resized_crop': _random_resized_crop_min_image_size,
+    'resize': lambda input_size: input_size,
+    'smallest_max_size': lambda input_size: int(input_size / 224 * 256),
+    'auto_augment': _random_resized_crop_min_image_size,
+    'inception': _random_resized_crop_min_image_size,
+}
+SCALE_INVARIANT_COMPONENTS = {'flip', 'horizontal_flip', 'image_compression', 'random_brightness_contrast', 'to_gray'}
+
+# Components without randomness. If a transform consists of these and ends with a component in FIXED_SIZE_COMPONENTS, its outputs can be cached.
+DETERMINISTIC_COMPONENTS = {'center_crop', 'resize', 'smallest_max_size'}
+FIXED_SIZE_COMPONENTS = {'center_crop', 'resize'}
+
 # For backward compatibility.
 # If the augmentation description is a simple string, return the following transforms.
 SPECIAL_TRANSFORM = {
@@ -26,18 +48,35 @@ SPECIAL_TRANSFORM = {
 
 
 class TransformFactory:
-    def __init__(self, is_object_detection, input_size):
+    def __init__(self, is_object_detection, input_size, uint8_output=False):
+        """If uint8_output is True, the transforms return uint8 CHW tensors without normalization."""
         self._is_object_detection = is_object_detection
         self._input_size = input_size
+        self._uint8_output = uint8_output
 
     def create(self, augmentations):
         if len(augmentations) == 1 and augmentations[0] in SPECIAL_TRANSFORM:
-            return SPECIAL_TRANSFORM[augmentations[0]](self._input_size, self._is_object_detection)
+            return SPECIAL_TRANSFORM[augmentations[0]](self._input_size, self._is_object_detection, self._uint8_output)
 
         components = [self._build_component(n) for n in augmentations]
-        transform = AlbumentationsTransform(components, self._is_object_detection)
+        transform = AlbumentationsTransform(components, self._is_object_detection, self._uint8_output)
         return transform
 
+    def get_min_image_size(self, augmentations):
+        """Returns the minimum length of the shorter side of input images to get the same quality outputs, or None if full resolution is needed."""
+        for name in augmentations:
+            if name in MIN_IMAGE_SIZE_BUILDERS:
+                return MIN_IMAGE_SIZE_BUILDERS[name](self._input_size)
+            if name not in SCALE_INVARIANT_COMPONENTS:
+                return None
+        return None
+
+    def is_deterministic(self, augmentations):
+        """Returns True if the transform always returns the same input_size x input_size image for the same input."""
+        if not augmentations or augmentations[-1] not in FIXED_SIZE_COMPONENTS:
+            return False
+        return all(name in DETERMINISTIC_COMPONENTS for name in augmentations)
+
     def _build_component(self, component_description):
         builder = COMPONENT_BUILDERS[component_description]
         return builder(self._input_size)
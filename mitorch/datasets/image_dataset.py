@@ -1,26 +1,97 @@
-import os
+import array
+import contextlib
+import dataclasses
 import pathlib
-import zipfile
-import PIL.Image
+import numpy as np
+from mitorch.datasets.annotation_cache import load_annotations
+from mitorch.datasets.decoders import PILDecoder
+from mitorch.datasets.packed_arrays import RaggedArray, StringArray
+from mitorch.datasets.shard import ShardReader
+from mitorch.datasets.zip_reader import IndexedZipFile
+
+
+@dataclasses.dataclass(frozen=True)
+class Manifest:
+    """Parsed dataset file.
+
+    targets is a RaggedArray of label indices for classification datasets, or a StringArray of annotation filepaths for detection datasets.
+    zip_filepaths is the set of zip files referred by the image paths.
+    """
+    task_type: str
+    image_paths: StringArray
+    targets: object
+    zip_filepaths: frozenset = frozenset()
+
+
+def parse_manifest(filename):
+    """Parse a dataset file in a single streaming pass. The rows are accumulated in flat buffers instead of per-row python objects."""
+    task_type = None
+    is_multilabel = False
+    path_data = bytearray()
+    path_offsets = array.array('Q', [0])
+    annotation_data = bytearray()
+    annotation_offsets = array.array('Q', [0])
+    label_values = array.array('q')
+    label_offsets = array.array('Q', [0])
+    zip_filepaths = set()
+
+    with open(filename, 'rb') as f:
+        for line in f:
+            image_filepath, target = line.split()
+            path_data += image_filepath
+            path_offsets.append(len(path_data))
+            if b'@' in image_filepath:
+                zip_filepaths.add(image_filepath.split(b'@')[0].decode('utf-8'))
+
+            if task_type is None:
+                task_type = 'object_detection' if b'@' in target or b'.' in target else 'classification'
+
+            if task_type == 'object_detection':
+                annotation_data += target
+                annotation_offsets.append(len(annotation_data))
+            else:
+                is_multilabel = is_multilabel or b',' in target
+                label_values.extend(int(t) for t in target.split(b','))
+                label_offsets.append(len(label_values))
+
+    image_paths = StringArray(np.frombuffer(path_data, dtype=np.uint8), np.frombuffer(path_offsets, dtype=np.uint64))
+    if task_type == 'object_detection':
+        targets = StringArray(np.frombuffer(annotation_data, dtype=np.uint8), np.frombuffer(annotation_offsets, dtype=np.uint64))
+    else:
+        task_type = 'multilabel_classification' if is_multilabel else 'multiclass_classification'
+        targets = RaggedArray(np.frombuffer(label_values, dtype=np.int64), np.frombuffer(label_offsets, dtype=np.uint64))
+    return Manifest(task_type, image_paths, targets, frozenset(zip_filepaths))
 
 
 class ImageDataset:
-    def __init__(self, filename, transform):
+    task_type = None
+
+    def __init__(self, filename, transform, manifest=None):
         filepath = pathlib.Path(filename)
+        self.filepath = filepath
         self.transform = transform
-        self.images = []
+        self.decoder = PILDecoder()
+        self.min_image_size = None  # If set, images are decoded at a reduced resolution whose shorter side is larger than this size.
+        self.profiler = None  # PipelineProfiler. If set, the latency of each stage is recorded.
         self.base_dir = filepath.parent
         self.reader = FileReader(self.base_dir)
 
-        with open(filename) as f:
-            for line in f:
-                image_filepath, target = line.strip().split()
-                image_filepath = image_filepath.strip()
-                target = self._load_target(target)
-                self.images.append((image_filepath, target))
+        if ShardReader.is_shard(filepath):
+            self.shard = ShardReader(filepath)
+            assert self.shard.task_type == self.task_type
+            self.image_paths = self.shard.image_paths
+            self.targets = self.shard.targets
+            self._labels = self.shard.labels
+        else:
+            self.shard = None
+            manifest = manifest or parse_manifest(filepath)
+            self.image_paths = manifest.image_paths
+            self.targets = self._load_targets(manifest.targets)
+            for zip_filepath in manifest.zip_filepaths:
+                self.reader.get_zip_file(zip_filepath)  # Parse the zip index here so that the DataLoader workers don't need to.
 
-        max_label = self._get_max_label()
-        self._labels = self._load_labels(max_label)
+            max_label = self._get_max_label()
+            self._labels = self._load_labels(max_label)
 
     def _load_labels(self, max_label):
         """Load if there is labels.txt. If not, generate dummy labels"""
@@ -38,16 +109,30 @@ class ImageDataset:
         return self._labels
 
     def __len__(self):
-        return len(self.images)
+        return len(self.targets)
 
     def __getitem__(self, index):
-        image_filepath, target = self.images[index]
-        with self.reader.open(image_filepath, 'rb') as f:
-            image = PIL.Image.open(f)
-            image = image.convert('RGB')  # Some image might have 1-channel. Also this method makes sure that the image is loaded.
-        return self.transform(image, target)
-
-    def _load_target(self, target):
+        profile = self.profiler.profile if self.profiler else contextlib.nullcontext
+        with profile('read'):
+            data = self.read_image(index)
+        with profile('decode'):
+            image, original_size = self.decoder.decode(data, self.min_image_size)
+        target = self.targets[index]
+        if (image.shape[1], image.shape[0]) != original_size:
+            target = self._scale_target(target, image.shape[1] / original_size[0], image.shape[0] / original_size[1])
+        with profile('augment'):
+            return self.transform(image, target)
+
+    def read_image(self, index):
+        """Returns the encoded image. For shards and stored zip members, it is a view of the underlying buffer."""
+        if self.shard:
+            return self.shard.get_image_bytes(index)
+        return self.reader.read(self.image_paths[index])
+
+    def _scale_target(self, target, scale_x, scale_y):
+        return target
+
+    def _load_targets(self, targets):
         raise NotImplementedError
 
     def _get_max_label(self):
@@ -55,42 +140,22 @@ class ImageDataset:
 
     @classmethod
     def from_file(cls, filename, transform):
-        dataset_type = cls._detect_type(filename)
+        if ShardReader.is_shard(filename):
+            manifest = None
+            dataset_type = ShardReader.read_header(filename)['task_type']
+        else:
+            manifest = parse_manifest(filename)
+            dataset_type = manifest.task_type
+
         if dataset_type == 'multiclass_classification':
-            return MulticlassClassificationDataset(filename, transform)
+            return MulticlassClassificationDataset(filename, transform, manifest)
         elif dataset_type == 'multilabel_classification':
-            return MultilabelClassificationDataset(filename, transform)
+            return MultilabelClassificationDataset(filename, transform, manifest)
         elif dataset_type == 'object_detection':
-            return ObjectDetectionDataset(filename, transform)
+            return ObjectDetectionDataset(filename, transform, manifest)
         else:
             raise NotImplementedError(f"Non supported dataset type: {dataset_type}")
 
-    @staticmethod
-    def _detect_type(filename):
-        with open(filename) as f:
-            for line in f:
-                _, labels = line.split()
-                if '@' in labels or '.' in labels:
-                    return 'object_detection'
-                if ',' in labels:
-                    return 'multilabel_classification'
-        return 'multiclass_classification'
-
-
-class ThreadSafeZipFile(zipfile.ZipFile):
-    def __init__(self, zip_filepath):
-        self.zip_filepath = zip_filepath
-        self.cache = {}
-
-    def open(self, filepath):
-        if os.getpid() not in self.cache:
-            self.cache[os.getpid()] = zipfile.ZipFile(self.zip_filepath)
-        return self.cache[os.getpid()].open(filepath, 'r')
-
-    def close(self):
-        for zip_file in self.cache.values():
-            zip_file.close()
-
 
 class FileReader:
     def __init__(self, base_dir):
@@ -100,45 +165,57 @@ class FileReader:
     def open(self, filepath, mode='r'):
         if '@' in filepath:
             zip_filepath, filepath = filepath.split('@')
-            if zip_filepath not in self.zipfile_cache:
-                self.zipfile_cache[zip_filepath] = ThreadSafeZipFile(self.base_dir / zip_filepath)
-            return self.zipfile_cache[zip_filepath].open(filepath)
+            return self.get_zip_file(zip_filepath).open(filepath)
         else:
             return open(self.base_dir / filepath, mode)
 
-    def __getstate__(self):
-        return {'base_dir': self.base_dir}
+    def read(self, filepath):
+        if '@' in filepath:
+            zip_filepath, filepath = filepath.split('@')
+            return self.get_zip_file(zip_filepath).read(filepath)
+        else:
+            return (self.base_dir / filepath).read_bytes()
 
-    def __setstate__(self, state):
-        self.base_dir = state['base_dir']
-        self.zipfile_cache = {}
+    def get_zip_file(self, zip_filepath):
+        """The member index of the zip file is kept in this cache. It is shared with the DataLoader workers through fork or pickle."""
+        if zip_filepath not in self.zipfile_cache:
+            self.zipfile_cache[zip_filepath] = IndexedZipFile(self.base_dir / zip_filepath)
+        return self.zipfile_cache[zip_filepath]
 
 
 class MulticlassClassificationDataset(ImageDataset):
+    task_type = 'multiclass_classification'
+
     def _get_max_label(self):
-        return max(i[1] for i in self.images)
+        return int(self.targets.max())
 
     @staticmethod
-    def _load_target(target):
-        return int(target)
+    def _load_targets(targets):
+        if len(targets.values) != len(targets):
+            raise ValueError("Multiclass classification dataset must have exactly one label per image.")
+        return targets.values
 
 
 class MultilabelClassificationDataset(ImageDataset):
+    task_type = 'multilabel_classification'
+
     def _get_max_label(self):
-        return max(j for i in self.images for j in i[1])
+        return int(self.targets.values.max())
 
     @staticmethod
-    def _load_target(target):
-        return [int(t) for t in target.split(',')]
+    def _load_targets(targets):
+        return targets
 
 
 class ObjectDetectionDataset(ImageDataset):
+    task_type = 'object_detection'
+
     def _get_max_label(self):
-        return max(j[0] for i in self.images for j in i[1])
-
-    def _load_target(self, targetpath):
-        with self.reader.open(targetpath) as f:
-            # label, x_min, y_min, x_max, y_max. Those are not normalized.
-            targets = [line.strip().split() for line in f]
-            targets = [(int(t[0]), int(float(t[1])), int(float(t[2])), int(float(t[3])), int(float(t[4]))) for t in targets]
-            return [t for t in targets if t[1] < t[3] and t[2] < t[4]]  # Remove invalid bounding boxes.
+        return int(self.targets.values[:, 0].max())
+
+    def _load_targets(self, targets):
+        return load_annotations(self.reader, self.filepath, targets)
+
+    def _scale_target(self, target, scale_x, scale_y):
+        """The box coordinates are in pixels, so they must be scaled together with the image."""
+        return target * np.array([1, scale_x, scale_y, scale_x, scale_y], dtype=np.float32)
@@ -0,0 +1,43 @@
+"""Helpers for caches on the local disk. The cache directory can be changed by MITORCH_CACHE_DIR environment variable."""
+import hashlib
+import os
+import pathlib
+import numpy as np
+
+
+def get_cache_dir(name):
+    cache_dir = pathlib.Path(os.getenv('MITORCH_CACHE_DIR') or pathlib.Path.home() / '.cache' / 'mitorch') / name
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def get_cache_key(*values):
+    return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+
+def get_file_stats(filepaths):
+    """Returns (size, mtime) of the files. Used to detect modifications without reading the files."""
+    stats = [os.stat(p) for p in filepaths]
+    return [(s.st_size, s.st_mtime_ns) for s in stats]
+
+
+def open_shared_memmap(filepath, dtype, shape):
+    """Open the .npy file, or create a zero-filled sparse file if it doesn't exist.
+
+    The file is created once even if multiple processes open it at the same time. Each process writes a temp file and hard-links it to the
+    destination. Only the first link succeeds, so every process maps the same file. Replacing the file instead would leave a process that has
+    already mapped it writing to an unlinked file.
+    """
+    if not filepath.exists():
+        temp_filepath = filepath.with_name(f'{filepath.name}.{os.getpid()}.tmp')
+        np.lib.format.open_memmap(temp_filepath, mode='w+', dtype=dtype, shape=shape).flush()
+        try:
+            os.link(temp_filepath, filepath)
+        except FileExistsError:
+            pass
+        temp_filepath.unlink()
+
+    array = np.lib.format.open_memmap(filepath, mode='r+')
+    if array.shape != tuple(shape) or array.dtype != dtype:
+        raise RuntimeError(f"{filepath} has shape {array.shape} and dtype {array.dtype}, but {tuple(shape)} {np.dtype(dtype)} is expected.")
+    return array
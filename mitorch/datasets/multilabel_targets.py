@@ -0,0 +1,27 @@
+"""Batched multilabel classification targets.
+
+A batch of targets is a uint8 multi-hot tensor of shape (N, num_classes). In the sparse mode, it is a sparse COO tensor of the same shape, which
+is much smaller if there are tens of thousands of classes.
+"""
+import numpy as np
+import torch
+
+
+def collate_multilabel_targets(targets, num_classes, sparse=False):
+    """Convert a list of label index arrays into a multi-hot tensor with a single scatter."""
+    counts = torch.tensor([len(t) for t in targets], dtype=torch.int64)
+    labels = torch.from_numpy(np.concatenate(targets).astype(np.int64)) if len(targets) else torch.zeros(0, dtype=torch.int64)
+    rows = torch.repeat_interleave(torch.arange(len(targets)), counts)
+    if sparse:
+        # coalesce() sums the values of the duplicated indices, so a repeated label is removed first to keep the values 1 like the dense mode.
+        keys = torch.unique(rows * num_classes + labels)
+        indices = torch.stack([torch.div(keys, num_classes, rounding_mode='floor'), keys % num_classes])
+        return torch.sparse_coo_tensor(indices, torch.ones(len(keys), dtype=torch.uint8), (len(targets), num_classes)).coalesce()
+
+    multi_hot = torch.zeros(len(targets), num_classes, dtype=torch.uint8)
+    multi_hot[rows, labels] = 1
+    return multi_hot
+
+
+def to_dense_multilabel_targets(targets):
+    return targets.to_dense() if targets.is_sparse else targets
@@ -0,0 +1,54 @@
+"""Array-backed sequences. They don't hold per-item python objects, so they can be shared by forked DataLoader workers without copy-on-write."""
+import numpy as np
+
+
+class StringArray:
+    """Sequence of strings stored in a single utf-8 blob with offsets."""
+    def __init__(self, data, offsets):
+        assert len(offsets) > 0 and offsets[0] == 0
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, strings):
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(s) for s in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.data[int(self.offsets[index]):int(self.offsets[index + 1])].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class RaggedArray:
+    """Sequence of variable-length arrays. The i-th item is values[offsets[i]:offsets[i+1]]."""
+    def __init__(self, values, offsets):
+        assert len(offsets) > 0 and offsets[0] == 0
+        self.values = values
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, arrays, dtype, item_shape=()):
+        offsets = np.zeros(len(arrays) + 1, dtype=np.uint64)
+        np.cumsum([len(a) for a in arrays], out=offsets[1:])
+        values = np.empty((int(offsets[-1]), *item_shape), dtype=dtype)
+        for i, a in enumerate(arrays):
+            if len(a):
+                values[int(offsets[i]):int(offsets[i + 1])] = a
+        return cls(values, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.values[int(self.offsets[index]):int(self.offsets[index + 1])]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
@@ -0,0 +1,74 @@
+"""Latency histograms of the data pipeline stages.
+
+The histograms are kept in shared memory tensors with one row per process (the main process and each DataLoader worker), so that the workers
+record without any IPC and the main process can aggregate them at any time.
+"""
+import contextlib
+import time
+import numpy as np
+import torch
+
+STAGES = ['read', 'decode', 'augment', 'collate', 'data_wait', 'step']
+BIN_EDGES = np.logspace(-6, 2, 81)  # 1us to 100s, 10 bins per decade.
+PERCENTILES = [50, 90, 99]
+
+
+class PipelineProfiler:
+    def __init__(self, num_workers):
+        self.counts = torch.zeros(num_workers + 1, len(STAGES), len(BIN_EDGES) + 1, dtype=torch.int64).share_memory_()
+        self.total_seconds = torch.zeros(num_workers + 1, len(STAGES), dtype=torch.float64).share_memory_()
+
+    def record(self, stage, seconds):
+        row = self._get_row()
+        stage_index = STAGES.index(stage)
+        counts, total_seconds = self.counts.numpy(), self.total_seconds.numpy()
+        counts[row, stage_index, np.searchsorted(BIN_EDGES, seconds)] += 1
+        total_seconds[row, stage_index] += seconds
+
+    @contextlib.contextmanager
+    def profile(self, stage):
+        start = time.perf_counter()
+        yield
+        self.record(stage, time.perf_counter() - start)
+
+    def reset(self):
+        self.counts.zero_()
+        self.total_seconds.zero_()
+
+    def get_stats(self):
+        """Returns {stage: {'count', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'total_seconds'}} aggregated over all processes."""
+        counts = self.counts.numpy().sum(axis=0)
+        total_seconds = self.total_seconds.numpy().sum(axis=0)
+        stats = {}
+        for i, stage in enumerate(STAGES):
+            num_samples = int(counts[i].sum())
+            if not num_samples:
+                continue
+            stats[stage] = {'count': num_samples, 'mean_ms': total_seconds[i] / num_samples * 1000, 'total_seconds': float(total_seconds[i])}
+            stats[stage].update({f'p{p}_ms': _get_percentile(counts[i], p) * 1000 for p in PERCENTILES})
+        return stats
+
+    def get_data_wait_fraction(self):
+        """The fraction of the training time that the main process waited for the DataLoader."""
+        total_seconds = self.total_seconds.numpy().sum(axis=0)
+        wait, step = total_seconds[STAGES.index('data_wait')], total_seconds[STAGES.index('step')]
+        return wait / (wait + step) if wait + step else 0.0
+
+    def get_metrics(self, prefix='profile_'):
+        """Flat dict for the training loggers."""
+        metrics = {f'{prefix}{stage}_{key}': float(value) for stage, s in self.get_stats().items() for key, value in s.items() if key.endswith('_ms')}
+        metrics[f'{prefix}data_wait_fraction'] = float(self.get_data_wait_fraction())
+        return metrics
+
+    @staticmethod
+    def _get_row():
+        worker_info = torch.utils.data.get_worker_info()
+        return worker_info.id + 1 if worker_info else 0
+
+
+def _get_percentile(counts, percentile):
+    """Returns the geometric center of the bin that contains the percentile."""
+    index = int(np.searchsorted(np.cumsum(counts), counts.sum() * percentile / 100))
+    lower = BIN_EDGES[index - 1] if index > 0 else BIN_EDGES[0]
+    upper = BIN_EDGES[index] if index < len(BIN_EDGES) else BIN_EDGES[-1]
+    return float(np.sqrt(lower * upper))
@@ -0,0 +1,86 @@
+"""Sampler that shuffles the dataset in blocks of images stored next to each other."""
+import math
+import numpy as np
+import torch
+
+
+def get_storage_order(dataset):
+    """Returns the dataset indices sorted by the location of the images. Zip members are sorted by their offsets in the zip file.
+
+    Shard files store the images in the index order. Loose files keep the order in the dataset file.
+    """
+    if dataset.shard:
+        return np.arange(len(dataset))
+
+    zip_ids = {}
+    file_keys = np.zeros(len(dataset), dtype=np.int64)
+    offsets = np.arange(len(dataset), dtype=np.int64)
+    for i, image_path in enumerate(dataset.image_paths):
+        if '@' in image_path:
+            zip_filepath, name = image_path.split('@')
+            zip_file = dataset.reader.get_zip_file(zip_filepath)
+            file_keys[i] = zip_ids.setdefault(zip_filepath, len(zip_ids) + 1)
+            offsets[i] = zip_file.header_offsets[zip_file.get_member_index(name)]
+    return np.lexsort((offsets, file_keys))
+
+
+class BlockShuffleSampler(torch.utils.data.distributed.DistributedSampler):
+    """Shuffle the blocks of block_size consecutive images, then shuffle the images within each window of window_size images.
+
+    Most reads are sequential within a few blocks while the order is close to random. The order is determined by the seed and the epoch.
+    In distributed training, each process gets a contiguous part of the shuffled order. If block_size and window_size are 1, it's a plain shuffle.
+
+    If start_index is set, the first start_index indices of this process are skipped in the next epoch. It's used to resume an interrupted epoch.
+
+    This is a subclass of DistributedSampler so that Lightning keeps it instead of replacing it with a DistributedSampler. The base class
+    constructor is not called since torch.distributed is not initialized when the DataLoader is built. The number of replicas and the rank are
+    read in each epoch.
+    """
+    def __init__(self, order, block_size=64, window_size=1024, seed=0, num_replicas=None, rank=None, drop_last=False):
+        self.order = np.asarray(order)
+        self.block_size = block_size
+        self.window_size = max(window_size, block_size)
+        self.seed = seed
+        self._num_replicas = num_replicas
+        self._rank = rank
+        self.drop_last = drop_last
+        self.epoch = 0
+        self.start_index = 0
+
+    @property
+    def num_replicas(self):
+        if self._num_replicas is not None:
+            return self._num_replicas
+        return torch.distributed.get_world_size() if torch.distributed.is_available() and torch.distributed.is_initialized() else 1
+
+    @property
+    def rank(self):
+        if self._rank is not None:
+            return self._rank
+        return torch.distributed.get_rank() if torch.distributed.is_available() and torch.distributed.is_initialized() else 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.order) // self.num_replicas
+        return math.ceil(len(self.order) / self.num_replicas)
+
+    def __iter__(self):
+        rng = np.random.default_rng((self.seed, self.epoch))
+        if self.block_size > 1:
+            blocks = np.split(self.order, range(self.block_size, len(self.order), self.block_size))
+            indices = np.concatenate([blocks[i] for i in rng.permutation(len(blocks))]) if blocks else self.order
+        else:
+            indices = rng.permutation(self.order)
+        if self.window_size > 1:
+            for start in range(0, len(indices), self.window_size):
+                rng.shuffle(indices[start:start + self.window_size])
+
+        num_samples = len(self)
+        total_size = num_samples * self.num_replicas
+        if total_size > len(indices):
+            indices = np.concatenate([indices, indices[:total_size - len(indices)]])
+        start_index, self.start_index = self.start_index, 0
+        return iter(indices[self.rank * num_samples + start_index:(self.rank + 1) * num_samples].tolist())
@@ -0,0 +1,201 @@
+"""Packed dataset shard.
+
+All encoded images are stored contiguously in a single file together with a binary offset index, so that a sample can be read by
+slicing a memory-mapped region instead of opening a file or a zip member.
+
+File layout:
+    MAGIC | section | section | ... | header (json) | header_offset (uint64) | header_size (uint64) | MAGIC
+
+Each section is a raw little-endian numpy array aligned to SECTION_ALIGNMENT bytes. The json header has the task type, the label names and
+the dtype/shape/offset of each section. The header is written last so that images can be streamed into the file.
+"""
+import io
+import json
+import mmap
+import os
+import pathlib
+import numpy as np
+from mitorch.datasets.packed_arrays import RaggedArray, StringArray
+
+MAGIC = b'MISHARD1'
+SECTION_ALIGNMENT = 64
+_TRAILER_SIZE = 16 + len(MAGIC)
+
+
+class MemoryViewFile(io.RawIOBase):
+    """Read-only file object over a memoryview. Reading doesn't copy the underlying buffer more than the caller asks for."""
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        size = min(len(b), len(self._buffer) - self._position)
+        b[:size] = self._buffer[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = len(self._buffer) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        self._buffer = None
+        super().close()
+
+
+class ShardWriter:
+    def __init__(self, filepath, task_type, labels):
+        self.filepath = pathlib.Path(filepath)
+        self.task_type = task_type
+        self.labels = list(labels)
+        self._temp_filepath = self.filepath.with_name(self.filepath.name + '.tmp')
+        self._file = open(self._temp_filepath, 'wb')
+        self._file.write(MAGIC)
+        self._image_offsets = [0]
+        self._image_paths = []
+        self._targets = []
+        self._sections = {}
+        self._image_data_offset = self._align()
+
+    def add(self, image_bytes, image_path, target):
+        self._file.write(image_bytes)
+        self._image_offsets.append(self._image_offsets[-1] + len(image_bytes))
+        self._image_paths.append(image_path)
+        self._targets.append(target)
+
+    def close(self):
+        self._sections['image_data'] = {'dtype': 'u1', 'shape': [self._image_offsets[-1]], 'offset': self._image_data_offset}
+        self._write_section('image_offsets', np.array(self._image_offsets, dtype=np.uint64))
+
+        paths = StringArray.from_list(self._image_paths)
+        self._write_section('path_data', paths.data)
+        self._write_section('path_offsets', paths.offsets)
+
+        if self.task_type == 'multiclass_classification':
+            self._write_section('target_values', np.array(self._targets, dtype=np.int64))
+        elif self.task_type == 'multilabel_classification':
+            targets = RaggedArray.from_list(self._targets, np.int64)
+            self._write_section('target_values', targets.values)
+            self._write_section('target_offsets', targets.offsets)
+        elif self.task_type == 'object_detection':
+            targets = RaggedArray.from_list(self._targets, np.int32, (5,))
+            self._write_section('target_values', targets.values)
+            self._write_section('target_offsets', targets.offsets)
+        else:
+            raise NotImplementedError(f"Non supported dataset type: {self.task_type}")
+
+        header = json.dumps({'version': 1, 'task_type': self.task_type, 'labels': self.labels, 'sections': self._sections}).encode('utf-8')
+        header_offset = self._file.tell()
+        self._file.write(header)
+        self._file.write(np.array([header_offset, len(header)], dtype='<u8').tobytes())
+        self._file.write(MAGIC)
+        self._file.close()
+        os.replace(self._temp_filepath, self.filepath)
+
+    def __len__(self):
+        return len(self._image_paths)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self._file.close()
+            self._temp_filepath.unlink()
+        else:
+            self.close()
+
+    def _align(self):
+        position = self._file.tell()
+        padding = -position % SECTION_ALIGNMENT
+        self._file.write(b'\0' * padding)
+        return position + padding
+
+    def _write_section(self, name, array):
+        array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+        offset = self._align()
+        self._file.write(array.tobytes())
+        self._sections[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+
+
+class ShardReader:
+    """Read a shard through mmap. Images and targets are zero-copy views of the mapped file."""
+    def __init__(self, filepath):
+        self.filepath = pathlib.Path(filepath)
+        self._open()
+
+    @staticmethod
+    def is_shard(filepath):
+        with open(filepath, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+
+    @staticmethod
+    def read_header(filepath):
+        with open(filepath, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{filepath} is not a shard file.")
+            f.seek(-_TRAILER_SIZE, os.SEEK_END)
+            trailer = f.read(_TRAILER_SIZE)
+            if trailer[16:] != MAGIC:
+                raise ValueError(f"{filepath} is truncated.")
+            header_offset, header_size = np.frombuffer(trailer[:16], dtype='<u8')
+            f.seek(int(header_offset))
+            return json.loads(f.read(int(header_size)))
+
+    @property
+    def task_type(self):
+        return self._header['task_type']
+
+    @property
+    def labels(self):
+        return self._header['labels']
+
+    def __len__(self):
+        return len(self.image_offsets) - 1
+
+    def get_image_bytes(self, index):
+        return self._image_data[int(self.image_offsets[index]):int(self.image_offsets[index + 1])]
+
+    def open(self, index):
+        return MemoryViewFile(self.get_image_bytes(index))
+
+    def _open(self):
+        self._header = self.read_header(self.filepath)
+        with open(self.filepath, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._image_data = memoryview(self._mmap)[self._header['sections']['image_data']['offset']:]
+        self.image_offsets = self._get_section('image_offsets')
+        self.image_paths = StringArray(self._get_section('path_data'), self._get_section('path_offsets'))
+        if self.task_type == 'multiclass_classification':
+            self.targets = self._get_section('target_values')
+        else:
+            self.targets = RaggedArray(self._get_section('target_values'), self._get_section('target_offsets'))
+
+    def _get_section(self, name):
+        section = self._header['sections'][name]
+        dtype = np.dtype(section['dtype'])
+        count = int(np.prod(section['shape'], dtype=np.int64))
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=section['offset']).reshape(section['shape'])
+
+    def __getstate__(self):
+        return {'filepath': self.filepath}
+
+    def __setstate__(self, state):
+        self.filepath = state['filepath']
+        self._open()
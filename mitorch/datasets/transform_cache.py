@@ -0,0 +1,89 @@
+"""Cache of the transformed images for deterministic transforms.
+
+The uint8 CHW images are stored in a memory-mapped .npy file on the local disk together with a flag array. The cache is filled by the DataLoader
+workers during the first pass. Since all processes map the same file, the later passes, the other DDP processes and the later jobs on the same
+machine read the images without decoding.
+"""
+import logging
+import numpy as np
+import torch
+from mitorch.datasets.local_cache import get_cache_dir, get_cache_key, get_file_stats, open_shared_memmap
+from mitorch.datasets.transforms import INPUT_MEAN
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+class TransformCache:
+    def __init__(self, cache_filepath, num_images, image_shape):
+        self.cache_filepath = cache_filepath
+        self.num_images = num_images
+        self.image_shape = tuple(image_shape)
+        self._images = None
+        self._flags = None
+
+    @classmethod
+    def create(cls, dataset, augmentations, input_size):
+        """The cache key is the dataset file and the zip files it refers to, the augmentation list and the input size."""
+        filepaths = [dataset.filepath] + [dataset.base_dir / z for z in dataset.reader.zipfile_cache]
+        key = get_cache_key(CACHE_VERSION, str(dataset.filepath.resolve()), get_file_stats(filepaths), list(augmentations), input_size)
+        cache_filepath = get_cache_dir('transformed') / key
+        logger.info(f"Transformed images of {dataset.filepath} are cached in {cache_filepath}")
+        return cls(cache_filepath, len(dataset), (3, input_size, input_size))
+
+    def get(self, index):
+        """Returns a copy of the cached image, or None if it's not cached yet."""
+        self._open()
+        if not self._flags[index]:
+            return None
+        return np.array(self._images[index])
+
+    def put(self, index, image):
+        self._open()
+        self._images[index] = image
+        self._flags[index] = 1  # Set after the image so that a reader never sees a partial image.
+
+    def _open(self):
+        """The files are mapped lazily in each process."""
+        if self._images is None:
+            self.cache_filepath.mkdir(parents=True, exist_ok=True)
+            self._images = open_shared_memmap(self.cache_filepath / 'images.npy', np.uint8, (self.num_images, *self.image_shape))
+            self._flags = open_shared_memmap(self.cache_filepath / 'flags.npy', np.uint8, (self.num_images,))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = state['_flags'] = None
+        return state
+
+
+class CachedTransformDataset(torch.utils.data.Dataset):
+    """Wraps an ImageDataset whose transform is deterministic and returns uint8 images.
+
+    If uint8_output is False, the images are normalized in the same way as the float transforms.
+    """
+    def __init__(self, dataset, cache, uint8_output):
+        self.dataset = dataset
+        self.cache = cache
+        self.uint8_output = uint8_output
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        image = self.cache.get(index)
+        if image is None:
+            image, target = self.dataset[index]
+            self.cache.put(index, image.numpy())
+        else:
+            image, target = torch.from_numpy(image), self.dataset.targets[index]
+
+        if not self.uint8_output:
+            image = image.float().mul_(1 / 255).sub_(INPUT_MEAN[0])
+        return image, target
+
+    def __getattr__(self, name):
+        # labels, targets and other attributes of the original dataset.
+        if name == 'dataset':
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
@@ -1,3 +1,5 @@
+import numpy as np
+import PIL.Image
 import torchvision
 
 
@@ -5,11 +7,17 @@ INPUT_MEAN = [0.5, 0.5, 0.5]
 
 
 class Transform:
-    def __init__(self, input_size, is_object_detection=False):
+    def __init__(self, input_size, is_object_detection=False, uint8_output=False):
         assert not is_object_detection
-        self._transform = torchvision.transforms.Compose(self.get_transforms(input_size))
+        if uint8_output:
+            output_transforms = [torchvision.transforms.PILToTensor()]
+        else:
+            output_transforms = [torchvision.transforms.ToTensor(), torchvision.transforms.Normalize(INPUT_MEAN, [1, 1, 1], inplace=True)]
+        self._transform = torchvision.transforms.Compose(self.get_transforms(input_size) + output_transforms)
 
     def __call__(self, image, target):
+        if isinstance(image, np.ndarray):
+            image = PIL.Image.fromarray(image)
         image = self._transform(image)
         return image, target
 
@@ -17,15 +25,11 @@ class Transform:
 class InceptionTransform(Transform):
     def get_transforms(self, input_size):
         return [torchvision.transforms.RandomResizedCrop(input_size),
-                torchvision.transforms.ColorJitter(brightness=0.1, contrast=0.1, saturation=0.1, hue=0.1),
-                torchvision.transforms.ToTensor(),
-                torchvision.transforms.Normalize(INPUT_MEAN, [1, 1, 1], inplace=True)]
+                torchvision.transforms.ColorJitter(brightness=0.1, contrast=0.1, saturation=0.1, hue=0.1)]
 
 
 class AutoAugmentTransform(Transform):
     def get_transforms(self, input_size):
         return [torchvision.transforms.RandomResizedCrop(input_size),
                 torchvision.transforms.RandomHorizontalFlip(),
-                torchvision.transforms.AutoAugment(interpolation=torchvision.transforms.InterpolationMode.BICUBIC),
-                torchvision.transforms.ToTensor(),
-                torchvision.transforms.Normalize(INPUT_MEAN, [1, 1, 1], inplace=True)]
+                torchvision.transforms.AutoAugment(interpolation=torchvision.transforms.InterpolationMode.BICUBIC)]
@@ -0,0 +1,122 @@
+"""Zip file reader for random access to the members.
+
+The central directory is parsed only once and the member table, including the names, is kept in numpy arrays, so that it is shared by forked
+DataLoader workers without copy-on-write and is pickled together with the reader. A name is looked up by binary search on the sorted hashes of
+the names. Members are read with a single os.pread() call without creating a ZipFile object. Since pread() doesn't
+use the file position, one file descriptor can be shared by threads and by forked processes.
+"""
+import hashlib
+import io
+import os
+import struct
+import threading
+import zipfile
+import zlib
+import numpy as np
+from mitorch.datasets.packed_arrays import StringArray
+from mitorch.datasets.shard import MemoryViewFile
+
+_LOCAL_HEADER_FORMAT = '<4s5H3L2H'
+_LOCAL_HEADER_SIZE = struct.calcsize(_LOCAL_HEADER_FORMAT)
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+_LOCAL_EXTRA_SLACK = 64  # Read a few more bytes so that the local header and the data can be read at once in most cases.
+
+
+def _hash_name(name):
+    """Stable across processes, unlike hash()."""
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class IndexedZipFile:
+    def __init__(self, zip_filepath):
+        self.zip_filepath = zip_filepath
+        with zipfile.ZipFile(zip_filepath) as zip_file:
+            infos = zip_file.infolist()
+
+        self.member_names = StringArray.from_list([info.filename for info in infos])
+        name_hashes = np.array([_hash_name(info.filename) for info in infos], dtype=np.uint64)
+        self._hash_order = np.argsort(name_hashes, kind='stable')
+        self._sorted_name_hashes = name_hashes[self._hash_order]
+        self.header_offsets = np.array([info.header_offset for info in infos], dtype=np.int64)
+        self.compressed_sizes = np.array([info.compress_size for info in infos], dtype=np.int64)
+        self.file_sizes = np.array([info.file_size for info in infos], dtype=np.int64)
+        self.name_sizes = np.array([len(info.orig_filename.encode('utf-8')) for info in infos], dtype=np.int64)
+        self.compress_types = np.array([info.compress_type for info in infos], dtype=np.uint16)
+        self.is_encrypted = np.array([info.flag_bits & 0x1 for info in infos], dtype=bool)
+        self._init_handles()
+
+    def get_member_index(self, filepath):
+        """Returns the index of the member in the central directory. If there are duplicated names, the last one is used like ZipFile."""
+        name_hash = np.uint64(_hash_name(filepath))
+        start = np.searchsorted(self._sorted_name_hashes, name_hash, 'left')
+        end = np.searchsorted(self._sorted_name_hashes, name_hash, 'right')
+        for index in reversed(self._hash_order[start:end]):
+            if self.member_names[index] == filepath:
+                return int(index)
+        raise KeyError(f"There is no item named {filepath!r} in {self.zip_filepath}")
+
+    def read(self, filepath):
+        """Returns the content of the member. For stored members, it is a view of the read buffer."""
+        index = self.get_member_index(filepath)
+        compress_type = self.compress_types[index]
+        if self.is_encrypted[index] or compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            return self._get_fallback_zip_file().read(filepath)
+
+        header_offset = int(self.header_offsets[index])
+        compressed_size = int(self.compressed_sizes[index])
+        buffer = os.pread(self._get_fd(), _LOCAL_HEADER_SIZE + int(self.name_sizes[index]) + _LOCAL_EXTRA_SLACK + compressed_size, header_offset)
+        header = struct.unpack_from(_LOCAL_HEADER_FORMAT, buffer)
+        if header[0] != _LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f"Bad local file header: {self.zip_filepath}@{filepath}")
+
+        data_offset = _LOCAL_HEADER_SIZE + header[9] + header[10]  # name length and extra field length.
+        data = memoryview(buffer)[data_offset:data_offset + compressed_size]
+        if len(data) < compressed_size:
+            data = os.pread(self._get_fd(), compressed_size, header_offset + data_offset)
+
+        if compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -zlib.MAX_WBITS, int(self.file_sizes[index]))
+        return data
+
+    def open(self, filepath):
+        data = self.read(filepath)
+        return MemoryViewFile(data) if isinstance(data, memoryview) else io.BytesIO(data)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._fallback_zip_file:
+            self._fallback_zip_file.close()
+            self._fallback_zip_file = None
+
+    def _init_handles(self):
+        self._fd = None
+        self._fallback_zip_file = None
+        self._fallback_pid = None
+        self._lock = threading.Lock()
+
+    def _get_fd(self):
+        if self._fd is None:
+            with self._lock:
+                if self._fd is None:
+                    self._fd = os.open(self.zip_filepath, os.O_RDONLY)
+        return self._fd
+
+    def _get_fallback_zip_file(self):
+        """ZipFile for the members that cannot be read directly. ZipFile is not safe to share with the forked processes."""
+        with self._lock:
+            if self._fallback_pid != os.getpid():
+                self._fallback_zip_file = zipfile.ZipFile(self.zip_filepath)
+                self._fallback_pid = os.getpid()
+            return self._fallback_zip_file
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('_fd', '_fallback_zip_file', '_fallback_pid', '_lock'):
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_handles()
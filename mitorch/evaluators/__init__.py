@@ -1,3 +1,4 @@
+from .async_evaluator import AsyncEvaluator
 from .evaluator import MulticlassClassificationEvaluator, MultilabelClassificationEvaluator, ObjectDetectionEvaluator
 
-__all__ = ['MulticlassClassificationEvaluator', 'MultilabelClassificationEvaluator', 'ObjectDetectionEvaluator']
+__all__ = ['AsyncEvaluator', 'MulticlassClassificationEvaluator', 'MultilabelClassificationEvaluator', 'ObjectDetectionEvaluator']
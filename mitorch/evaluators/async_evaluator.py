@@ -0,0 +1,132 @@
+"""Run an evaluator in a background thread so that the validation loop doesn't wait for it."""
+import collections
+import logging
+import numbers
+import threading
+import numpy as np
+import torch
+from .evaluator import Evaluator
+
+logger = logging.getLogger(__name__)
+
+
+def _to_cpu(value):
+    """Start non-blocking copies of all tensors in the nested tuples and lists. Returns (copied value, whether a CUDA tensor was copied).
+
+    CUDA tensors are copied into pinned buffers. A copy into pageable memory would block the host until it's done.
+    """
+    if torch.is_tensor(value):
+        if not value.is_cuda:
+            return value.detach(), False
+        if value.is_sparse:
+            return value.detach().to('cpu'), True
+        return torch.empty(value.shape, dtype=value.dtype, pin_memory=True).copy_(value.detach(), non_blocking=True), True
+    if isinstance(value, (tuple, list)):
+        results = [_to_cpu(v) for v in value]
+        return type(value)(r[0] for r in results), any(r[1] for r in results)
+    return value, False
+
+
+def _get_nbytes(value):
+    """Size of the tensors and arrays in the nested tuples and lists. A python number, e.g. a box coordinate of a detection prediction, is counted
+    as 8 bytes."""
+    if isinstance(value, numbers.Number):
+        return 8
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if torch.is_tensor(value):
+        if value.is_sparse:
+            return _get_nbytes(value._indices()) + _get_nbytes(value._values())
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_get_nbytes(v) for v in value)
+    return 0
+
+
+class AsyncEvaluator(Evaluator):
+    """Wraps an evaluator and calls its add_predictions() in a background thread.
+
+    add_predictions() copies the tensors to the host without blocking and puts them into a queue. If the queue has max_queue_size batches or
+    max_queued_bytes bytes of tensors, it blocks until the worker catches up, so the host memory usage is bounded. The other methods wait until
+    the queue is drained. An exception in the worker is raised from the next call.
+    """
+    def __init__(self, evaluator, max_queue_size=16, max_queued_bytes=512 * 1024 * 1024):
+        self.evaluator = evaluator
+        self.max_queue_size = max_queue_size
+        self.max_queued_bytes = max_queued_bytes
+        self._queue = collections.deque()
+        self._queued_bytes = 0
+        self._num_processing = 0
+        self._error = None
+        self._condition = threading.Condition()
+        self._thread = None
+        super().__init__()
+
+    def add_predictions(self, predictions, targets):
+        (predictions, targets), copied_from_cuda = _to_cpu((predictions, targets))
+        event = None
+        if copied_from_cuda:
+            event = torch.cuda.Event()
+            event.record()
+        nbytes = _get_nbytes((predictions, targets))
+
+        with self._condition:
+            self._raise_error()
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            # A batch larger than the cap is accepted once the queue is empty.
+            self._condition.wait_for(lambda: self._error or (len(self._queue) < self.max_queue_size and (not self._queue or self._queued_bytes + nbytes <= self.max_queued_bytes)))
+            self._raise_error()
+            self._queue.append((predictions, targets, event, nbytes))
+            self._queued_bytes += nbytes
+            self._condition.notify_all()
+
+    def get_report(self):
+        self.wait()
+        return self.evaluator.get_report()
+
+    def synchronize(self):
+        self.wait()
+        self.evaluator.synchronize()
+
+    def _synchronize(self):
+        pass
+
+    def reset(self):
+        if self._thread:
+            self.wait()
+        self.evaluator.reset()
+
+    def wait(self):
+        """Wait until all queued batches are evaluated."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._error or (not self._queue and not self._num_processing))
+            self._raise_error()
+
+    def _raise_error(self):
+        if self._error:
+            error, self._error = self._error, None
+            self._queue.clear()
+            self._queued_bytes = 0
+            raise RuntimeError("Failed to evaluate predictions in the background thread.") from error
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue)
+                predictions, targets, event, nbytes = self._queue.popleft()
+                self._num_processing += 1
+            try:
+                if event:
+                    event.synchronize()
+                self.evaluator.add_predictions(predictions, targets)
+            except Exception as e:
+                logger.exception("Failed to evaluate predictions.")
+                with self._condition:
+                    self._error = e
+            finally:
+                with self._condition:
+                    self._num_processing -= 1
+                    self._queued_bytes -= nbytes
+                    self._condition.notify_all()
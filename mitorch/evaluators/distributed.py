@@ -0,0 +1,40 @@
+"""Collective operations used to merge the evaluator states of all processes."""
+import torch
+
+
+def is_distributed():
+    return torch.distributed.is_available() and torch.distributed.is_initialized() and torch.distributed.get_world_size() > 1
+
+
+def get_communication_device():
+    """NCCL only supports CUDA tensors. Other backends such as gloo use CPU tensors."""
+    if torch.distributed.get_backend() == 'nccl':
+        return torch.device('cuda', torch.cuda.current_device())
+    return torch.device('cpu')
+
+
+def all_reduce_sum(tensor):
+    """Returns the sum of the tensor over all processes. The tensor is on the same device as the input."""
+    reduced = tensor.to(get_communication_device(), copy=True)
+    torch.distributed.all_reduce(reduced)
+    return reduced.to(tensor.device)
+
+
+def all_gather_cat(tensor):
+    """Concatenate the tensors of all processes along the first dimension. The first dimension can be different in each process."""
+    device = get_communication_device()
+    world_size = torch.distributed.get_world_size()
+    is_bool = tensor.dtype == torch.bool
+    padded = tensor.to(device, torch.uint8 if is_bool else tensor.dtype)
+
+    size = torch.tensor([len(tensor)], dtype=torch.int64, device=device)
+    sizes = [torch.zeros_like(size) for _ in range(world_size)]
+    torch.distributed.all_gather(sizes, size)
+    sizes = [int(s) for s in sizes]
+
+    if len(tensor) < max(sizes):
+        padded = torch.cat([padded, padded.new_zeros((max(sizes) - len(tensor), *tensor.shape[1:]))])
+    gathered = [torch.empty_like(padded) for _ in range(world_size)]
+    torch.distributed.all_gather(gathered, padded)
+    result = torch.cat([g[:s] for g, s in zip(gathered, sizes)]).to(tensor.device)
+    return result.bool() if is_bool else result
@@ -1,12 +1,11 @@
 from abc import ABC, abstractmethod
-import collections
 import logging
-import math
-import statistics
 
 import numpy as np
-import sklearn.metrics
 import torch
+from mitorch.datasets.detection_targets import is_padded_detection_targets
+from mitorch.datasets.multilabel_targets import to_dense_multilabel_targets
+from .distributed import all_gather_cat, all_reduce_sum, is_distributed
 
 
 logger = logging.getLogger(__name__)
@@ -26,214 +25,348 @@ class Evaluator(ABC):
     def get_report(self):
         pass
 
+    def synchronize(self):
+        """Merge the states of all processes so that get_report() returns the result on the whole dataset. Does nothing without torch.distributed.
+
+        This is a collective operation. All processes must call it.
+        """
+        if is_distributed():
+            self._synchronize()
+
+    @abstractmethod
+    def _synchronize(self):
+        pass
+
     @abstractmethod
     def reset(self):
         pass
 
 
+class _AveragePrecisionAccumulator:
+    """Accumulates the scores and the binary labels on their device to compute the average precision over all of them.
+
+    If num_bins is given, the scores are accumulated into histograms of positives and negatives, and the scores in the same bin are treated as
+    ties. Otherwise all scores are kept and the AP is exact.
+    """
+    def __init__(self, num_bins):
+        self.num_bins = num_bins
+        self.positive_histogram = None
+        self.negative_histogram = None
+        self.scores = []
+        self.labels = []
+
+    def add(self, scores, labels):
+        if self.num_bins:
+            if self.positive_histogram is None:
+                self.positive_histogram = torch.zeros(self.num_bins, dtype=torch.int64, device=scores.device)
+                self.negative_histogram = torch.zeros(self.num_bins, dtype=torch.int64, device=scores.device)
+            bins = (scores.detach().float() * self.num_bins).long().clamp_(0, self.num_bins - 1).view(-1)
+            positives = labels.view(-1).long()
+            self.positive_histogram.index_add_(0, bins, positives)
+            self.negative_histogram.index_add_(0, bins, 1 - positives)
+        else:
+            self.scores.append(scores.detach().float().view(-1))
+            self.labels.append(labels.bool().view(-1))
+
+    def get_average_precision(self):
+        if self.num_bins:
+            if self.positive_histogram is None:
+                return 0.0
+            # Thresholds from the highest bin.
+            positives = self.positive_histogram.flip(0).double()
+            negatives = self.negative_histogram.flip(0).double()
+        else:
+            if not self.scores:
+                return 0.0
+            scores, order = torch.cat(self.scores).sort(descending=True)
+            labels = torch.cat(self.labels)[order].double()
+            # Group the tied scores into one threshold like sklearn.
+            _, counts = torch.unique_consecutive(scores, return_counts=True)
+            group_indices = torch.repeat_interleave(torch.arange(len(counts), device=scores.device), counts)
+            positives = torch.zeros(len(counts), dtype=torch.float64, device=scores.device).index_add_(0, group_indices, labels)
+            negatives = counts.double() - positives
+
+        tp = positives.cumsum(0)
+        fp = negatives.cumsum(0)
+        num_positives = tp[-1]
+        if num_positives == 0:
+            return 0.0
+        precision = tp / (tp + fp).clamp(min=1)
+        return float((precision * positives).sum() / num_positives)
+
+    def synchronize(self, device):
+        if self.num_bins:
+            if self.positive_histogram is None:
+                histograms = torch.zeros(2, self.num_bins, dtype=torch.int64, device=device)
+            else:
+                histograms = torch.stack([self.positive_histogram, self.negative_histogram])
+            self.positive_histogram, self.negative_histogram = all_reduce_sum(histograms)
+        else:
+            self.scores = [all_gather_cat(torch.cat(self.scores) if self.scores else torch.zeros(0, device=device))]
+            self.labels = [all_gather_cat(torch.cat(self.labels) if self.labels else torch.zeros(0, dtype=torch.bool, device=device))]
+
+
 class MulticlassClassificationEvaluator(Evaluator):
+    """Accumulates the statistics on the device of the predictions. No host-device sync happens until get_report() is called.
+
+    The average precision is computed over all (image, class) pairs in the dataset. If num_bins is given, the scores are accumulated into histograms
+    of positive and negative pairs, and the scores in the same bin are treated as ties. Otherwise all scores are kept and the AP is exact.
+    """
+    def __init__(self, num_bins=10000):
+        self.num_bins = num_bins
+        super().__init__()
+
     def add_predictions(self, predictions, targets):
         """ Evaluate a batch of predictions.
         Args:
-            predictions: the model output tensor. Shape (N, num_class)
+            predictions: the model output tensor. Probabilities of shape (N, num_class)
             targets: the golden truths. Shape (N,)
         """
         assert len(predictions) == len(targets)
         assert len(targets.shape) == 1
 
-        # top-1 accuracy
-        _, indices = torch.topk(predictions, 1)
-        correct = indices.view(-1).eq(targets)
-        correct_num = int(correct.long().sum(0))
-        self.top1_correct_num += correct_num
+        targets = targets.to(predictions.device).long()
+        if self.top1_correct_num is None:
+            self.top1_correct_num = torch.zeros((), dtype=torch.int64, device=predictions.device)
+            self.top5_correct_num = torch.zeros((), dtype=torch.int64, device=predictions.device)
 
-        # top-5 accuracy
         k = min(5, predictions.shape[1])
         _, indices = torch.topk(predictions, k)
-        correct = indices == targets.view(-1, 1).long().expand(-1, k)
-        self.top5_correct_num += int(correct.long().sum())
-
-        # Average precision
-        target_vec = torch.zeros_like(predictions, dtype=torch.uint8)
-        for i, t in enumerate(targets):
-            target_vec[i, t] = 1
-        ap = sklearn.metrics.average_precision_score(target_vec.view(-1).cpu().numpy(), predictions.view(-1).cpu().numpy(), average='macro')
-        self.ap += ap * len(predictions)
+        correct = indices == targets.view(-1, 1)
+        self.top1_correct_num += correct[:, 0].sum()
+        self.top5_correct_num += correct.sum()
         self.total_num += len(predictions)
 
+        one_hot = torch.zeros_like(predictions, dtype=torch.bool).scatter_(1, targets.view(-1, 1), True)
+        self.average_precision.add(predictions, one_hot)
+
     def get_report(self):
-        return {'top1_accuracy': float(self.top1_correct_num) / self.total_num if self.total_num else 0.0,
-                'top5_accuracy': float(self.top5_correct_num) / self.total_num if self.total_num else 0.0,
-                'average_precision': self.ap / self.total_num if self.total_num else 0.0}
+        if not self.total_num:
+            return {'top1_accuracy': 0.0, 'top5_accuracy': 0.0, 'average_precision': 0.0}
+        return {'top1_accuracy': float(self.top1_correct_num) / self.total_num,
+                'top5_accuracy': float(self.top5_correct_num) / self.total_num,
+                'average_precision': self.average_precision.get_average_precision()}
+
+    def _synchronize(self):
+        device = self.top1_correct_num.device if self.top1_correct_num is not None else torch.device('cpu')
+        counts = torch.tensor([0, 0, self.total_num], dtype=torch.int64, device=device)
+        if self.top1_correct_num is not None:
+            counts[0], counts[1] = self.top1_correct_num, self.top5_correct_num
+        counts = all_reduce_sum(counts)
+        self.top1_correct_num, self.top5_correct_num, self.total_num = counts[0], counts[1], int(counts[2])
+        self.average_precision.synchronize(device)
 
     def reset(self):
-        self.top1_correct_num = 0
-        self.top5_correct_num = 0
-        self.ap = 0
+        self.top1_correct_num = None
+        self.top5_correct_num = None
         self.total_num = 0
+        self.average_precision = _AveragePrecisionAccumulator(self.num_bins)
 
 
 class MultilabelClassificationEvaluator(Evaluator):
+    """Accumulates the statistics on the device of the predictions like MulticlassClassificationEvaluator.
+
+    The average precision is computed once in get_report() over all (image, class) pairs in the dataset. See _AveragePrecisionAccumulator for
+    num_bins.
+    """
+    def __init__(self, num_bins=10000):
+        self.num_bins = num_bins
+        super().__init__()
+
     def add_predictions(self, predictions, targets):
         """ Evaluate a batch of predictions.
         Args:
             predictions: the model output tensor. Shape (N, num_class)
-            targets: the golden truths. Shape (N, num_class)
+            targets: the golden truths. Multi-hot dense or sparse tensor of shape (N, num_class)
         """
         assert len(predictions) == len(targets)
-        targets = targets.to(torch.uint8)
-        num = torch.mul(predictions > 0.5, targets).long().sum(1)  # shape (N,)
-        den = torch.add(predictions > 0.5, targets).ge(1).long().sum(1)  # shape (N,)
-        den[den == 0] = 1  # To avoid zero-division. If den==0, num should be zero as well.
-        self.correct_num += torch.sum(num.to(torch.float32) / den.to(torch.float32))
-
-        ap = sklearn.metrics.average_precision_score(targets.view(-1).cpu().numpy(), predictions.view(-1).cpu().numpy(), average='macro')
-        self.ap += ap * len(predictions)
+        targets = to_dense_multilabel_targets(targets).to(predictions.device, torch.bool)
+        if self.correct_num is None:
+            self.correct_num = torch.zeros((), dtype=torch.float64, device=predictions.device)
+
+        predicted = predictions > 0.5
+        num = (predicted & targets).sum(1)  # shape (N,)
+        den = (predicted | targets).sum(1).clamp_(min=1)  # To avoid zero-division. If den==0, num should be zero as well.
+        self.correct_num += (num.double() / den.double()).sum()
         self.total_num += len(predictions)
+        self.average_precision.add(predictions, targets)
 
     def get_report(self):
-        return {'accuracy_50': float(self.correct_num) / self.total_num if self.total_num else 0.0,
-                'average_precision': self.ap / self.total_num if self.total_num else 0.0}
+        if not self.total_num:
+            return {'accuracy_50': 0.0, 'average_precision': 0.0}
+        return {'accuracy_50': float(self.correct_num) / self.total_num,
+                'average_precision': self.average_precision.get_average_precision()}
+
+    def _synchronize(self):
+        device = self.correct_num.device if self.correct_num is not None else torch.device('cpu')
+        correct_num = self.correct_num if self.correct_num is not None else torch.zeros((), dtype=torch.float64, device=device)
+        sums = all_reduce_sum(torch.stack([correct_num, torch.tensor(self.total_num, dtype=torch.float64, device=device)]))
+        self.correct_num, self.total_num = sums[0], int(sums[1])
+        self.average_precision.synchronize(device)
 
     def reset(self):
-        self.correct_num = 0
-        self.ap = 0
+        self.correct_num = None
         self.total_num = 0
+        self.average_precision = _AveragePrecisionAccumulator(self.num_bins)
 
 
-class ObjectDetectionSingleIOUEvaluator(Evaluator):
-    def __init__(self, iou):
-        super(ObjectDetectionSingleIOUEvaluator, self).__init__()
-        self.iou = iou
+class _GrowableArray:
+    """Numpy array that doubles its capacity when it's full. The first dimension is the growing one."""
+    def __init__(self, dtype, item_shape=()):
+        self._data = np.zeros((1024, *item_shape), dtype=dtype)
+        self._size = 0
 
-    def add_predictions(self, predictions, targets):
-        """ Evaluate list of image with object detection results using single IOU evaluation.
-        Args:
-            predictions: list of predictions [[[label_idx, probability, L, T, R, B], ...], [...], ...]
-            targets: list of image targets [[[label_idx, L, T, R, B], ...], ...]
-        """
+    def extend(self, values):
+        if self._size + len(values) > len(self._data):
+            new_data = np.zeros((max(len(self._data) * 2, self._size + len(values)), *self._data.shape[1:]), dtype=self._data.dtype)
+            new_data[:self._size] = self._data[:self._size]
+            self._data = new_data
+        self._data[self._size:self._size + len(values)] = values
+        self._size += len(values)
 
-        assert len(predictions) == len(targets)
+    @property
+    def values(self):
+        return self._data[:self._size]
 
-        for p in predictions:
-            for bbox in p:
-                if not all(math.isfinite(x) for x in bbox):
-                    logger.warning(f"Predicted results have invalid numbers.: {bbox}")
-
-        eval_predictions = collections.defaultdict(list)
-        eval_ground_truths = collections.defaultdict(dict)
-        for img_idx, prediction in enumerate(predictions):
-            for bbox in prediction:
-                label = int(bbox[0])
-                eval_predictions[label].append([img_idx, float(bbox[1]), float(bbox[2]), float(bbox[3]), float(bbox[4]), float(bbox[5])])
-
-        for img_idx, target in enumerate(targets):
-            for bbox in target:
-                label = int(bbox[0])
-                if img_idx not in eval_ground_truths[label]:
-                    eval_ground_truths[label][img_idx] = []
-                eval_ground_truths[label][img_idx].append([float(bbox[1]), float(bbox[2]), float(bbox[3]), float(bbox[4])])
-
-        class_indices = set(list(eval_predictions.keys()) + list(eval_ground_truths.keys()))
-        for class_index in class_indices:
-            is_correct, probabilities = self._evaluate_predictions(eval_ground_truths[class_index], eval_predictions[class_index], self.iou)
-            true_num = sum([len(x) for x in eval_ground_truths[class_index].values()])
-
-            self.is_correct[class_index].extend(is_correct)
-            self.probabilities[class_index].extend(probabilities)
-            self.true_num[class_index] += true_num
-
-    def _calculate_area(self, rect):
-        w = rect[2] - rect[0]+1e-5
-        h = rect[3] - rect[1]+1e-5
-        return float(w * h) if w > 0 and h > 0 else 0.0
-
-    def _calculate_iou(self, rect0, rect1):
-        rect_intersect = [max(rect0[0], rect1[0]),
-                          max(rect0[1], rect1[1]),
-                          min(rect0[2], rect1[2]),
-                          min(rect0[3], rect1[3])]
-        area_intersect = self._calculate_area(rect_intersect)
-        return area_intersect / (self._calculate_area(rect0) + self._calculate_area(rect1) - area_intersect)
-
-    def _is_true_positive(self, prediction, ground_truth, already_detected, iou_threshold):
-        image_id = prediction[0]
-        prediction_rect = prediction[2:6]
-        if image_id not in ground_truth:
-            return False, already_detected
-
-        ious = np.array([self._calculate_iou(prediction_rect, g) for g in ground_truth[image_id]])
-        best_bb = np.argmax(ious)
-        best_iou = ious[best_bb]
-
-        if best_iou < iou_threshold or (image_id, best_bb) in already_detected:
-            return False, already_detected
-
-        already_detected.add((image_id, best_bb))
-        return True, already_detected
-
-    def _evaluate_predictions(self, ground_truths, predictions, iou_threshold):
-        """ Evaluate the correctness of the given predictions.
-        Args:
-            ground_truths: List of ground truths for the class. {image_id: [[left, top, right, bottom], [...]], ...}
-            predictions: List of predictions for the class. [[image_id, probability, left, top, right, bottom], [...], ...]
-            iou_threshold: Minimum IOU hreshold to be considered as a same bounding box.
-        """
 
-        # Sort the predictions by the probability
-        sorted_predictions = sorted(predictions, key=lambda x: -x[1])
-        already_detected = set()
-        is_correct = []
-        for prediction in sorted_predictions:
-            correct, already_detected = self._is_true_positive(prediction, ground_truths, already_detected,
-                                                               iou_threshold)
-            is_correct.append(correct)
+def _calculate_ious(boxes0, boxes1):
+    """Element-wise IoU of (N, 4) boxes. 1e-5 is added to the width and height so that the zero-area boxes are not ignored."""
+    def area(lt, rb):
+        wh = rb - lt + 1e-5
+        return np.where((wh > 0).all(axis=1), wh[:, 0] * wh[:, 1], 0.0)
 
-        is_correct = np.array(is_correct)
-        probabilities = np.array([p[1] for p in sorted_predictions])
+    area_intersect = area(np.maximum(boxes0[:, :2], boxes1[:, :2]), np.minimum(boxes0[:, 2:], boxes1[:, 2:]))
+    return area_intersect / (area(boxes0[:, :2], boxes0[:, 2:]) + area(boxes1[:, :2], boxes1[:, 2:]) - area_intersect)
 
-        return is_correct, probabilities
 
-    def _calculate_average_precision(self, is_correct, probabilities, true_num):
-        if true_num == 0:
-            return 0
-        if not is_correct or not any(is_correct):
-            return 0
-        recall = float(np.sum(is_correct)) / true_num
-        return sklearn.metrics.average_precision_score(is_correct, probabilities) * recall
+def _calculate_average_precision(is_correct, probabilities):
+    """Same as sklearn.metrics.average_precision_score(is_correct, probabilities). The tied scores are grouped into one threshold."""
+    order = np.argsort(-probabilities, kind='stable')
+    probabilities, is_correct = probabilities[order], is_correct[order]
+    last_of_ties = np.r_[np.flatnonzero(np.diff(probabilities)), len(probabilities) - 1]
+    tp = np.cumsum(is_correct)[last_of_ties]
+    precision = tp / (last_of_ties + 1)
+    return float(np.sum(precision * np.diff(tp, prepend=0)) / tp[-1])
 
-    def get_report(self):
-        all_aps = []
-        for class_index in self.is_correct:
-            ap = self._calculate_average_precision(self.is_correct[class_index],
-                                                   self.probabilities[class_index],
-                                                   self.true_num[class_index])
-            all_aps.append(ap)
 
-        mean_ap = statistics.mean(all_aps) if all_aps else 0
-        return {'mAP_{}'.format(int(self.iou*100)): mean_ap}
+class ObjectDetectionEvaluator(Evaluator):
+    """Evaluate object detection results at multiple IoU thresholds.
 
-    def reset(self):
-        self.is_correct = collections.defaultdict(list)
-        self.probabilities = collections.defaultdict(list)
-        self.true_num = collections.defaultdict(int)
+    Predictions are greedily matched in the descending order of the probabilities. A prediction is a true positive if the ground truth with the
+    highest IoU in the same image and class is not matched yet and the IoU is not less than the threshold. Since the best ground truth doesn't
+    depend on the threshold, the IoUs are computed once and all thresholds are evaluated in the same pass.
 
+    If coco is True, mAP_50_95, the mean of mAP over IoU thresholds 0.5, 0.55, ..., 0.95, is also reported.
+    """
+    COCO_IOU_VALUES = [0.5 + 0.05 * i for i in range(10)]
 
-class ObjectDetectionEvaluator(Evaluator):
-    def __init__(self, iou_values=[0.3, 0.5, 0.75, 0.9]):
-        self.evaluators = [ObjectDetectionSingleIOUEvaluator(iou) for iou in iou_values]
-        super(ObjectDetectionEvaluator, self).__init__()
+    def __init__(self, iou_values=[0.3, 0.5, 0.75, 0.9], coco=False):
+        self.iou_values = list(iou_values)
+        self.coco = coco
+        self.thresholds = np.unique(np.round(self.iou_values + (self.COCO_IOU_VALUES if coco else []), 6))
+        super().__init__()
 
     def add_predictions(self, predictions, targets):
-        for evaluator in self.evaluators:
-            evaluator.add_predictions(predictions, targets)
+        """ Evaluate a batch of object detection results.
+        Args:
+            predictions: list of predictions [[[label_idx, probability, L, T, R, B], ...], [...], ...]
+            targets: list of image targets [[[label_idx, L, T, R, B], ...], ...], or a tuple of (padded targets, box counts) from the DataLoader.
+        """
+        if is_padded_detection_targets(targets):
+            padded, counts = targets
+            padded = padded.cpu().numpy()
+            targets = [padded[i, :c] for i, c in enumerate(counts.tolist())]
+
+        assert len(predictions) == len(targets)
+
+        predictions, prediction_images = self._concat(predictions, 6)
+        targets, target_images = self._concat(targets, 5)
+
+        if not np.isfinite(predictions).all():
+            logger.warning(f"Predicted results have invalid numbers.: {predictions[~np.isfinite(predictions).all(axis=1)]}")
+
+        prediction_classes = predictions[:, 0].astype(np.int64)
+        target_classes = targets[:, 0].astype(np.int64)
+
+        # Sort the predictions by (image, class, -probability) and the targets by (image, class). The sorts are stable.
+        prediction_order = np.lexsort((-predictions[:, 1], prediction_classes, prediction_images))
+        predictions, prediction_classes, prediction_images = predictions[prediction_order], prediction_classes[prediction_order], prediction_images[prediction_order]
+        target_order = np.lexsort((target_classes, target_images))
+        targets, target_classes, target_images = targets[target_order], target_classes[target_order], target_images[target_order]
+
+        # The candidate ground truths of each prediction are a contiguous range of the sorted targets.
+        num_classes = max(prediction_classes.max(initial=-1), target_classes.max(initial=-1)) + 1
+        target_keys = target_images * num_classes + target_classes
+        prediction_keys = prediction_images * num_classes + prediction_classes
+        starts = np.searchsorted(target_keys, prediction_keys, side='left')
+        ends = np.searchsorted(target_keys, prediction_keys, side='right')
+
+        num_candidates = ends - starts
+        pair_predictions = np.repeat(np.arange(len(predictions)), num_candidates)
+        pair_targets = np.repeat(starts, num_candidates) + np.arange(num_candidates.sum()) - np.repeat(np.cumsum(num_candidates) - num_candidates, num_candidates)
+        ious = _calculate_ious(predictions[pair_predictions, 2:6], targets[pair_targets, 1:5])
+
+        # The first ground truth with the highest IoU for each prediction.
+        best_ious = np.full(len(predictions), -1.0)
+        np.maximum.at(best_ious, pair_predictions, ious)
+        is_best = ious == best_ious[pair_predictions]
+        best_pair_predictions, first_indices = np.unique(pair_predictions[is_best], return_index=True)
+        best_targets = np.full(len(predictions), -1)
+        best_targets[best_pair_predictions] = pair_targets[is_best][first_indices]
+
+        # For each threshold, only the first prediction matched to a ground truth is correct.
+        is_correct = np.zeros((len(self.thresholds), len(predictions)), dtype=bool)
+        threshold_indices, prediction_indices = np.nonzero(best_ious[None, :] >= self.thresholds[:, None])
+        _, first_indices = np.unique(threshold_indices * len(targets) + best_targets[prediction_indices], return_index=True)
+        is_correct[threshold_indices[first_indices], prediction_indices[first_indices]] = True
+
+        self.probabilities.extend(predictions[:, 1])
+        self.prediction_classes.extend(prediction_classes)
+        self.is_correct.extend(is_correct.T)
+        self.target_classes.extend(target_classes)
 
     def get_report(self):
+        prediction_classes = self.prediction_classes.values
+        probabilities = self.probabilities.values
+        is_correct = self.is_correct.values
+        target_classes = self.target_classes.values
+        classes = np.union1d(prediction_classes, target_classes)
+        true_nums = {c: n for c, n in zip(*np.unique(target_classes, return_counts=True))}
+
+        # mAP for each threshold. Shape (num_thresholds,)
+        aps = np.zeros((len(classes), len(self.thresholds)))
+        for i, c in enumerate(classes):
+            true_num = true_nums.get(c, 0)
+            mask = prediction_classes == c
+            for j in range(len(self.thresholds)):
+                num_correct = is_correct[mask, j].sum()
+                if true_num and num_correct:
+                    aps[i, j] = _calculate_average_precision(is_correct[mask, j], probabilities[mask]) * num_correct / true_num
+        mean_aps = aps.mean(axis=0) if len(classes) else np.zeros(len(self.thresholds))
+
         report = {}
-        for evaluator in self.evaluators:
-            report.update(evaluator.get_report())
+        for iou in self.iou_values:
+            report['mAP_{}'.format(int(iou * 100))] = float(mean_aps[np.searchsorted(self.thresholds, round(iou, 6))])
+        if self.coco:
+            report['mAP_50_95'] = float(np.mean([mean_aps[np.searchsorted(self.thresholds, round(iou, 6))] for iou in self.COCO_IOU_VALUES]))
         return report
 
+    def _synchronize(self):
+        for name in ('probabilities', 'prediction_classes', 'is_correct', 'target_classes'):
+            values = all_gather_cat(torch.from_numpy(getattr(self, name).values)).numpy()
+            array = _GrowableArray(values.dtype, values.shape[1:])
+            array.extend(values)
+            setattr(self, name, array)
+
     def reset(self):
-        for evaluator in self.evaluators:
-            evaluator.reset()
+        self.probabilities = _GrowableArray(np.float64)
+        self.prediction_classes = _GrowableArray(np.int64)
+        self.is_correct = _GrowableArray(bool, (len(self.thresholds),))
+        self.target_classes = _GrowableArray(np.int64)
+
+    @staticmethod
+    def _concat(arrays, num_columns):
+        """Returns the concatenated (N, num_columns) array and the image index of each row."""
+        arrays = [np.asarray(a, dtype=np.float64).reshape(-1, num_columns) for a in arrays]
+        image_indices = np.repeat(np.arange(len(arrays)), [len(a) for a in arrays])
+        return np.concatenate(arrays) if arrays else np.zeros((0, num_columns)), image_indices
@@ -0,0 +1,146 @@
+"""Raw model predictions and targets of a dataset stored on the local disk.
+
+The predictions and the targets are appended batch by batch to raw binary files of fixed-width rows. counts.npy is a memory-mapped (num_images, 2)
+array with the number of prediction rows and target rows of each image. A classification image has one row of num_classes scores, and a detection
+image has one row [label, probability, x0, y0, x1, y1] per box. state.json records how many images are complete, so that an interrupted inference
+can be resumed. The evaluators can be run on the cache without the model.
+"""
+import json
+import logging
+import os
+import numpy as np
+import torch
+from mitorch.datasets.detection_targets import is_padded_detection_targets
+from mitorch.datasets.multilabel_targets import to_dense_multilabel_targets
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    VERSION = 1
+
+    def __init__(self, directory, task_type, num_images, num_classes, key=None):
+        """Open the cache in the directory. If it was created with different parameters, it is cleared."""
+        self.directory = directory
+        self.task_type = task_type
+        self.num_images = num_images
+        self.num_classes = num_classes
+        self.key = key
+        is_object_detection = task_type == 'object_detection'
+        self.prediction_format = (np.float32, 6 if is_object_detection else num_classes)
+        self.target_format = {'multiclass_classification': (np.int64, 1), 'multilabel_classification': (np.uint8, num_classes), 'object_detection': (np.float32, 5)}[task_type]
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._state_filepath = self.directory / 'state.json'
+        self._prediction_filepath = self.directory / 'predictions.bin'
+        self._target_filepath = self.directory / 'targets.bin'
+        self._counts_filepath = self.directory / 'counts.npy'
+
+        self.num_completed = self._load()
+        if self.num_completed:
+            logger.info(f"Loaded a prediction cache with {self.num_completed} / {num_images} images from {directory}")
+
+    @property
+    def is_complete(self):
+        return self.num_completed == self.num_images
+
+    def append(self, predictions, targets):
+        """Append a batch of the predictor outputs and the targets from the DataLoader."""
+        if self.task_type == 'object_detection':
+            prediction_rows = [np.asarray(p, dtype=np.float32).reshape(-1, 6) for p in predictions]
+            if is_padded_detection_targets(targets):
+                padded, counts = targets
+                padded = padded.cpu().numpy()
+                target_rows = [padded[i, :c] for i, c in enumerate(counts.tolist())]
+            else:
+                target_rows = [np.asarray(t, dtype=np.float32).reshape(-1, 5) for t in targets]
+        else:
+            prediction_rows = list(predictions.detach().float().cpu().numpy()[:, None])
+            targets = to_dense_multilabel_targets(targets) if self.task_type == 'multilabel_classification' else targets.view(-1, 1)
+            target_rows = list(targets.cpu().numpy()[:, None])
+
+        assert len(prediction_rows) == len(target_rows)
+        assert self.num_completed + len(prediction_rows) <= self.num_images
+        with open(self._prediction_filepath, 'ab') as f:
+            f.write(np.concatenate(prediction_rows).astype(self.prediction_format[0]).tobytes())
+        with open(self._target_filepath, 'ab') as f:
+            f.write(np.concatenate(target_rows).astype(self.target_format[0]).tobytes())
+
+        counts = np.lib.format.open_memmap(self._counts_filepath, mode='r+')
+        counts[self.num_completed:self.num_completed + len(prediction_rows)] = [(len(p), len(t)) for p, t in zip(prediction_rows, target_rows)]
+        counts.flush()
+        del counts
+
+        self.num_completed += len(prediction_rows)
+        self._save_state()
+
+    def iterate_batches(self, batch_size, score_threshold=None):
+        """Yields (predictions, targets) in the same format as the predictor outputs and the DataLoader targets, which the evaluators accept.
+
+        For object detection, the boxes whose probabilities are lower than score_threshold are removed.
+        """
+        assert self.is_complete
+        counts = np.load(self._counts_filepath, mmap_mode='r')
+        predictions = self._load_rows(self._prediction_filepath, self.prediction_format)
+        targets = self._load_rows(self._target_filepath, self.target_format)
+        prediction_offsets = np.r_[0, np.cumsum(counts[:, 0])]
+        target_offsets = np.r_[0, np.cumsum(counts[:, 1])]
+
+        for start in range(0, self.num_images, batch_size):
+            end = min(start + batch_size, self.num_images)
+            batch_predictions = predictions[prediction_offsets[start]:prediction_offsets[end]]
+            batch_targets = targets[target_offsets[start]:target_offsets[end]]
+            if self.task_type == 'object_detection':
+                batch_predictions = np.split(batch_predictions, prediction_offsets[start + 1:end] - prediction_offsets[start])
+                if score_threshold is not None:
+                    batch_predictions = [p[p[:, 1] >= score_threshold] for p in batch_predictions]
+                batch_targets = np.split(batch_targets, target_offsets[start + 1:end] - target_offsets[start])
+                yield batch_predictions, batch_targets
+            elif self.task_type == 'multiclass_classification':
+                yield torch.from_numpy(np.array(batch_predictions)), torch.from_numpy(np.array(batch_targets[:, 0]))
+            else:
+                yield torch.from_numpy(np.array(batch_predictions)), torch.from_numpy(np.array(batch_targets))
+
+    def _get_state(self):
+        return {'version': self.VERSION, 'key': self.key, 'task_type': self.task_type, 'num_images': self.num_images, 'num_classes': self.num_classes}
+
+    def _load(self):
+        """Returns the number of complete images. The rows of incomplete batches are truncated."""
+        try:
+            state = json.loads(self._state_filepath.read_text())
+            num_completed = state.pop('num_completed')
+            if state == self._get_state():
+                counts = np.load(self._counts_filepath, mmap_mode='r')[:num_completed]
+                prediction_size = int(counts[:, 0].sum()) * self._get_row_size(self.prediction_format)
+                target_size = int(counts[:, 1].sum()) * self._get_row_size(self.target_format)
+                if self._prediction_filepath.stat().st_size >= prediction_size and self._target_filepath.stat().st_size >= target_size:
+                    os.truncate(self._prediction_filepath, prediction_size)
+                    os.truncate(self._target_filepath, target_size)
+                    return num_completed
+            logger.info(f"The prediction cache in {self.directory} is stale or broken. Clearing it.")
+        except FileNotFoundError:
+            pass
+
+        self._prediction_filepath.write_bytes(b'')
+        self._target_filepath.write_bytes(b'')
+        np.lib.format.open_memmap(self._counts_filepath, mode='w+', dtype=np.int64, shape=(self.num_images, 2)).flush()
+        self.num_completed = 0
+        self._save_state()
+        return 0
+
+    def _save_state(self):
+        temp_filepath = self._state_filepath.with_name(f'state.json.{os.getpid()}.tmp')
+        temp_filepath.write_text(json.dumps({**self._get_state(), 'num_completed': self.num_completed}))
+        os.replace(temp_filepath, self._state_filepath)
+
+    @staticmethod
+    def _get_row_size(row_format):
+        dtype, width = row_format
+        return np.dtype(dtype).itemsize * width
+
+    @staticmethod
+    def _load_rows(filepath, row_format):
+        dtype, width = row_format
+        if filepath.stat().st_size == 0:
+            return np.zeros((0, width), dtype=dtype)
+        return np.memmap(filepath, dtype=dtype, mode='r').reshape(-1, width)
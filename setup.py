@@ -20,7 +20,14 @@ setuptools.setup(name='mitorch',
                  entry_points={
                      'console_scripts': [
                          'miagent=mitorch.commands.agent:main',
+                         'miconvert=mitorch.commands.convert:main',
+                         'mieval=mitorch.commands.evaluate:main',
+                         'miexport=mitorch.commands.export:main',
+                         'miextract=mitorch.commands.extract_features:main',
                          'mipredict=mitorch.commands.predict:main',
+                         'mipreprocess=mitorch.commands.preprocess:main',
+                         'miserve=mitorch.commands.serve:main',
+                         'miprofile=mitorch.commands.profile_data:main',
                          'misubmit=mitorch.commands.submit:main',
                          'mitrain=mitorch.commands.train:main',
                          'miquery=mitorch.commands.query:main',
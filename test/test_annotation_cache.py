@@ -0,0 +1,57 @@
+import os
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+from mitorch.datasets.annotation_cache import load_annotations, parse_annotation
+from mitorch.datasets.image_dataset import FileReader
+
+
+class TestAnnotationCache(unittest.TestCase):
+    def test_parse_annotation(self):
+        self.assertEqual(parse_annotation(b'1 0 0 10.7 10\n\n2 1.5 2 5 6\n').tolist(), [[1, 0, 0, 10, 10], [2, 1, 2, 5, 6]])
+        self.assertEqual(parse_annotation(b'1 0 0 10 10 extra\n2 5 5 1 1 extra\n').tolist(), [[1, 0, 0, 10, 10]])
+        self.assertEqual(parse_annotation(b'').shape, (0, 5))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            (temp_dir / '0.txt').write_text('1 0 0 10 10\n')
+            (temp_dir / '1.txt').write_text('0 1 1 2 2\n3 0 0 5 5\n')
+            dataset_filepath = temp_dir / 'images.txt'
+            dataset_filepath.write_text('0.jpg 0.txt\n1.jpg 1.txt\n')
+            reader = FileReader(temp_dir)
+
+            with unittest.mock.patch.dict(os.environ, {'MITORCH_CACHE_DIR': str(temp_dir / 'cache')}):
+                annotations = load_annotations(reader, dataset_filepath, ['0.txt', '1.txt'])
+                self.assertEqual([a.tolist() for a in annotations], [[[1, 0, 0, 10, 10]], [[0, 1, 1, 2, 2], [3, 0, 0, 5, 5]]])
+
+                with unittest.mock.patch('mitorch.datasets.annotation_cache._parse_annotations') as mock_parse:
+                    cached = load_annotations(reader, dataset_filepath, ['0.txt', '1.txt'])
+                    mock_parse.assert_not_called()
+                self.assertEqual([a.tolist() for a in cached], [a.tolist() for a in annotations])
+
+                # Replaced by a new file. The directory is modified.
+                (temp_dir / '1.new').write_text('0 1 1 2 2\n')
+                os.replace(temp_dir / '1.new', temp_dir / '1.txt')
+                os.utime(temp_dir, ns=(0, 0))
+                updated = load_annotations(reader, dataset_filepath, ['0.txt', '1.txt'])
+                self.assertEqual([a.tolist() for a in updated], [[[1, 0, 0, 10, 10]], [[0, 1, 1, 2, 2]]])
+
+                # Edited in place. Detected unless only the directories are trusted.
+                (temp_dir / '0.txt').write_text('2 0 0 10 10\n')
+                os.utime(temp_dir / '0.txt', ns=(1, 1))
+                updated = load_annotations(reader, dataset_filepath, ['0.txt', '1.txt'])
+                self.assertEqual([a.tolist() for a in updated], [[[2, 0, 0, 10, 10]], [[0, 1, 1, 2, 2]]])
+
+                with unittest.mock.patch.dict(os.environ, {'MITORCH_TRUST_ANNOTATION_DIRS': '1'}):
+                    load_annotations(reader, dataset_filepath, ['0.txt', '1.txt'])
+                    (temp_dir / '0.txt').write_text('3 0 0 10 10\n')
+                    os.utime(temp_dir / '0.txt', ns=(2, 2))
+                    with unittest.mock.patch('mitorch.datasets.annotation_cache._parse_annotations') as mock_parse:
+                        load_annotations(reader, dataset_filepath, ['0.txt', '1.txt'])
+                        mock_parse.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import threading
+import unittest
+import torch
+from mitorch.evaluators import AsyncEvaluator, MulticlassClassificationEvaluator
+from mitorch.evaluators.async_evaluator import _get_nbytes
+
+
+class BlockingEvaluator(MulticlassClassificationEvaluator):
+    """Doesn't return from add_predictions() until released."""
+    def __init__(self):
+        self.released = threading.Event()
+        self.num_added = 0
+        super().__init__()
+
+    def add_predictions(self, predictions, targets):
+        self.released.wait()
+        if targets is None:
+            raise ValueError
+        super().add_predictions(predictions, targets)
+        self.num_added += 1
+
+
+class TestAsyncEvaluator(unittest.TestCase):
+    def test_same_report(self):
+        generator = torch.Generator().manual_seed(0)
+        batches = [(torch.softmax(torch.randn(4, 10, generator=generator), 1), torch.randint(0, 10, (4,), generator=generator)) for _ in range(10)]
+        evaluator = MulticlassClassificationEvaluator()
+        async_evaluator = AsyncEvaluator(MulticlassClassificationEvaluator(), max_queue_size=2)
+        for predictions, targets in batches:
+            evaluator.add_predictions(predictions, targets)
+            async_evaluator.add_predictions(predictions, targets)
+        self.assertEqual(async_evaluator.get_report(), evaluator.get_report())
+
+        async_evaluator.reset()
+        self.assertEqual(async_evaluator.get_report()['top1_accuracy'], 0)
+
+    def _add_in_thread(self, evaluator, predictions, targets):
+        thread = threading.Thread(target=evaluator.add_predictions, args=(predictions, targets), daemon=True)
+        thread.start()
+        thread.join(0.2)
+        return thread
+
+    def test_max_queue_size(self):
+        evaluator = BlockingEvaluator()
+        async_evaluator = AsyncEvaluator(evaluator, max_queue_size=2)
+        # The worker takes the first batch, then two batches are queued.
+        threads = [self._add_in_thread(async_evaluator, torch.rand(1, 3), torch.tensor([0])) for _ in range(4)]
+        self.assertEqual([t.is_alive() for t in threads], [False, False, False, True])
+
+        evaluator.released.set()
+        threads[-1].join()
+        async_evaluator.wait()
+        self.assertEqual(evaluator.num_added, 4)
+
+    def test_max_queued_bytes(self):
+        evaluator = BlockingEvaluator()
+        async_evaluator = AsyncEvaluator(evaluator, max_queue_size=100, max_queued_bytes=1300)
+        predictions = torch.zeros(1, 100)  # 408 bytes with the target. The batch in the worker is counted until it's evaluated.
+        threads = [self._add_in_thread(async_evaluator, predictions, torch.tensor([0])) for _ in range(4)]
+        self.assertEqual([t.is_alive() for t in threads], [False, False, False, True])
+
+        evaluator.released.set()
+        threads[-1].join()
+        async_evaluator.wait()
+        self.assertEqual(evaluator.num_added, 4)
+
+    def test_nbytes(self):
+        self.assertEqual(_get_nbytes((torch.zeros(2, 3), torch.zeros(2, dtype=torch.int64))), 40)
+        detection_predictions = [[[0, 0.9, 0, 0, 1, 1], [1, 0.8, 0, 0, 1, 1]], []]
+        self.assertEqual(_get_nbytes(detection_predictions), 2 * 6 * 8)
+
+    def test_error(self):
+        evaluator = BlockingEvaluator()
+        evaluator.released.set()
+        async_evaluator = AsyncEvaluator(evaluator)
+        async_evaluator.add_predictions(torch.rand(1, 3), None)
+        with self.assertRaises(RuntimeError):
+            async_evaluator.wait()
+
+        # The evaluator can be used after the error.
+        async_evaluator.reset()
+        async_evaluator.add_predictions(torch.rand(1, 3), torch.tensor([0]))
+        self.assertEqual(async_evaluator.get_report()['top5_accuracy'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import pathlib
+import tempfile
+import unittest
+import PIL.Image
+import pytorch_lightning as pl
+import torch
+from mitorch.builders import DataLoaderBuilder
+from mitorch.common import MiModel
+from mitorch.common.checkpoint import CheckpointCallback, CHECKPOINT_FILENAME
+from mitorch.common.training_config import AugmentationConfig, DataLoaderConfig, LrSchedulerConfig, ModelConfig, OptimizerConfig, TrainingConfig
+
+
+class _Recorder(pl.Callback):
+    """Records the targets of each batch. Interrupts the training after stop_step steps."""
+    def __init__(self, checkpoint_callback, stop_step=None):
+        self.checkpoint_callback = checkpoint_callback
+        self.stop_step = stop_step
+        self.batches = []
+        self.lrs = []
+
+    def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx, dataloader_idx):
+        self.batches.append((trainer.current_epoch, batch[1].tolist()))
+        self.lrs.append(trainer.optimizers[0].param_groups[0]['lr'])
+        self.checkpoint_callback.wait()
+        if trainer.global_step + 1 == self.stop_step:
+            raise KeyboardInterrupt
+
+
+class _FakeScaler:
+    """Stands in for the GradScaler of the native AMP plugin, which needs CUDA."""
+    def __init__(self, scale):
+        self.scale = scale
+
+    def state_dict(self):
+        return {'scale': self.scale}
+
+    def load_state_dict(self, state_dict):
+        self.scale = state_dict['scale']
+
+
+class TestCheckpointCallback(unittest.TestCase):
+    def setUp(self):
+        self.config = TrainingConfig(task_type='multiclass_classification', batch_size=2, max_epochs=3, use_fp16=False, model=ModelConfig('MobileNetV3', 32),
+                                     augmentation=AugmentationConfig(['center_crop'], ['center_crop']), dataloader=DataLoaderConfig(num_workers=0),
+                                     lr_scheduler=LrSchedulerConfig('cosine_annealing', 0.1, None, None, 'linear', 1), optimizer=OptimizerConfig())
+        self.temp_dir = tempfile.TemporaryDirectory()
+        temp_dir = pathlib.Path(self.temp_dir.name)
+        for i in range(6):
+            PIL.Image.new('RGB', (32, 32), color=(i * 40, 0, 0)).save(temp_dir / f'{i}.jpg')
+        self.dataset_filepath = temp_dir / 'images.txt'
+        self.dataset_filepath.write_text(''.join(f'{i}.jpg {i}\n' for i in range(6)))  # The label is the image index.
+        self.checkpoint_dir = temp_dir / 'checkpoints'
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _fit(self, every_n_epochs, every_n_minutes, stop_step=None, scaler=None):
+        builder = DataLoaderBuilder(self.config)
+        dataloader = builder.build_dataloader(builder.build_dataset(self.dataset_filepath, self.config.augmentation.train, False), shuffle=True)
+        checkpoint_callback = CheckpointCallback(self.checkpoint_dir, every_n_epochs, every_n_minutes)
+        recorder = _Recorder(checkpoint_callback, stop_step)
+        trainer = pl.Trainer(max_epochs=self.config.max_epochs, logger=False, checkpoint_callback=False, progress_bar_refresh_rate=0,
+                             num_sanity_val_steps=0, callbacks=[checkpoint_callback, recorder])
+        if scaler:
+            trainer.accelerator.precision_plugin.scaler = scaler
+        trainer.fit(MiModel(self.config, 6), dataloader)
+        return trainer, recorder
+
+    def test_resume_mid_epoch(self):
+        _, expected = self._fit(None, None)
+        self.assertEqual(len(expected.batches), 9)
+        self.assertFalse((self.checkpoint_dir / CHECKPOINT_FILENAME).exists())
+
+        # Interrupted at the second batch of the second epoch. A checkpoint is saved after every step.
+        _, interrupted = self._fit(None, 0, stop_step=5)
+        self.assertEqual(interrupted.batches, expected.batches[:5])
+        state = torch.load(self.checkpoint_dir / CHECKPOINT_FILENAME)
+        self.assertEqual((state['epoch'], state['batch_index'], state['global_step']), (1, 2, 5))
+
+        trainer, resumed = self._fit(None, None)
+        self.assertEqual(resumed.batches, expected.batches[5:])
+        self.assertEqual(trainer.global_step, 9)
+        self.assertEqual(resumed.lrs, expected.lrs[5:])
+
+    def test_resume_epoch_end(self):
+        _, expected = self._fit(None, None)
+        _, interrupted = self._fit(1, None, stop_step=5)
+        state = torch.load(self.checkpoint_dir / CHECKPOINT_FILENAME)
+        self.assertEqual((state['epoch'], state['batch_index'], state['global_step']), (1, 0, 3))
+
+        _, resumed = self._fit(1, None)
+        self.assertEqual(resumed.batches, expected.batches[3:])
+        self.assertEqual(resumed.lrs, expected.lrs[3:])
+
+    def test_scaler(self):
+        self._fit(1, None, stop_step=4, scaler=_FakeScaler(1024.0))
+        self.assertEqual(torch.load(self.checkpoint_dir / CHECKPOINT_FILENAME)['scaler'], {'scale': 1024.0})
+
+        scaler = _FakeScaler(65536.0)
+        self._fit(1, None, scaler=scaler)
+        self.assertEqual(scaler.scale, 1024.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
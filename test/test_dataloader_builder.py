@@ -1,19 +1,60 @@
 import unittest
+import numpy as np
 import torch
 from mitorch.builders.dataloader_builder import _default_collate
+from mitorch.common.mimodel import MiModel
+from mitorch.datasets import TransformFactory
 
 
 class TestDataloaderBuilder(unittest.TestCase):
     def test_collate_object_detection(self):
-        batch = ((torch.zeros(3, 224, 224, dtype=torch.float32), [[0, 0, 0, 224, 224]]),
-                 (torch.zeros(3, 224, 224, dtype=torch.float32), [[0, 0, 0, 224, 224]]))
-
-        image, target = _default_collate('object_detection', batch)
-        self.assertEqual(image.shape, (2, 3, 224, 224))
-        self.assertIsInstance(target, (list, tuple))
-        self.assertEqual(len(target), 2)
-        self.assertEqual(target[0], [[0, 0, 0, 224, 224]])
-        self.assertEqual(target[1], [[0, 0, 0, 224, 224]])
+        batch = ((torch.zeros(3, 224, 224, dtype=torch.float32), np.array([[0, 0, 0, 0.5, 0.5]], dtype=np.float32)),
+                 (torch.zeros(3, 224, 224, dtype=torch.float32), np.zeros((0, 5), dtype=np.float32)),
+                 (torch.zeros(3, 224, 224, dtype=torch.float32), np.array([[1, 0, 0, 1, 1], [2, 0.1, 0.1, 0.2, 0.2]], dtype=np.float32)))
+
+        image, (padded, counts) = _default_collate('object_detection', batch)
+        self.assertEqual(image.shape, (3, 3, 224, 224))
+        self.assertEqual(padded.shape, (3, 2, 5))
+        self.assertEqual(counts.tolist(), [1, 0, 2])
+        self.assertEqual(padded[0, 0].tolist(), [0, 0, 0, 0.5, 0.5])
+        self.assertEqual(padded[1].tolist(), [[0] * 5] * 2)
+        self.assertTrue(torch.allclose(padded[2], torch.tensor([[1, 0, 0, 1, 1], [2, 0.1, 0.1, 0.2, 0.2]])))
+
+        _, (padded, counts) = _default_collate('object_detection', batch[1:2])
+        self.assertEqual(padded.shape, (1, 0, 5))
+
+    def test_collate_multilabel(self):
+        batch = ((torch.zeros(3, 8, 8), np.array([0, 2])), (torch.zeros(3, 8, 8), np.array([], dtype=np.int64)), (torch.zeros(3, 8, 8), np.array([3])))
+        expected = [[1, 0, 1, 0], [0, 0, 0, 0], [0, 0, 0, 1]]
+
+        _, target = _default_collate('multilabel_classification', batch, num_classes=4)
+        self.assertEqual(target.dtype, torch.uint8)
+        self.assertEqual(target.tolist(), expected)
+
+        _, target = _default_collate('multilabel_classification', batch, num_classes=4, sparse_multilabel=True)
+        self.assertTrue(target.is_sparse)
+        self.assertEqual(target.to_dense().tolist(), expected)
+
+    def test_detection_transform(self):
+        transform = TransformFactory(True, 32).create(['resize'])
+        image, target = transform(np.zeros((50, 100, 3), dtype=np.uint8), np.array([[3, 10, 10, 60, 40]], dtype=np.int32))
+        self.assertIsInstance(target, np.ndarray)
+        self.assertTrue(np.allclose(target, [[3, 0.1, 0.2, 0.6, 0.8]]))
+        _, target = transform(np.zeros((50, 100, 3), dtype=np.uint8), [])
+        self.assertEqual(target.shape, (0, 5))
+
+    def test_uint8_transport(self):
+        image = np.random.default_rng(0).integers(0, 256, size=(32, 48, 3), dtype=np.uint8)
+        float_transform = TransformFactory(False, 32).create(['center_crop'])
+        uint8_transform = TransformFactory(False, 32, uint8_output=True).create(['center_crop'])
+
+        expected, _ = float_transform(image, 0)
+        batch = [uint8_transform(image, 0), uint8_transform(image, 1)]
+        images, target = _default_collate('multiclass_classification', batch)
+        self.assertEqual(images.dtype, torch.uint8)
+        self.assertEqual(images.shape, (2, 3, 32, 32))
+        self.assertEqual(target.tolist(), [0, 1])
+        self.assertTrue(torch.allclose(MiModel.normalize(images)[0], expected, atol=1e-6))
 
 
 if __name__ == '__main__':
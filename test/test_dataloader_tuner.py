@@ -0,0 +1,44 @@
+import unittest
+import torch
+from mitorch.builders.dataloader_tuner import DataLoaderTuner, measure_training_throughput
+
+
+class FakeDataset(torch.utils.data.Dataset):
+    def __len__(self):
+        return 64
+
+    def __getitem__(self, index):
+        return torch.zeros(3, 8, 8), index
+
+
+def _collate(batch):
+    image, target = zip(*batch)
+    return torch.stack(image), torch.tensor(target)
+
+
+class TestDataLoaderTuner(unittest.TestCase):
+    def test_tune(self):
+        tuner = DataLoaderTuner(FakeDataset(), 4, _collate, max_workers=2, num_batches=4)
+        self.assertEqual(tuner._get_worker_candidates(), [1, 2])
+        self.assertGreater(tuner.measure_loader_throughput(0, None), 0)
+
+        num_workers, prefetch_factor, throughput = tuner.tune(1, num_workers=0)
+        self.assertEqual(num_workers, 0)
+        self.assertGreater(throughput, 1)
+
+        # An unreachable target. The given prefetch_factor must be used.
+        num_workers, prefetch_factor, _ = tuner.tune(float('inf'), prefetch_factor=3)
+        self.assertIn(num_workers, [1, 2])
+        self.assertEqual(prefetch_factor, 3)
+
+    def test_measure_training_throughput(self):
+        model = torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.BatchNorm2d(4))
+        state_dict = {k: v.clone() for k, v in model.state_dict().items()}
+        throughput = measure_training_throughput(model, torch.rand(2, 3, 8, 8), torch.device('cpu'), num_steps=2)
+        self.assertGreater(throughput, 0)
+        for key, value in model.state_dict().items():
+            self.assertTrue(torch.equal(value, state_dict[key]))
+
+
+if __name__ == '__main__':
+    unittest.main()
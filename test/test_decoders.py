@@ -0,0 +1,50 @@
+import io
+import unittest
+import numpy as np
+import PIL.Image
+from mitorch.datasets.decoders import OpenCVDecoder, PILDecoder, create_decoder
+
+
+def _encode(image, image_format):
+    with io.BytesIO() as f:
+        image.save(f, format=image_format)
+        return f.getvalue()
+
+
+class TestDecoders(unittest.TestCase):
+    def test_decode(self):
+        image = PIL.Image.new('RGB', (64, 32), color=(255, 0, 0))
+        for image_format in ['JPEG', 'PNG']:
+            data = _encode(image, image_format)
+            for decoder in [PILDecoder(), OpenCVDecoder()]:
+                decoded, size = decoder.decode(data)
+                self.assertEqual(decoded.shape, (32, 64, 3))
+                self.assertEqual(decoded.dtype, np.uint8)
+                self.assertEqual(size, (64, 32))
+                self.assertTrue(decoded.flags.writeable)
+                self.assertGreater(decoded[16, 32, 0], 200)
+                self.assertLess(decoded[16, 32, 2], 50)
+
+                decoded, _ = decoder.decode(memoryview(data))
+                self.assertEqual(decoded.shape, (32, 64, 3))
+
+    def test_reduced_decode(self):
+        data = _encode(PIL.Image.new('RGB', (512, 256)), 'JPEG')
+        for decoder in [PILDecoder(), OpenCVDecoder()]:
+            decoded, size = decoder.decode(data, 64)
+            self.assertEqual(size, (512, 256))
+            self.assertEqual(decoded.shape, (64, 128, 3))
+
+        # PNG cannot be reduced while decoding.
+        decoded, size = OpenCVDecoder().decode(_encode(PIL.Image.new('L', (512, 256)), 'PNG'), 64)
+        self.assertEqual(decoded.shape, (256, 512, 3))
+
+    def test_create_decoder(self):
+        self.assertIsInstance(create_decoder('opencv'), OpenCVDecoder)
+        self.assertIn(create_decoder('auto').name, ['pil', 'opencv', 'turbojpeg'])
+        with self.assertRaises(NotImplementedError):
+            create_decoder('unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
 import unittest
+import numpy as np
+import sklearn.metrics
 import torch
-from mitorch.evaluators import MulticlassClassificationEvaluator
+from mitorch.datasets.detection_targets import pad_detection_targets
+from mitorch.datasets.multilabel_targets import collate_multilabel_targets
+from mitorch.evaluators import MulticlassClassificationEvaluator, MultilabelClassificationEvaluator, ObjectDetectionEvaluator
 
 
 class TestMulticlassClassificationEvaluator(unittest.TestCase):
@@ -29,6 +33,94 @@ class TestMulticlassClassificationEvaluator(unittest.TestCase):
         self.assertEqual(evaluator.get_report()['top1_accuracy'], 0.5)
         self.assertEqual(evaluator.get_report()['top5_accuracy'], 1)
 
+    def test_average_precision(self):
+        generator = torch.Generator().manual_seed(0)
+        batches = [(torch.softmax(torch.randn(16, 10, generator=generator), 1), torch.randint(0, 10, (16,), generator=generator)) for _ in range(4)]
+        predictions = torch.cat([p for p, _ in batches])
+        targets = torch.cat([t for _, t in batches])
+        one_hot = torch.nn.functional.one_hot(targets, 10)
+        expected = sklearn.metrics.average_precision_score(one_hot.view(-1).numpy(), predictions.view(-1).numpy())
+
+        for num_bins, places in [(None, 7), (10000, 3)]:
+            evaluator = MulticlassClassificationEvaluator(num_bins=num_bins)
+            for p, t in batches:
+                evaluator.add_predictions(p, t)
+            self.assertAlmostEqual(evaluator.get_report()['average_precision'], expected, places=places)
+
+
+class TestMultilabelClassificationEvaluator(unittest.TestCase):
+    def test_sparse_targets(self):
+        predictions = torch.tensor([[0.9, 0.1, 0.8], [0.2, 0.7, 0.1]])
+        targets = [np.array([0, 2]), np.array([2])]
+
+        evaluator = MultilabelClassificationEvaluator()
+        evaluator.add_predictions(predictions, collate_multilabel_targets(targets, 3))
+        expected = evaluator.get_report()
+        self.assertAlmostEqual(expected['accuracy_50'], 0.5)
+
+        evaluator.reset()
+        evaluator.add_predictions(predictions, collate_multilabel_targets(targets, 3, sparse=True))
+        self.assertEqual(evaluator.get_report(), expected)
+
+    def test_average_precision(self):
+        generator = torch.Generator().manual_seed(0)
+        batches = [(torch.rand(16, 10, generator=generator), torch.randint(0, 2, (16, 10), generator=generator)) for _ in range(4)]
+        predictions = torch.cat([p for p, _ in batches])
+        targets = torch.cat([t for _, t in batches])
+        expected = sklearn.metrics.average_precision_score(targets.view(-1).numpy(), predictions.view(-1).numpy())
+
+        for num_bins, places in [(None, 7), (10000, 3)]:
+            evaluator = MultilabelClassificationEvaluator(num_bins=num_bins)
+            for p, t in batches:
+                evaluator.add_predictions(p, t)
+            self.assertAlmostEqual(evaluator.get_report()['average_precision'], expected, places=places)
+
+        evaluator.reset()
+        self.assertEqual(evaluator.get_report(), {'accuracy_50': 0, 'average_precision': 0})
+
+
+class TestObjectDetectionEvaluator(unittest.TestCase):
+    def test_padded_targets(self):
+        predictions = [[[0, 0.9, 0, 0, 0.5, 0.5], [1, 0.8, 0.5, 0.5, 1, 1]], [[1, 0.7, 0, 0, 1, 1]]]
+        targets = [[[0, 0, 0, 0.5, 0.5], [1, 0.5, 0.5, 1, 1]], []]
+
+        evaluator = ObjectDetectionEvaluator()
+        evaluator.add_predictions(predictions, targets)
+        expected = evaluator.get_report()
+
+        evaluator.reset()
+        evaluator.add_predictions(predictions, pad_detection_targets(targets))
+        self.assertEqual(evaluator.get_report(), expected)
+        self.assertGreater(expected['mAP_50'], 0)
+
+    def test_thresholds(self):
+        # IoU of the first prediction is 0.64. The second prediction is a duplicate of the first one.
+        predictions = [[[0, 0.9, 0, 0, 0.8, 0.8], [0, 0.8, 0, 0, 0.8, 0.8], [1, 0.7, 0, 0, 1, 1]]]
+        targets = [[[0, 0, 0, 1, 1], [1, 0, 0, 1, 1]]]
+
+        evaluator = ObjectDetectionEvaluator()
+        evaluator.add_predictions(predictions, targets)
+        report = evaluator.get_report()
+        self.assertAlmostEqual(report['mAP_30'], 1.0)
+        self.assertAlmostEqual(report['mAP_50'], 1.0)
+        self.assertAlmostEqual(report['mAP_75'], 0.5)
+        self.assertAlmostEqual(report['mAP_90'], 0.5)
+        self.assertNotIn('mAP_50_95', report)
+
+    def test_coco(self):
+        predictions = [[[0, 0.9, 0, 0, 0.8, 0.8], [1, 0.7, 0, 0, 1, 1]]]
+        targets = [[[0, 0, 0, 1, 1], [1, 0, 0, 1, 1]]]
+
+        evaluator = ObjectDetectionEvaluator(coco=True)
+        evaluator.add_predictions(predictions, targets)
+        # Class 0 is correct at 0.5, 0.55, 0.6. Class 1 is correct at all thresholds.
+        self.assertAlmostEqual(evaluator.get_report()['mAP_50_95'], (0.3 + 1.0) / 2)
+
+    def test_unmatched_classes(self):
+        evaluator = ObjectDetectionEvaluator()
+        evaluator.add_predictions([[[2, 0.9, 0, 0, 1, 1]], []], [[], [[0, 0, 0, 1, 1]]])
+        self.assertEqual(evaluator.get_report()['mAP_50'], 0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,70 @@
+import json
+import pathlib
+import tempfile
+import unittest
+import torch
+import torch.multiprocessing
+from mitorch.datasets.detection_targets import pad_detection_targets
+from mitorch.evaluators import MulticlassClassificationEvaluator, MultilabelClassificationEvaluator, ObjectDetectionEvaluator
+
+WORLD_SIZE = 3
+
+
+def _make_batches():
+    """Returns {name: (evaluator factory, list of (predictions, targets))}. Each process evaluates a different subset of the batches."""
+    generator = torch.Generator().manual_seed(0)
+    multiclass = [(torch.softmax(torch.randn(8, 10, generator=generator), 1), torch.randint(0, 10, (8,), generator=generator)) for _ in range(5)]
+    multilabel = [(torch.rand(8, 10, generator=generator), torch.randint(0, 2, (8, 10), generator=generator)) for _ in range(5)]
+    detection = []
+    for _ in range(5):
+        boxes = torch.rand(4, 3, 2, generator=generator) * 0.5
+        targets = [[[int(c), *b.tolist(), *(b + 0.5).tolist()] for c, b in zip(torch.randint(0, 3, (3,), generator=generator), image_boxes)] for image_boxes in boxes]
+        predictions = [[[t[0], float(torch.rand(1, generator=generator)), *(torch.tensor(t[1:]) + torch.randn(4, generator=generator) * 0.05).tolist()] for t in image_targets]
+                       for image_targets in targets]
+        detection.append((predictions, pad_detection_targets(targets)))
+    return {'multiclass': (MulticlassClassificationEvaluator, multiclass),
+            'multiclass_exact': (lambda: MulticlassClassificationEvaluator(num_bins=None), multiclass),
+            'multilabel': (MultilabelClassificationEvaluator, multilabel),
+            'multilabel_exact': (lambda: MultilabelClassificationEvaluator(num_bins=None), multilabel),
+            'detection': (lambda: ObjectDetectionEvaluator(coco=True), detection)}
+
+
+def _evaluate(rank, init_filepath, output_dir):
+    torch.distributed.init_process_group('gloo', init_method=f'file://{init_filepath}', rank=rank, world_size=WORLD_SIZE)
+    reports = {}
+    for name, (evaluator_class, batches) in _make_batches().items():
+        evaluator = evaluator_class()
+        for predictions, targets in batches[rank::WORLD_SIZE]:
+            evaluator.add_predictions(predictions, targets)
+        evaluator.synchronize()
+        reports[name] = evaluator.get_report()
+    (pathlib.Path(output_dir) / f'{rank}.json').write_text(json.dumps(reports))
+    torch.distributed.destroy_process_group()
+
+
+class TestDistributedEvaluator(unittest.TestCase):
+    def test_synchronize(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            torch.multiprocessing.spawn(_evaluate, args=(str(pathlib.Path(temp_dir) / 'init'), temp_dir), nprocs=WORLD_SIZE)
+            reports = [json.loads((pathlib.Path(temp_dir) / f'{rank}.json').read_text()) for rank in range(WORLD_SIZE)]
+
+        for name, (evaluator_class, batches) in _make_batches().items():
+            evaluator = evaluator_class()
+            for predictions, targets in batches:
+                evaluator.add_predictions(predictions, targets)
+            expected = evaluator.get_report()
+            for report in reports:
+                self.assertEqual(report[name].keys(), expected.keys())
+                for key in expected:
+                    self.assertAlmostEqual(report[name][key], expected[key], places=6, msg=f'{name} {key}')
+
+    def test_not_distributed(self):
+        evaluator = MulticlassClassificationEvaluator()
+        evaluator.add_predictions(torch.tensor([[0.9, 0.1], [0.2, 0.8]]), torch.tensor([0, 0]))
+        expected = evaluator.get_report()
+        evaluator.synchronize()
+        self.assertEqual(evaluator.get_report(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
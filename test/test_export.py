@@ -0,0 +1,66 @@
+import json
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+import PIL.Image
+import torch
+from mitorch.builders import ModelBuilder
+from mitorch.commands.export import export
+from mitorch.commands.predict import predict_batch
+from mitorch.common.training_config import AugmentationConfig, DataLoaderConfig, ModelConfig, TrainingConfig
+
+
+class TestExport(unittest.TestCase):
+    def _create_dataset(self, directory, num_images, target):
+        for i in range(num_images):
+            PIL.Image.new('RGB', (64, 48), color=(i * 30, 0, 0)).save(directory / f'{i}.jpg')
+        filepath = directory / 'images.txt'
+        filepath.write_text(''.join(f'{i}.jpg {target(i)}\n' for i in range(num_images)))
+        return filepath
+
+    def test_classification(self):
+        config = TrainingConfig(task_type='multiclass_classification', batch_size=2, max_epochs=1, model=ModelConfig('MobileNetV3', 32),
+                                augmentation=AugmentationConfig(['center_crop'], ['center_crop']), dataloader=DataLoaderConfig(num_workers=0))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            dataset_filepath = self._create_dataset(temp_dir, 5, lambda i: i % 3)
+            weights_filepath = temp_dir / 'weights.pth'
+            torch.save(ModelBuilder(config).build(3).state_dict(), weights_filepath)
+
+            # The default HistogramObserver takes a minute to compute the quantization parameters.
+            qconfig_mapping = torch.ao.quantization.QConfigMapping().set_global(torch.ao.quantization.default_qconfig)
+            with unittest.mock.patch('torch.ao.quantization.get_default_qconfig_mapping', return_value=qconfig_mapping):
+                report = export(config, weights_filepath, dataset_filepath, temp_dir / 'output', quantize='static', num_calibration_images=4)
+            self.assertEqual(set(report.keys()), {'original', 'torchscript', 'int8'})
+            self.assertAlmostEqual(report['torchscript']['delta']['average_precision'], 0, places=4)
+            self.assertIn('latency_ms', report['int8']['delta'])
+            self.assertEqual(json.loads((temp_dir / 'output' / 'report.json').read_text()).keys(), report.keys())
+
+            # mipredict loads both the weights and the exported models.
+            image_filepaths = [temp_dir / '0.jpg', temp_dir / '1.jpg']
+            results = {}
+            for name in ('weights.pth', 'output/model.pt', 'output/model_int8.pt'):
+                output_filepath = temp_dir / 'predictions.jsonl'
+                predict_batch(config, temp_dir / name, 3, image_filepaths, output_filepath, num_workers=0)
+                results[name] = [json.loads(line)['predictions'] for line in output_filepath.read_text().splitlines()]
+
+        for a, b in zip(results['weights.pth'][0], results['output/model.pt'][0]):
+            self.assertAlmostEqual(a, b, places=5)
+        self.assertEqual(len(results['output/model_int8.pt'][0]), 3)
+
+    def test_object_detection(self):
+        config = TrainingConfig(task_type='object_detection', batch_size=2, max_epochs=1, model=ModelConfig('MobileNetV2-SSDLite', 128),
+                                augmentation=AugmentationConfig(['resize'], ['resize']), dataloader=DataLoaderConfig(num_workers=0))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            for i in range(3):
+                (temp_dir / f'{i}.txt').write_text('0 10 10 40 40\n')
+            dataset_filepath = self._create_dataset(temp_dir, 3, lambda i: f'{i}.txt')
+            report = export(config, None, dataset_filepath, temp_dir / 'output', quantize='dynamic')
+            self.assertIn('mAP_50', report['int8'])
+            self.assertAlmostEqual(report['torchscript']['delta']['mAP_50'], 0, places=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
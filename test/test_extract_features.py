@@ -0,0 +1,64 @@
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+import numpy as np
+import PIL.Image
+import torch
+from mitorch.builders import ModelBuilder
+from mitorch.commands.extract_features import extract_features, FeatureExtractor
+from mitorch.common.training_config import AugmentationConfig, DataLoaderConfig, ModelConfig, TrainingConfig
+
+
+class TestExtractFeatures(unittest.TestCase):
+    def setUp(self):
+        self.config = TrainingConfig(task_type='multiclass_classification', batch_size=2, max_epochs=1, model=ModelConfig('MobileNetV3', 32),
+                                     augmentation=AugmentationConfig(['center_crop'], ['center_crop']), dataloader=DataLoaderConfig(num_workers=0))
+
+    def test_feature_extractor(self):
+        model = ModelBuilder(self.config).build(3).eval()
+        extractor = FeatureExtractor(model, 'base_model')
+        images = torch.rand(2, 3, 32, 32)
+        with torch.inference_mode():
+            self.assertTrue(torch.equal(extractor(images), model.base_model(images)))
+            conv_features = model.base_model.features.conv0(images)
+            self.assertTrue(torch.allclose(FeatureExtractor(model, 'base_model.features.conv0')(images), conv_features.mean((2, 3))))  # Pooled.
+        with self.assertRaises(ValueError):
+            FeatureExtractor(model, 'not_found')
+
+    def test_resume_and_shards(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            for i in range(5):
+                PIL.Image.new('RGB', (64, 48), color=(i * 50, 0, 0)).save(temp_dir / f'{i}.jpg')
+            dataset_filepath = temp_dir / 'images.txt'
+            dataset_filepath.write_text(''.join(f'{i}.jpg {i % 2}\n' for i in range(5)))
+            weights_filepath = temp_dir / 'weights.pth'
+            torch.save(ModelBuilder(self.config).build(2).state_dict(), weights_filepath)
+            output_dir = temp_dir / 'output'
+
+            self.assertEqual(extract_features(self.config, weights_filepath, dataset_filepath, output_dir, 'base_model', np.float32, 0, 2), 2)
+            self.assertEqual(extract_features(self.config, weights_filepath, dataset_filepath, output_dir, 'base_model', np.float32, 2, None), 3)
+            features = np.load(output_dir / 'features.npy')
+            self.assertEqual(features.shape, (5, 1280))
+            self.assertEqual(features.dtype, np.float32)
+            self.assertEqual((output_dir / 'images.txt').read_text().splitlines(), [f'{i}.jpg' for i in range(5)])
+
+            # Only the missing rows are processed again.
+            self._clear_done(output_dir / 'done.npy', 3)
+            self.assertEqual(extract_features(self.config, weights_filepath, dataset_filepath, output_dir, 'base_model', np.float32), 1)
+            np.testing.assert_allclose(np.load(output_dir / 'features.npy'), features, rtol=1e-5)
+
+            self._clear_done(output_dir / 'done.npy', 0)
+            with self.assertRaises(RuntimeError):
+                extract_features(self.config, weights_filepath, dataset_filepath, output_dir, 'base_model', np.float16)
+
+    @staticmethod
+    def _clear_done(filepath, index):
+        done = np.lib.format.open_memmap(filepath, mode='r+')
+        done[index] = 0
+        done.flush()
+
+
+if __name__ == '__main__':
+    unittest.main()
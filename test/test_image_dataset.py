@@ -0,0 +1,75 @@
+import os
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+import zipfile
+import PIL.Image
+from mitorch.datasets import ImageDataset, TransformFactory
+from mitorch.datasets.image_dataset import parse_manifest
+
+
+class TestImageDataset(unittest.TestCase):
+    def test_parse_multiclass(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = pathlib.Path(temp_dir) / 'images.txt'
+            filepath.write_text('0.jpg 3\nimages.zip@1.jpg 0\n')
+            with zipfile.ZipFile(pathlib.Path(temp_dir) / 'images.zip', 'w') as z:
+                z.writestr('1.jpg', b'')
+            manifest = parse_manifest(filepath)
+            self.assertEqual(manifest.task_type, 'multiclass_classification')
+            self.assertEqual(list(manifest.image_paths), ['0.jpg', 'images.zip@1.jpg'])
+            self.assertEqual(manifest.zip_filepaths, {'images.zip'})
+
+            dataset = ImageDataset.from_file(filepath, None)
+            self.assertEqual(len(dataset), 2)
+            self.assertEqual(dataset.targets.tolist(), [3, 0])
+            self.assertEqual(len(dataset.labels), 4)
+
+    def test_parse_multilabel(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = pathlib.Path(temp_dir) / 'images.txt'
+            filepath.write_text('0.jpg 3\n1.jpg 0,1\n2.jpg 2\n')
+            manifest = parse_manifest(filepath)
+            self.assertEqual(manifest.task_type, 'multilabel_classification')
+
+            dataset = ImageDataset.from_file(filepath, None)
+            self.assertEqual([t.tolist() for t in dataset.targets], [[3], [0, 1], [2]])
+            self.assertEqual(len(dataset.labels), 4)
+
+    def test_parse_object_detection(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            (temp_dir / '0.txt').write_text('1 0 0 10 10\n0 5 5 5 10\n')
+            (temp_dir / '1.txt').write_text('')
+            filepath = temp_dir / 'images.txt'
+            filepath.write_text('0.jpg 0.txt\n1.jpg 1.txt\n')
+            manifest = parse_manifest(filepath)
+            self.assertEqual(manifest.task_type, 'object_detection')
+            self.assertEqual(list(manifest.targets), ['0.txt', '1.txt'])
+
+            with unittest.mock.patch.dict(os.environ, {'MITORCH_CACHE_DIR': str(temp_dir)}):
+                dataset = ImageDataset.from_file(filepath, None)
+            self.assertEqual(dataset.targets[0].tolist(), [[1, 0, 0, 10, 10]])  # The invalid box is removed.
+            self.assertEqual(dataset.targets[1].shape, (0, 5))
+            self.assertEqual(len(dataset.labels), 2)
+
+    def test_size_aware_decoding(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            PIL.Image.new('RGB', (2000, 1000)).save(temp_dir / '0.jpg')
+            (temp_dir / '0.txt').write_text('0 1000 100 2000 500\n')
+            filepath = temp_dir / 'images.txt'
+            filepath.write_text('0.jpg 0.txt\n')
+
+            with unittest.mock.patch.dict(os.environ, {'MITORCH_CACHE_DIR': str(temp_dir)}):
+                dataset = ImageDataset.from_file(filepath, lambda image, target: (image.shape, target))
+            dataset.min_image_size = TransformFactory(True, 224).get_min_image_size(['resize'])
+            self.assertEqual(dataset.min_image_size, 224)
+            size, target = dataset[0]
+            self.assertEqual(size, (250, 500, 3))
+            self.assertEqual(target.tolist(), [[0, 250, 25, 500, 125]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -31,6 +31,27 @@ class TestLrScheduler(unittest.TestCase):
         expected_lrs = [0.003, 0.003, 0.003, 0.003, 0.003, 0.3*0.94, 0.3*0.93, 0.3*0.92, 0.3*0.91, 0.3*0.90]
         self.assert_almost_equal_lists(lrs, expected_lrs)
 
+    def test_load_warmup_lr(self):
+        def build():
+            parameters = torch.nn.Conv2d(1, 1, 1).parameters()
+            optimizer = torch.optim.SGD([{'params': parameters, 'initial_lr': 0.3}], lr=0.3)
+            return optimizer, WarmupLR(LinearDecreasingLR(optimizer, 100), 5, 0.01)
+
+        optimizer, scheduler = build()
+        self.step_and_get_lr(scheduler, optimizer, 7)
+        state_dict = scheduler.state_dict()
+        optimizer_state_dict = optimizer.state_dict()
+        self.assertIsInstance(state_dict['lr_scheduler'], dict)
+        lrs = self.step_and_get_lr(scheduler, optimizer, 5)
+
+        # The state is loaded to a new optimizer and scheduler as if the training is resumed.
+        optimizer2, scheduler2 = build()
+        optimizer2.load_state_dict(optimizer_state_dict)
+        scheduler2.load_state_dict(state_dict)
+        self.assertIs(scheduler2.lr_scheduler.optimizer, optimizer2)
+        lrs2 = self.step_and_get_lr(scheduler2, optimizer2, 5)
+        self.assert_almost_equal_lists(lrs, lrs2)
+
     def assert_almost_equal_lists(self, list0, list1):
         self.assertEqual(len(list0), len(list1))
         for value0, value1 in zip(list0, list1):
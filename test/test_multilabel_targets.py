@@ -0,0 +1,23 @@
+import unittest
+import numpy as np
+import torch
+from mitorch.datasets.multilabel_targets import collate_multilabel_targets, to_dense_multilabel_targets
+
+
+class TestMultilabelTargets(unittest.TestCase):
+    def test_collate(self):
+        targets = [np.array([1, 1, 2]), np.array([], dtype=np.int64), np.array([0])]
+        dense = collate_multilabel_targets(targets, 3)
+        self.assertEqual(dense.tolist(), [[0, 1, 1], [0, 0, 0], [1, 0, 0]])
+
+        sparse = collate_multilabel_targets(targets, 3, sparse=True)
+        self.assertTrue(sparse.is_sparse)
+        self.assertTrue(torch.equal(to_dense_multilabel_targets(sparse), dense))
+
+    def test_collate_empty(self):
+        self.assertEqual(collate_multilabel_targets([], 3).shape, (0, 3))
+        self.assertEqual(collate_multilabel_targets([], 3, sparse=True).shape, (0, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
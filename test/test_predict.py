@@ -0,0 +1,56 @@
+import json
+import pathlib
+import tempfile
+import unittest
+import numpy as np
+import PIL.Image
+from mitorch.commands.predict import predict_batch
+from mitorch.common.training_config import AugmentationConfig, ModelConfig, TrainingConfig
+
+
+class TestPredict(unittest.TestCase):
+    def _create_images(self, directory, num_images):
+        filepaths = [directory / f'{i}.jpg' for i in range(num_images)]
+        for i, filepath in enumerate(filepaths):
+            PIL.Image.new('RGB', (64, 48), color=(i * 50, 0, 0)).save(filepath)
+        return filepaths
+
+    def test_classification(self):
+        config = TrainingConfig(task_type='multiclass_classification', batch_size=2, max_epochs=1, model=ModelConfig('MobileNetV3', 32),
+                                augmentation=AugmentationConfig(['center_crop'], ['center_crop']))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            image_filepaths = self._create_images(temp_dir, 5)
+
+            stats = predict_batch(config, None, 3, image_filepaths, temp_dir / 'output.npy', batch_size=2, num_workers=1)
+            predictions = np.load(temp_dir / 'output.npy')
+            predict_batch(config, None, 3, image_filepaths, temp_dir / 'output.jsonl', batch_size=2, num_workers=0)
+            lines = [json.loads(line) for line in (temp_dir / 'output.jsonl').read_text().splitlines()]
+
+        self.assertEqual(stats['num_images'], 5)
+        self.assertGreater(stats['images_per_second'], 0)
+        self.assertEqual(set(stats['batch_latency_ms'].keys()), {50, 90, 99})
+        self.assertEqual(predictions.shape, (5, 3))
+        self.assertEqual([line['image'] for line in lines], [str(p) for p in image_filepaths])
+        self.assertEqual(len(lines[0]['predictions']), 3)
+
+    def test_object_detection(self):
+        config = TrainingConfig(task_type='object_detection', batch_size=2, max_epochs=1, model=ModelConfig('MobileNetV2-SSDLite', 128),
+                                augmentation=AugmentationConfig(['resize'], ['resize']))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            image_filepaths = self._create_images(temp_dir, 3)
+
+            with self.assertRaises(ValueError):
+                predict_batch(config, None, 2, image_filepaths, temp_dir / 'output.npy')
+            predict_batch(config, None, 2, image_filepaths, temp_dir / 'output.jsonl', batch_size=2, num_workers=0)
+            lines = [json.loads(line) for line in (temp_dir / 'output.jsonl').read_text().splitlines()]
+
+        self.assertEqual(len(lines), 3)
+        for line in lines:
+            for box in line['predictions']:
+                self.assertEqual(len(box), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+import PIL.Image
+import torch
+from mitorch.builders import ModelBuilder
+from mitorch.commands.evaluate import evaluate
+from mitorch.common.training_config import AugmentationConfig, DataLoaderConfig, ModelConfig, TrainingConfig
+from mitorch.datasets.detection_targets import pad_detection_targets
+from mitorch.evaluators import MulticlassClassificationEvaluator, ObjectDetectionEvaluator
+from mitorch.evaluators.prediction_cache import PredictionCache
+
+
+class TestPredictionCache(unittest.TestCase):
+    def test_multiclass(self):
+        predictions = torch.softmax(torch.randn(5, 3), 1)
+        targets = torch.tensor([0, 1, 2, 0, 1])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = PredictionCache(pathlib.Path(temp_dir), 'multiclass_classification', 5, 3)
+            cache.append(predictions[:2], targets[:2])
+            cache.append(predictions[2:], targets[2:])
+            self.assertTrue(cache.is_complete)
+            batches = list(cache.iterate_batches(4))
+
+        self.assertEqual(len(batches), 2)
+        self.assertTrue(torch.equal(torch.cat([b[0] for b in batches]), predictions))
+        self.assertTrue(torch.equal(torch.cat([b[1] for b in batches]), targets))
+
+        evaluator = MulticlassClassificationEvaluator()
+        evaluator.add_predictions(predictions, targets)
+        cached_evaluator = MulticlassClassificationEvaluator()
+        for batch in batches:
+            cached_evaluator.add_predictions(*batch)
+        self.assertEqual(cached_evaluator.get_report(), evaluator.get_report())
+
+    def test_object_detection(self):
+        predictions = [[[0, 0.75, 0, 0, 0.5, 0.5], [1, 0.25, 0.5, 0.5, 1, 1]], [], [[1, 0.625, 0, 0, 1, 1]]]
+        targets = [[[0, 0, 0, 0.5, 0.5], [1, 0.5, 0.5, 1, 1]], [[0, 0, 0, 1, 1]], []]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = PredictionCache(pathlib.Path(temp_dir), 'object_detection', 3, 2)
+            cache.append(predictions, pad_detection_targets(targets))
+            (cached_predictions, cached_targets), = list(cache.iterate_batches(3))
+            (thresholded_predictions, _), = list(cache.iterate_batches(3, score_threshold=0.5))
+
+        self.assertEqual([p.tolist() for p in cached_predictions], [[[0, 0.75, 0, 0, 0.5, 0.5], [1, 0.25, 0.5, 0.5, 1, 1]], [], [[1, 0.625, 0, 0, 1, 1]]])
+        self.assertEqual([t.tolist() for t in cached_targets], targets)
+        self.assertEqual([len(p) for p in thresholded_predictions], [1, 0, 1])
+
+        evaluator = ObjectDetectionEvaluator()
+        evaluator.add_predictions(predictions, targets)
+        cached_evaluator = ObjectDetectionEvaluator()
+        cached_evaluator.add_predictions(cached_predictions, cached_targets)
+        for key, value in evaluator.get_report().items():
+            self.assertAlmostEqual(cached_evaluator.get_report()[key], value, places=6)
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            cache = PredictionCache(temp_dir, 'multilabel_classification', 4, 3, key='a')
+            cache.append(torch.rand(2, 3), torch.tensor([[0, 1, 1], [1, 0, 0]]))
+            # Interrupted while writing the next batch.
+            with open(temp_dir / 'predictions.bin', 'ab') as f:
+                f.write(b'\0' * 10)
+
+            cache = PredictionCache(temp_dir, 'multilabel_classification', 4, 3, key='a')
+            self.assertEqual(cache.num_completed, 2)
+            self.assertEqual((temp_dir / 'predictions.bin').stat().st_size, 2 * 3 * 4)
+            cache.append(torch.rand(2, 3), torch.tensor([[0, 0, 1], [1, 1, 1]]))
+            _, targets = next(cache.iterate_batches(4))
+            self.assertEqual(targets.tolist(), [[0, 1, 1], [1, 0, 0], [0, 0, 1], [1, 1, 1]])
+
+            # Another model or dataset.
+            cache = PredictionCache(temp_dir, 'multilabel_classification', 4, 3, key='b')
+            self.assertEqual(cache.num_completed, 0)
+
+    def test_evaluate(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            for i in range(3):
+                PIL.Image.new('RGB', (64, 48), color=(i * 100, 0, 0)).save(temp_dir / f'{i}.jpg')
+            dataset_filepath = temp_dir / 'images.txt'
+            dataset_filepath.write_text(''.join(f'{i}.jpg {i % 2}\n' for i in range(3)))
+            config = TrainingConfig(task_type='multiclass_classification', batch_size=2, max_epochs=1, model=ModelConfig('MobileNetV3', 32),
+                                    augmentation=AugmentationConfig(['center_crop'], ['center_crop']), dataloader=DataLoaderConfig(num_workers=0))
+
+            weights_filepath = temp_dir / 'weights.pth'
+            torch.save(ModelBuilder(config).build(2, None).state_dict(), weights_filepath)
+
+            with unittest.mock.patch.dict(os.environ, {'MITORCH_CACHE_DIR': str(temp_dir / 'cache')}):
+                report = evaluate(config, weights_filepath, dataset_filepath)
+                with unittest.mock.patch('mitorch.commands.evaluate.run_inference') as mock_run_inference:
+                    self.assertEqual(evaluate(config, weights_filepath, dataset_filepath), report)
+                    mock_run_inference.assert_not_called()
+
+            self.assertEqual(set(report.keys()), {'top1_accuracy', 'top5_accuracy', 'average_precision'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+import zipfile
+import PIL.Image
+from mitorch.commands.preprocess import preprocess
+from mitorch.datasets import ImageDataset
+
+
+class TestPreprocess(unittest.TestCase):
+    def test_object_detection(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            PIL.Image.new('RGB', (400, 200)).save(temp_dir / '0.jpg')
+            PIL.Image.new('RGB', (50, 80)).save(temp_dir / '1.png')
+            with zipfile.ZipFile(temp_dir / 'images.zip', 'w') as z:
+                z.writestr('0.txt', '0 100 20 400 200\n')
+            (temp_dir / '1.txt').write_text('1 0 0 50 80\n')
+            filepath = temp_dir / 'images.txt'
+            filepath.write_text('0.jpg images.zip@0.txt\n1.png 1.txt\n')
+
+            with unittest.mock.patch.dict(os.environ, {'MITORCH_CACHE_DIR': str(temp_dir / 'cache')}):
+                output_filepath = preprocess(filepath, 100, num_processes=1)
+                self.assertEqual(output_filepath.parent.parent, temp_dir / 'cache' / 'preprocessed')
+                self.assertEqual(output_filepath.read_text().splitlines()[1], 'images/1.png.jpg annotations/1.png.jpg.txt')
+
+                dataset = ImageDataset.from_file(output_filepath, lambda image, target: (image.shape, target))
+                image_shape, target = dataset[0]
+                self.assertEqual(image_shape, (100, 200, 3))
+                self.assertEqual(target.tolist(), [[0, 50, 10, 200, 100]])
+                image_shape, target = dataset[1]
+                self.assertEqual(image_shape, (80, 50, 3))  # Not upscaled.
+                self.assertEqual(target.tolist(), [[1, 0, 0, 50, 80]])
+
+                # Incremental. The existing images are not written again.
+                image_filepath = output_filepath.parent / 'images' / '0.jpg'
+                os.utime(image_filepath, ns=(0, 0))
+                preprocess(filepath, 100, num_processes=1)
+                self.assertEqual(image_filepath.stat().st_mtime_ns, 0)
+
+                # An updated dataset is written to a new directory instead of reusing the stale images.
+                PIL.Image.new('RGB', (200, 400)).save(temp_dir / '0.jpg')
+                filepath.write_text('0.jpg images.zip@0.txt\n')
+                os.utime(filepath, ns=(1, 1))
+                new_output_filepath = preprocess(filepath, 100, num_processes=1)
+                self.assertNotEqual(new_output_filepath, output_filepath)
+                self.assertEqual(ImageDataset.from_file(new_output_filepath, lambda image, target: (image.shape, target))[0][0], (200, 100, 3))
+
+    def test_classification(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            PIL.Image.new('RGB', (400, 200)).save(temp_dir / '0.jpg')
+            (temp_dir / 'labels.txt').write_text('a\nb\nc\n')
+            filepath = temp_dir / 'images.txt'
+            filepath.write_text('0.jpg 0,2\n')
+
+            output_filepath = preprocess(filepath, 100, temp_dir / 'output', num_processes=1)
+            self.assertEqual(output_filepath.read_text(), 'images/0.jpg 0,2\n')
+            self.assertEqual((temp_dir / 'output' / 'labels.txt').read_text(), 'a\nb\nc\n')
+
+    def test_output_collision(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            PIL.Image.new('RGB', (400, 200)).save(temp_dir / '0.png')
+            PIL.Image.new('RGB', (400, 200)).save(temp_dir / '0.png.jpg', format='JPEG')
+            filepath = temp_dir / 'images.txt'
+            filepath.write_text('0.png 0\n0.png 1\n0.png.jpg 1\n')  # The same image can be listed twice.
+
+            with self.assertRaises(ValueError):
+                preprocess(filepath, 100, temp_dir / 'output', num_processes=1)
+            self.assertFalse((temp_dir / 'output' / 'images').exists())
+
+            filepath.write_text('0.png 0\n0.png 1\n')
+            self.assertEqual(preprocess(filepath, 100, temp_dir / 'output', num_processes=1).read_text(), 'images/0.png.jpg 0\nimages/0.png.jpg 1\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import pathlib
+import tempfile
+import unittest
+import PIL.Image
+import torch
+from mitorch.common.training_config import AugmentationConfig, DataLoaderConfig, ModelConfig, TrainingConfig
+from mitorch.commands.profile_data import profile_data
+from mitorch.datasets.profiler import PipelineProfiler
+
+
+class FakeDataset(torch.utils.data.Dataset):
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def __len__(self):
+        return 8
+
+    def __getitem__(self, index):
+        self.profiler.record('read', 0.001)
+        return index
+
+
+class TestPipelineProfiler(unittest.TestCase):
+    def test_record(self):
+        profiler = PipelineProfiler(num_workers=0)
+        for _ in range(99):
+            profiler.record('decode', 0.001)
+        profiler.record('decode', 1)
+        profiler.record('data_wait', 1)
+        profiler.record('step', 3)
+
+        stats = profiler.get_stats()
+        self.assertEqual(set(stats.keys()), {'decode', 'data_wait', 'step'})
+        self.assertEqual(stats['decode']['count'], 100)
+        self.assertAlmostEqual(stats['decode']['p50_ms'], 1, delta=0.15)
+        self.assertAlmostEqual(stats['decode']['mean_ms'], 10.99)
+        self.assertAlmostEqual(profiler.get_data_wait_fraction(), 0.25)
+        self.assertIn('profile_decode_p99_ms', profiler.get_metrics())
+
+        profiler.reset()
+        self.assertEqual(profiler.get_stats(), {})
+
+    def test_workers(self):
+        profiler = PipelineProfiler(num_workers=2)
+        dataloader = torch.utils.data.DataLoader(FakeDataset(profiler), batch_size=2, num_workers=2)
+        self.assertEqual(len(list(dataloader)), 4)
+        self.assertEqual(profiler.get_stats()['read']['count'], 8)
+        self.assertEqual(profiler.counts[0].sum(), 0)  # Nothing was recorded by the main process.
+
+    def test_profile_data(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            for i in range(4):
+                PIL.Image.new('RGB', (64, 48)).save(temp_dir / f'{i}.jpg')
+            filepath = temp_dir / 'images.txt'
+            filepath.write_text(''.join(f'{i}.jpg {i % 2}\n' for i in range(4)))
+
+            config = TrainingConfig(task_type='multiclass_classification', batch_size=2, max_epochs=1, model=ModelConfig('MobileNetV3', 32),
+                                    augmentation=AugmentationConfig(['horizontal_flip', 'center_crop'], ['center_crop']), dataloader=DataLoaderConfig(num_workers=1))
+            images_per_second, profiler = profile_data(config, filepath, num_batches=1)
+            self.assertGreater(images_per_second, 0)
+            self.assertEqual({'read', 'decode', 'augment', 'collate'}, set(profiler.get_stats().keys()))
+
+
+if __name__ == '__main__':
+    unittest.main()
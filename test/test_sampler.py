@@ -0,0 +1,53 @@
+import pathlib
+import tempfile
+import unittest
+import zipfile
+from mitorch.datasets import ImageDataset
+from mitorch.datasets.sampler import BlockShuffleSampler, get_storage_order
+
+
+class TestBlockShuffleSampler(unittest.TestCase):
+    def test_shuffle(self):
+        sampler = BlockShuffleSampler(range(100), block_size=10, window_size=20)
+        indices = list(sampler)
+        self.assertEqual(sorted(indices), list(range(100)))
+        self.assertNotEqual(indices, list(range(100)))
+        # Each window contains exactly two blocks.
+        for start in range(0, 100, 20):
+            self.assertEqual(len({i // 10 for i in indices[start:start + 20]}), 2)
+
+        self.assertEqual(list(sampler), indices)
+        sampler.set_epoch(1)
+        self.assertNotEqual(list(sampler), indices)
+
+    def test_distributed(self):
+        samplers = [BlockShuffleSampler(range(101), block_size=8, window_size=16, num_replicas=4, rank=r) for r in range(4)]
+        indices = [list(s) for s in samplers]
+        self.assertTrue(all(len(s) == 26 and len(i) == 26 for s, i in zip(samplers, indices)))
+        self.assertEqual(set(i for r in indices for i in r), set(range(101)))
+
+        sampler = BlockShuffleSampler(range(101), num_replicas=4, rank=3, drop_last=True)
+        self.assertEqual(len(list(sampler)), 25)
+
+    def test_start_index(self):
+        sampler = BlockShuffleSampler(range(101), block_size=1, window_size=1, num_replicas=2, rank=1)
+        indices = list(sampler)
+        self.assertEqual(len(indices), 51)
+        sampler.start_index = 20
+        self.assertEqual(list(sampler), indices[20:])
+        self.assertEqual(list(sampler), indices)  # Only the next epoch is affected.
+
+    def test_get_storage_order(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            with zipfile.ZipFile(temp_dir / 'images.zip', 'w') as z:
+                for name in ['a.jpg', 'b.jpg', 'c.jpg']:
+                    z.writestr(name, b'')
+            filepath = temp_dir / 'images.txt'
+            filepath.write_text('images.zip@c.jpg 0\n0.jpg 0\nimages.zip@a.jpg 0\nimages.zip@b.jpg 0\n')
+            dataset = ImageDataset.from_file(filepath, None)
+            self.assertEqual(get_storage_order(dataset).tolist(), [1, 2, 3, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import concurrent.futures
+import io
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+import PIL.Image
+from mitorch.commands.serve import DynamicBatcher, InferenceServer, ServerMetrics
+from mitorch.common.training_config import AugmentationConfig, ModelConfig, TrainingConfig
+
+
+class TestDynamicBatcher(unittest.TestCase):
+    def test_max_batch_size(self):
+        released = threading.Event()
+        batch_sizes = []
+
+        def predict(values):
+            released.wait()
+            batch_sizes.append(len(values))
+            return [v * 2 for v in values]
+
+        batcher = DynamicBatcher(predict, max_batch_size=3, max_delay=10, metrics=ServerMetrics())
+        first = batcher.submit(0)  # Waits for 10 seconds unless the batch is full.
+        futures = [batcher.submit(i) for i in range(1, 6)]
+        released.set()
+        self.assertEqual([f.result(timeout=5) for f in [first] + futures], [0, 2, 4, 6, 8, 10])
+        batcher.close()
+        self.assertEqual(batch_sizes[0], 3)
+
+    def test_max_delay(self):
+        metrics = ServerMetrics()
+        batcher = DynamicBatcher(lambda values: list(values), max_batch_size=100, max_delay=0.01, metrics=metrics)
+        self.assertEqual(batcher.submit(1).result(timeout=5), 1)
+        batcher.close()
+        self.assertEqual(metrics.get()['batch_size']['p50'], 1)
+
+    def test_error(self):
+        batcher = DynamicBatcher(lambda values: 1 / 0, max_batch_size=1, max_delay=0, metrics=ServerMetrics())
+        with self.assertRaises(ZeroDivisionError):
+            batcher.submit(1).result(timeout=5)
+        batcher.close()
+
+
+class TestInferenceServer(unittest.TestCase):
+    def test_predict(self):
+        config = TrainingConfig(task_type='multiclass_classification', batch_size=2, max_epochs=1, model=ModelConfig('MobileNetV3', 32),
+                                augmentation=AugmentationConfig(['center_crop'], ['center_crop']))
+        buffer = io.BytesIO()
+        PIL.Image.new('RGB', (64, 48)).save(buffer, format='JPEG')
+        image_bytes = buffer.getvalue()
+
+        server = InferenceServer(config, None, 3, max_batch_size=8, max_delay_ms=200, num_workers=1)
+        try:
+            port = server.start(port=0)
+
+            def post(data):
+                with urllib.request.urlopen(urllib.request.Request(f'http://localhost:{port}/predict', data=data)) as response:
+                    return json.loads(response.read())
+
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                results = list(executor.map(post, [image_bytes] * 8))
+            self.assertEqual(len(results), 8)
+            self.assertEqual(len(results[0]['predictions']), 3)
+
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                post(b'not an image')
+            self.assertEqual(context.exception.code, 400)
+
+            with urllib.request.urlopen(f'http://localhost:{port}/metrics') as response:
+                metrics = json.loads(response.read())
+            self.assertEqual(metrics['num_requests'], 9)
+            self.assertEqual(metrics['num_errors'], 1)
+            self.assertGreater(metrics['mean_batch_size'], 1)
+            self.assertGreater(metrics['latency_ms']['p50'], 0)
+
+            server.batcher.predict_fn = lambda values: 1 / 0  # A forward failure is a server error.
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                post(image_bytes)
+            self.assertEqual(context.exception.code, 500)
+        finally:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import io
+import os
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+import zipfile
+import PIL.Image
+from mitorch.commands.convert import convert
+from mitorch.datasets import ImageDataset
+from mitorch.datasets.shard import ShardReader, ShardWriter
+
+
+def _create_image_bytes(width, height):
+    with io.BytesIO() as f:
+        PIL.Image.new('RGB', (width, height)).save(f, format='JPEG')
+        return f.getvalue()
+
+
+class TestShard(unittest.TestCase):
+    def test_write_read(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = pathlib.Path(temp_dir) / 'test.shard'
+            with ShardWriter(filepath, 'multilabel_classification', ['a', 'b', 'c']) as writer:
+                writer.add(b'abc', 'image0.jpg', [0, 2])
+                writer.add(b'', 'image1.jpg', [])
+                writer.add(b'defg', 'image2.jpg', [1])
+
+            self.assertTrue(ShardReader.is_shard(filepath))
+            reader = ShardReader(filepath)
+            self.assertEqual(len(reader), 3)
+            self.assertEqual(reader.labels, ['a', 'b', 'c'])
+            self.assertEqual(bytes(reader.get_image_bytes(0)), b'abc')
+            self.assertEqual(bytes(reader.get_image_bytes(1)), b'')
+            self.assertEqual(reader.open(2).read(), b'defg')
+            self.assertEqual(list(reader.image_paths), ['image0.jpg', 'image1.jpg', 'image2.jpg'])
+            self.assertEqual([t.tolist() for t in reader.targets], [[0, 2], [], [1]])
+
+    def test_convert_object_detection(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            with zipfile.ZipFile(temp_dir / 'images.zip', 'w') as z:
+                z.writestr('0.jpg', _create_image_bytes(32, 16))
+                z.writestr('0.txt', '0 1 2 10 12\n1 0 0 5.5 5.5\n')
+            (temp_dir / '1.jpg').write_bytes(_create_image_bytes(16, 32))
+            (temp_dir / '1.txt').write_text('2 3 4 8 8\n')
+            (temp_dir / 'images.txt').write_text('images.zip@0.jpg images.zip@0.txt\n1.jpg 1.txt\n')
+
+            with unittest.mock.patch.dict(os.environ, {'MITORCH_CACHE_DIR': str(temp_dir / 'cache')}):
+                convert(temp_dir / 'images.txt', temp_dir / 'images.shard')
+                original = ImageDataset.from_file(temp_dir / 'images.txt', lambda image, target: (image.shape, target))
+            dataset = ImageDataset.from_file(temp_dir / 'images.shard', lambda image, target: (image.shape, target))
+
+            self.assertEqual(type(dataset), type(original))
+            self.assertEqual(len(dataset), 2)
+            self.assertEqual(dataset.labels, original.labels)
+            for i in range(2):
+                size, target = dataset[i]
+                original_size, original_target = original[i]
+                self.assertEqual(size, original_size)
+                self.assertEqual(target.tolist(), [list(t) for t in original_target])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import pathlib
+import tempfile
+import unittest
+import PIL.Image
+import pytorch_lightning as pl
+from mitorch.builders import DataLoaderBuilder
+from mitorch.common import MiModel
+from mitorch.common.logger import LoggerBase
+from mitorch.common.step_profiler import StepProfiler, TorchProfilerCallback
+from mitorch.common.training_config import (AugmentationConfig, DataLoaderConfig, LrSchedulerConfig, ModelConfig, OptimizerConfig, ProfilerConfig,
+                                            TrainingConfig)
+
+
+class _MemoryLogger(LoggerBase):
+    def __init__(self):
+        super().__init__()
+        self.metrics = []
+
+    def log_metrics(self, metrics, step):
+        self.metrics.append(metrics)
+
+
+class TestStepProfiler(unittest.TestCase):
+    def test_metrics(self):
+        profiler = StepProfiler()
+        self.assertEqual(profiler.get_metrics(), {})
+        profiler.start_epoch()
+        for _ in range(4):
+            profiler.start_step()
+            profiler.record('forward', 0.01)
+            profiler.record('logging', 0.002)
+            profiler.end_step()
+
+        metrics = profiler.get_metrics()
+        self.assertEqual(metrics['step_count'], 4)
+        self.assertAlmostEqual(metrics['step_forward_p50_ms'], 10)
+        self.assertAlmostEqual(metrics['step_logging_p50_ms'], 2)
+        fractions = [v for k, v in metrics.items() if k.endswith('_fraction')]
+        self.assertAlmostEqual(sum(fractions), 1)
+
+        profiler.start_epoch()
+        self.assertEqual(profiler.get_metrics(), {})
+
+    def test_training(self):
+        config = TrainingConfig(task_type='multiclass_classification', batch_size=2, max_epochs=1, use_fp16=False, model=ModelConfig('MobileNetV3', 32),
+                                augmentation=AugmentationConfig(['center_crop'], ['center_crop']), dataloader=DataLoaderConfig(num_workers=0),
+                                lr_scheduler=LrSchedulerConfig('cosine_annealing', 0.1, None, None, None, None), optimizer=OptimizerConfig(),
+                                profiler=ProfilerConfig(step_breakdown=True, trace_start_step=1, trace_num_steps=1))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            for i in range(6):
+                PIL.Image.new('RGB', (32, 32)).save(temp_dir / f'{i}.jpg')
+            dataset_filepath = temp_dir / 'images.txt'
+            dataset_filepath.write_text(''.join(f'{i}.jpg {i % 2}\n' for i in range(6)))
+            builder = DataLoaderBuilder(config)
+            dataloader = builder.build_dataloader(builder.build_dataset(dataset_filepath, config.augmentation.train, False), shuffle=True)
+
+            logger = _MemoryLogger()
+            trace_dir = temp_dir / 'profiler'
+            callback = TorchProfilerCallback(trace_dir, config.profiler.trace_start_step, config.profiler.trace_num_steps)
+            trainer = pl.Trainer(max_epochs=1, logger=logger, checkpoint_callback=False, progress_bar_refresh_rate=0, callbacks=[callback])
+            trainer.fit(MiModel(config, 2), dataloader)
+
+            metrics = next(m for m in logger.metrics if 'step_count' in m)
+            self.assertEqual(metrics['step_count'], 3)
+            for stage in ['data_wait', 'forward', 'loss', 'backward', 'optimizer', 'logging']:
+                self.assertGreater(metrics[f'step_{stage}_p50_ms'], 0, stage)
+            self.assertGreater(metrics['step_forward_fraction'], 0.1)
+            self.assertEqual(len(list(trace_dir.glob('*.pt.trace.json'))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
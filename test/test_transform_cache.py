@@ -0,0 +1,83 @@
+import os
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+import numpy as np
+import PIL.Image
+import torch
+from mitorch.builders import DataLoaderBuilder
+from mitorch.common.training_config import AugmentationConfig, DataLoaderConfig, ModelConfig, TrainingConfig
+from mitorch.datasets import TransformFactory
+from mitorch.datasets.transform_cache import CachedTransformDataset, TransformCache
+
+
+class TestTransformCache(unittest.TestCase):
+    def test_is_deterministic(self):
+        factory = TransformFactory(False, 32)
+        self.assertTrue(factory.is_deterministic(['smallest_max_size', 'center_crop']))
+        self.assertTrue(factory.is_deterministic(['resize']))
+        self.assertFalse(factory.is_deterministic(['center_crop', 'horizontal_flip']))
+        self.assertFalse(factory.is_deterministic(['smallest_max_size']))
+        self.assertFalse(factory.is_deterministic(['inception']))
+        self.assertFalse(factory.is_deterministic([]))
+
+    def test_concurrent_open(self):
+        # Processes that create the files at the same time must map the same files. Otherwise a cached flag can point to a lost image.
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = TransformCache(pathlib.Path(temp_dir) / 'cache', 8, (3, 4, 4))
+            pids = []
+            for i in range(8):
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        cache.put(i, np.full((3, 4, 4), i + 1, dtype=np.uint8))
+                        cache._images.flush()
+                        cache._flags.flush()
+                    finally:
+                        os._exit(0)
+                pids.append(pid)
+            for pid in pids:
+                os.waitpid(pid, 0)
+
+            for i in range(8):
+                np.testing.assert_array_equal(cache.get(i), np.full((3, 4, 4), i + 1, dtype=np.uint8))
+            self.assertEqual(len(list(cache.cache_filepath.iterdir())), 2)  # No temp file is left.
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = pathlib.Path(temp_dir)
+            rng = np.random.default_rng(0)
+            for i in range(3):
+                PIL.Image.fromarray(rng.integers(0, 256, size=(40, 48, 3), dtype=np.uint8)).save(temp_dir / f'{i}.png')
+            filepath = temp_dir / 'images.txt'
+            filepath.write_text(''.join(f'{i}.png {i}\n' for i in range(3)))
+
+            def build(uint8_transport, val_cache=True):
+                config = TrainingConfig(task_type='multiclass_classification', batch_size=2, max_epochs=1, model=ModelConfig('MobileNetV3', 32),
+                                        augmentation=AugmentationConfig(['horizontal_flip'], ['center_crop']),
+                                        dataloader=DataLoaderConfig(uint8_transport=uint8_transport, val_cache=val_cache))
+                return DataLoaderBuilder(config).build(filepath, filepath)[1].dataset
+
+            with unittest.mock.patch.dict(os.environ, {'MITORCH_CACHE_DIR': str(temp_dir)}):
+                expected = [build(False, val_cache=False)[i] for i in range(3)]
+                dataset = build(False)
+                self.assertIsInstance(dataset, CachedTransformDataset)
+                self.assertEqual(len(dataset), 3)
+                self.assertEqual(len(dataset.labels), 3)
+                for i in range(3):
+                    image, target = dataset[i]
+                    self.assertTrue(torch.allclose(image, expected[i][0], atol=1e-6))
+                    self.assertEqual(target, i)
+
+                # The images are read from the cache without decoding.
+                dataset = build(True)
+                dataset.dataset.decoder = None
+                image, target = dataset[1]
+                self.assertEqual(image.dtype, torch.uint8)
+                self.assertEqual(image.shape, (3, 32, 32))
+                self.assertEqual(target, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import concurrent.futures
+import multiprocessing
+import os
+import pathlib
+import pickle
+import tempfile
+import unittest
+import zipfile
+from mitorch.datasets.zip_reader import IndexedZipFile
+
+MEMBERS = {'stored.bin': (os.urandom(1000), zipfile.ZIP_STORED),
+           'deflated.txt': (b'abcdefg' * 1000, zipfile.ZIP_DEFLATED),
+           'empty.txt': (b'', zipfile.ZIP_DEFLATED),
+           'dir/bzip2.txt': (b'hijklmn' * 100, zipfile.ZIP_BZIP2)}
+
+
+def _read_all(zip_file):
+    return {name: bytes(zip_file.read(name)) for name in MEMBERS}
+
+
+class TestIndexedZipFile(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.zip_filepath = pathlib.Path(self.temp_dir.name) / 'test.zip'
+        with zipfile.ZipFile(self.zip_filepath, 'w') as z:
+            for name, (data, compress_type) in MEMBERS.items():
+                z.writestr(zipfile.ZipInfo(name), data, compress_type=compress_type)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_read(self):
+        zip_file = IndexedZipFile(self.zip_filepath)
+        expected = {name: data for name, (data, _) in MEMBERS.items()}
+        self.assertEqual(_read_all(zip_file), expected)
+        with zip_file.open('deflated.txt') as f:
+            self.assertEqual(f.read(), expected['deflated.txt'])
+        with zip_file.open('stored.bin') as f:
+            self.assertEqual(f.read(), expected['stored.bin'])
+
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(lambda _: _read_all(zip_file), range(8)))
+        self.assertTrue(all(r == expected for r in results))
+        zip_file.close()
+
+    def test_get_member_index(self):
+        zip_file = IndexedZipFile(self.zip_filepath)
+        self.assertEqual([zip_file.get_member_index(name) for name in MEMBERS], list(range(len(MEMBERS))))
+        with self.assertRaises(KeyError):
+            zip_file.read('missing.txt')
+
+        with zipfile.ZipFile(self.zip_filepath, 'a') as z:
+            z.writestr('stored.bin', b'new')  # Duplicated name. ZipFile reads the last one.
+        zip_file = IndexedZipFile(self.zip_filepath)
+        self.assertEqual(zip_file.get_member_index('stored.bin'), len(MEMBERS))
+        self.assertEqual(bytes(zip_file.read('stored.bin')), b'new')
+
+    def test_pickle(self):
+        zip_file = IndexedZipFile(self.zip_filepath)
+        zip_file.read('stored.bin')
+        new_zip_file = pickle.loads(pickle.dumps(zip_file))
+        self.assertEqual(_read_all(new_zip_file), _read_all(zip_file))
+
+    def test_fork(self):
+        zip_file = IndexedZipFile(self.zip_filepath)
+        expected = _read_all(zip_file)
+        with multiprocessing.get_context('fork').Pool(2) as pool:
+            results = pool.map(_read_all, [zip_file] * 4)
+        self.assertTrue(all(r == expected for r in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
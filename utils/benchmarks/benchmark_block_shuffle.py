@@ -0,0 +1,66 @@
+"""Compare the read throughput of a random order and BlockShuffleSampler.
+
+The difference is visible only if the data is not in the page cache, e.g. on a network filesystem or after dropping the page cache
+(echo 3 > /proc/sys/vm/drop_caches). If a dataset file is not given, a temporary zip dataset is created.
+"""
+import argparse
+import pathlib
+import tempfile
+import time
+import zipfile
+import numpy as np
+from mitorch.datasets import ImageDataset
+from mitorch.datasets.sampler import BlockShuffleSampler, get_storage_order
+
+
+def create_dataset(directory, num_images, image_size):
+    rng = np.random.default_rng(0)
+    with zipfile.ZipFile(directory / 'images.zip', 'w') as z:
+        for i in range(num_images):
+            z.writestr(f'{i}.jpg', rng.bytes(image_size))
+    filepath = directory / 'images.txt'
+    filepath.write_text(''.join(f'images.zip@{i}.jpg 0\n' for i in range(num_images)))
+    return filepath
+
+
+def benchmark(name, dataset, indices, drop_caches):
+    if drop_caches:
+        pathlib.Path('/proc/sys/vm/drop_caches').write_text('3\n')
+    start = time.time()
+    total_bytes = sum(len(dataset.read_image(i)) for i in indices)
+    elapsed = time.time() - start
+    print(f"{name:>40}: {len(indices) / elapsed:10.1f} reads/s, {total_bytes / elapsed / 1024 / 1024:8.1f} MB/s")
+
+
+def run_benchmark(dataset_filepath, num_reads, block_sizes, window_size, drop_caches):
+    dataset = ImageDataset.from_file(dataset_filepath, None)
+    num_reads = min(num_reads, len(dataset))
+    benchmark('random', dataset, np.random.default_rng(0).permutation(len(dataset))[:num_reads], drop_caches)
+    order = get_storage_order(dataset)
+    for block_size in block_sizes:
+        indices = list(BlockShuffleSampler(order, block_size, max(window_size, block_size)))[:num_reads]
+        benchmark(f'block_shuffle (block={block_size}, window={window_size})', dataset, indices, drop_caches)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dataset_filepath', nargs='?', type=pathlib.Path)
+    parser.add_argument('--num_images', type=int, default=20000)
+    parser.add_argument('--image_size', type=int, default=100 * 1024)
+    parser.add_argument('--num_reads', '-n', type=int, default=10000)
+    parser.add_argument('--block_sizes', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--window_size', type=int, default=1024)
+    parser.add_argument('--drop_caches', action='store_true', help="Drop the page cache before each run. Requires root.")
+
+    args = parser.parse_args()
+
+    if args.dataset_filepath:
+        run_benchmark(args.dataset_filepath, args.num_reads, args.block_sizes, args.window_size, args.drop_caches)
+    else:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            dataset_filepath = create_dataset(pathlib.Path(temp_dir), args.num_images, args.image_size)
+            run_benchmark(dataset_filepath, args.num_reads, args.block_sizes, args.window_size, args.drop_caches)
+
+
+if __name__ == '__main__':
+    main()
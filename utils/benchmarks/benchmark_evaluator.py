@@ -0,0 +1,76 @@
+"""Measure the per-batch overhead of MulticlassClassificationEvaluator.add_predictions().
+
+The previous implementation (one-hot with a python loop, int() syncs and sklearn AP on CPU copies for every batch) is included for comparison.
+"""
+import argparse
+import time
+import sklearn.metrics
+import torch
+from mitorch.evaluators import MulticlassClassificationEvaluator
+
+
+class LegacyMulticlassClassificationEvaluator:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.top1_correct_num = self.top5_correct_num = self.ap = self.total_num = 0
+
+    def add_predictions(self, predictions, targets):
+        _, indices = torch.topk(predictions, 1)
+        self.top1_correct_num += int(indices.view(-1).eq(targets).long().sum(0))
+        k = min(5, predictions.shape[1])
+        _, indices = torch.topk(predictions, k)
+        self.top5_correct_num += int((indices == targets.view(-1, 1).long().expand(-1, k)).long().sum())
+        target_vec = torch.zeros_like(predictions, dtype=torch.uint8)
+        for i, t in enumerate(targets):
+            target_vec[i, t] = 1
+        ap = sklearn.metrics.average_precision_score(target_vec.view(-1).cpu().numpy(), predictions.view(-1).cpu().numpy(), average='macro')
+        self.ap += ap * len(predictions)
+        self.total_num += len(predictions)
+
+    def get_report(self):
+        return {'average_precision': self.ap / self.total_num}
+
+
+def benchmark(name, evaluator, batches, device):
+    for predictions, targets in batches[:2]:  # Warmup
+        evaluator.add_predictions(predictions, targets)
+    evaluator.reset()
+
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    start = time.perf_counter()
+    for predictions, targets in batches:
+        evaluator.add_predictions(predictions, targets)
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    report = evaluator.get_report()
+    report_time = time.perf_counter() - start
+    print(f"{name:>24}: {elapsed / len(batches) * 1000:8.3f} ms/batch, get_report: {report_time * 1000:8.3f} ms, AP: {report['average_precision']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_size', type=int, default=128)
+    parser.add_argument('--num_classes', type=int, default=1000)
+    parser.add_argument('--num_batches', '-n', type=int, default=50)
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    generator = torch.Generator().manual_seed(0)
+    batches = [(torch.softmax(torch.randn(args.batch_size, args.num_classes, generator=generator) * 3, 1).to(device),
+                torch.randint(0, args.num_classes, (args.batch_size,), generator=generator).to(device)) for _ in range(args.num_batches)]
+
+    benchmark('legacy', LegacyMulticlassClassificationEvaluator(), batches, device)
+    benchmark('histogram (10000 bins)', MulticlassClassificationEvaluator(num_bins=10000), batches, device)
+    benchmark('exact', MulticlassClassificationEvaluator(num_bins=None), batches, device)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Send concurrent requests to miserve and measure the throughput and the latency.
+
+The server-side metrics (batch sizes, queue depth and queueing time) are fetched from /metrics after the run.
+"""
+import argparse
+import concurrent.futures
+import io
+import json
+import pathlib
+import time
+import urllib.request
+import numpy as np
+import PIL.Image
+
+
+def _post(url, data):
+    start = time.perf_counter()
+    with urllib.request.urlopen(urllib.request.Request(url + '/predict', data=data)) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def run_client(url, images, end_time):
+    latencies = []
+    while time.perf_counter() < end_time:
+        latencies.append(_post(url, images[len(latencies) % len(images)]))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--image_filepath', type=pathlib.Path, nargs='*', help="If not given, a random 640x480 JPEG image is used.")
+    parser.add_argument('--concurrency', '-c', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--duration', type=float, default=10, help="Seconds for each concurrency level.")
+
+    args = parser.parse_args()
+
+    if args.image_filepath:
+        images = [p.read_bytes() for p in args.image_filepath]
+    else:
+        buffer = io.BytesIO()
+        PIL.Image.fromarray(np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)).save(buffer, format='JPEG')
+        images = [buffer.getvalue()]
+
+    _post(args.url, images[0])  # Warmup
+    for concurrency in args.concurrency:
+        end_time = time.perf_counter() + args.duration
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+            latencies = sum(executor.map(run_client, [args.url] * concurrency, [images] * concurrency, [end_time] * concurrency), [])
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+        print(f"concurrency {concurrency:>3}: {len(latencies) / args.duration:8.1f} requests/sec, latency p50: {p50:7.1f} ms, p90: {p90:7.1f} ms, p99: {p99:7.1f} ms")
+
+    with urllib.request.urlopen(args.url + '/metrics') as response:
+        print(json.dumps(json.loads(response.read()), indent=4))
+
+
+if __name__ == '__main__':
+    main()
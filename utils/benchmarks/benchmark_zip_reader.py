@@ -0,0 +1,75 @@
+"""Compare the read throughput of zipfile.ZipFile and IndexedZipFile.
+
+If a zip file is not given, a temporary zip file with random members is created.
+"""
+import argparse
+import concurrent.futures
+import os
+import pathlib
+import random
+import tempfile
+import time
+import zipfile
+from mitorch.datasets.zip_reader import IndexedZipFile
+
+
+def create_zip_file(filepath, num_members, member_size, compress_type):
+    with zipfile.ZipFile(filepath, 'w', compression=compress_type) as z:
+        for i in range(num_members):
+            # Half random, half repeated bytes so that deflate has something to do.
+            data = os.urandom(member_size // 2) + bytes(member_size - member_size // 2)
+            z.writestr(f'{i}.bin', data)
+
+
+def benchmark(name, read_fn, names, num_threads):
+    start = time.time()
+    if num_threads > 1:
+        with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+            total_bytes = sum(executor.map(lambda n: len(read_fn(n)), names))
+    else:
+        total_bytes = sum(len(read_fn(n)) for n in names)
+    elapsed = time.time() - start
+    print(f"{name:>32}: {len(names) / elapsed:10.1f} reads/s, {total_bytes / elapsed / 1024 / 1024:8.1f} MB/s")
+
+
+def run_benchmark(zip_filepath, num_reads, num_threads):
+    start = time.time()
+    zip_file = zipfile.ZipFile(zip_filepath)
+    print(f"zipfile.ZipFile init: {time.time() - start:.3f}s")
+    start = time.time()
+    indexed_zip_file = IndexedZipFile(zip_filepath)
+    print(f"IndexedZipFile init: {time.time() - start:.3f}s")
+
+    names = [random.choice(zip_file.namelist()) for _ in range(num_reads)]
+
+    def read_zipfile(name):
+        with zip_file.open(name) as f:
+            return f.read()
+
+    for threads in sorted({1, num_threads}):
+        benchmark(f'zipfile.ZipFile ({threads} threads)', read_zipfile, names, threads)
+        benchmark(f'IndexedZipFile ({threads} threads)', indexed_zip_file.read, names, threads)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('zip_filepath', nargs='?', type=pathlib.Path)
+    parser.add_argument('--num_members', type=int, default=10000)
+    parser.add_argument('--member_size', type=int, default=100 * 1024)
+    parser.add_argument('--deflate', action='store_true', help="Compress the members of the generated zip file.")
+    parser.add_argument('--num_reads', '-n', type=int, default=10000)
+    parser.add_argument('--num_threads', '-t', type=int, default=4)
+
+    args = parser.parse_args()
+
+    if args.zip_filepath:
+        run_benchmark(args.zip_filepath, args.num_reads, args.num_threads)
+    else:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            zip_filepath = pathlib.Path(temp_dir) / 'benchmark.zip'
+            create_zip_file(zip_filepath, args.num_members, args.member_size, zipfile.ZIP_DEFLATED if args.deflate else zipfile.ZIP_STORED)
+            run_benchmark(zip_filepath, args.num_reads, args.num_threads)
+
+
+if __name__ == '__main__':
+    main()